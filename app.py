@@ -1,14 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 import sqlite3
 import os
 import json
+import re
 import secrets
+import queue
+import pathlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import asyncio
 import logging
 import threading
+import time
+import random
+import concurrent.futures
+import uuid
+from collections import Counter, OrderedDict, defaultdict
 import base64 # Importar base64 para lidar com a imagem
+import hashlib
+import html
+import unicodedata
+import bisect
+import math
+import functools
+import argparse
+import csv
+import sys
+import itertools
+import signal
+from array import array
 import requests # <<<< ADICIONADO: Para chamadas HTTP à API de relés
+from requests.adapters import HTTPAdapter
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Configurar logging
@@ -27,21 +50,88 @@ except ImportError:
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
+# Servidor web (python app.py --serve usa o waitress; sem --serve, o servidor de desenvolvimento do Flask)
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+SERVER_THREADS = 32 # Threads do waitress; cada stream aberto (SSE, preview MJPEG) ocupa uma enquanto a página estiver aberta
+SERVER_CONNECTION_LIMIT = 200 # Conexões simultâneas aceitas pelo waitress
+SERVER_CHANNEL_TIMEOUT = 60 # Fecha conexões keep-alive ociosas após este tempo (s); deve ser maior que SSE_KEEPALIVE_INTERVAL
+SERVER_RESERVED_THREADS = 8 # Threads que os streams nunca ocupam: ficam livres para comandos, buscas e páginas
+STREAMS_PER_CLIENT = 2 # Streams que cada página aberta mantém (eventos SSE + preview MJPEG)
+STREAM_RETRY_AFTER = 15 # Segundos informados no Retry-After quando o limite de streams é atingido
+
 # Configurações do OBS WebSocket (usando a estrutura do código fornecido)
 OBS_HOST = 'localhost'
 OBS_PORT = 4444
 OBS_PASSWORD = '123456789'  # IMPORTANTE: Use a senha correta do seu OBS WebSocket
+OBS_CONNECT_TIMEOUT = 5 # Tempo máximo (s) para conectar e autenticar no OBS
+OBS_REQUEST_TIMEOUT = 10 # Tempo máximo (s) aguardando a resposta de uma requisição
+OBS_CONNECTED_WAIT = 2 # Tempo (s) que uma requisição aguarda a sessão ficar conectada
+OBS_RECONNECT_MIN_DELAY = 1 # Backoff inicial (s) entre tentativas de reconexão
+OBS_RECONNECT_MAX_DELAY = 30 # Backoff máximo (s) entre tentativas de reconexão
+OBS_PREVIEW_INTERVAL = 2.0 # Cadência (s) de captura do preview, independente do número de telas abertas
+OBS_PREVIEW_IDLE_TIMEOUT = 30 # Pausa a captura quando ninguém pede o preview por este tempo (s)
+OBS_PREVIEW_WIDTH = 640 # Largura (px) do screenshot do preview
+OBS_PREVIEW_QUALITY = 70 # Qualidade JPEG do preview (0-100)
+OBS_PREVIEW_STREAM_KEEPALIVE = 10 # Reenvia o último quadro do stream após este tempo sem quadro novo (s)
+OBS_SCENE_CONFIRM_TIMEOUT = 3 # Tempo (s) aguardando o evento do OBS que confirma a troca de cena
+OBS_COMMAND_HISTORY = 200 # Quantos comandos de troca de cena ficam disponíveis para consulta
+OBS_COMMAND_WAIT_MAX = 10 # Tempo máximo (s) de long-poll em /api/obs/commands/<id>
+OBS_BATCH_MAX_REQUESTS = 50 # Número máximo de requisições em um lote de /api/obs/batch
+OBS_BREAKER_FAILURES = 3 # Falhas seguidas (timeout/desconexão) que marcam o OBS como fora do ar
+OBS_BREAKER_RESET_TIMEOUT = 10 # Tempo (s) recusando requisições ao OBS antes de deixar uma de teste passar
+ASYNC_LOOP_MAX_PENDING = 64 # Operações das rotas executando ao mesmo tempo no loop asyncio; acima disso, 503
+ASYNC_LOOP_QUEUE_WAIT = 0.5 # Tempo (s) que uma rota aguarda vaga no loop asyncio antes de desistir
+SSE_KEEPALIVE_INTERVAL = 15 # Intervalo (s) dos comentários de keep-alive nos streams Server-Sent Events
+OBS_LYRICS_SOURCE = 'Letra' # Nome da fonte de texto (GDI+/FreeType) do OBS que exibe as letras projetadas
+PROJECTION_LINES_PER_SLIDE = 2 # Máximo de versos por slide; estrofes maiores viram vários slides
 
 # --- ADICIONADO: Configuração da API de Relés (Raspberry Pi) ---
 # IMPORTANTE: Substitua pelo IP correto do seu Raspberry Pi
 RELAY_API_BASE_URL = "http://10.149.0.136:5001" 
 RELAY_TIMEOUT = 3 # Timeout em segundos para chamadas à API de relés
+RELAY_MAX_WORKERS = 6 # Comandos de relé enviados em paralelo (um por relé de um grupo)
+RELAY_STATUS_POLL_INTERVAL = 30 # Intervalo (s) da reconciliação do estado dos relés com /relay/status
+RELAY_BREAKER_FAILURES = 2 # Falhas de conexão seguidas que marcam a API de relés como fora do ar
+RELAY_BREAKER_RESET_TIMEOUT = 15 # Intervalo (s) das sondagens em segundo plano enquanto a API de relés está fora do ar
+
+# Configuração do banco de músicas (SQLite)
+SONGS_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'songs.db')
+SQLITE_READ_POOL_SIZE = 8 # Conexões somente leitura mantidas abertas para reuso entre requisições
+SQLITE_JOURNAL_MODE = 'WAL' # WAL permite que uma importação grave enquanto as pesquisas continuam lendo
+SQLITE_PRAGMAS = { # Aplicados a cada conexão aberta
+    'cache_size': -16000, # Em KiB quando negativo (16 MB de cache de páginas por conexão)
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000
+}
+
+# Configuração da pesquisa do hinário
+SEARCH_RESULTS_LIMIT = 10 # Músicas por página de resultados
+SEARCH_PAGE_MAX = 50 # Maior página que o cliente pode pedir com o parâmetro limit
+SONGS_FTS_TOKENIZER = 'unicode61 remove_diacritics 2' # "bencao" encontra "BENÇÃOS"
+SEARCH_FTS_WEIGHTS = (10.0, 1.0, 2.0) # Peso do bm25 para título, letra e categorias
+SEARCH_SNIPPET_TOKENS = 12 # Tamanho (em palavras) do trecho destacado da letra
+SEARCH_MARK_START, SEARCH_MARK_END = '\x02', '\x03' # Marcam os termos encontrados até o texto ser escapado e virar <mark>
+SEARCH_MODES = ('exact', 'fulltext', 'fuzzy') # exact = LIKE, fulltext = FTS5, fuzzy = trigramas
+FUZZY_MIN_SIMILARITY = 0.3 # Similaridade mínima (0-1) entre a busca e o título/primeiros versos
+FUZZY_FIRST_LINES = 2 # Quantos versos iniciais entram no índice de trigramas
+SONGS_CHANGE_CHECK_INTERVAL = 1.0 # Intervalo mínimo (s) entre verificações de mudança no songs.db
+SONGS_IN_MEMORY = True # Responde as pesquisas a partir de uma cópia do hinário em memória
+SONGS_CORPUS_RELOAD_INTERVAL = 2.0 # Intervalo (s) com que a cópia em memória verifica mudanças no banco
+SEARCH_PREFIX_EXPANSIONS = 200 # Máximo de palavras do vocabulário consideradas para cada prefixo digitado
+SEARCH_CACHE_SIZE = 256 # Máximo de pesquisas guardadas no cache de resultados
+SEARCH_CACHE_TTL = 300 # Tempo (s) que um resultado fica no cache, mesmo sem mudanças no banco
+SUGGEST_LIMIT = 8 # Sugestões devolvidas pelo autocompletar
+SUGGEST_MAX_CANDIDATES = 400 # Entradas do índice de prefixos examinadas por consulta
+SUGGEST_CLIENTS = 256 # Quantos clientes (abas) têm a última consulta rastreada
 
 # Mapeamento de grupos para disjuntores
 RELAY_GROUPS = {
     "frente": [1, 2],
     "meio": [3, 4],
-    "fundo": [5, 6]
+    "fundo": [5, 6],
+    "todos": [1, 2, 3, 4, 5, 6] # Todas as luzes
 }
 # --- FIM ADICIONADO ---
 
@@ -69,55 +159,2145 @@ users_db = {
 def load_user(user_id):
     return users_db.get(int(user_id))
 
-# Função para conectar ao banco de dados SQLite
-def get_db_connection():
-    # Ajustar caminho para o diretório do projeto
-    db_path = os.path.join(os.path.dirname(__file__), 'songs.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+# --- Conexões com o banco de músicas ---
+# Conexões de longa duração, compartilhadas entre as threads do servidor: leitores
+# abertos em modo somente leitura ficam em um pool e são reutilizados (mantendo o
+# cache de páginas); as escritas usam uma única conexão protegida por lock.
+class SongsDatabase:
+    def __init__(self, path, pragmas, pool_size):
+        self.path = path
+        self.pragmas = pragmas
+        self._readers = queue.LifoQueue(maxsize=pool_size)
+        self._writer = None
+        self._write_lock = threading.RLock()
+
+    def connect(self, readonly=False):
+        if readonly:
+            conn = sqlite3.connect(f'{pathlib.Path(self.path).as_uri()}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @contextmanager
+    def read(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self.connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    # Transação de escrita: commit ao final do bloco, rollback em caso de erro
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self.connect()
+            with self._writer:
+                yield self._writer
+
+    def close_all(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+songs_db = SongsDatabase(SONGS_DB_PATH, SQLITE_PRAGMAS, SQLITE_READ_POOL_SIZE)
 
 # Inicializar banco de dados de músicas
 def init_songs_db():
-    db_path = os.path.join(os.path.dirname(__file__), 'songs.db')
-    if not os.path.exists(db_path):
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS songs (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                categories TEXT
+    global songs_fts_available
+    if not os.path.exists(SONGS_DB_PATH):
+        with songs_db.write() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS songs (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    categories TEXT
+                )
+            ''')
+            sample_songs = [
+                ('TUDO O QUE JESUS CONQUISTOU NA CRUZ', 'É DIREITO NOSSO E NOSSA HERANÇAnTODAS AS BENÇÃOS DE DEUS PRA NÓSnTOMAMOS POSSE É NOSSA HERANÇAn TODA VIDA TODO PODERnTUDO O QUE DEUS TEM PARA DARnABRIMOS NOSSAS VIDAS PRA RECEBERnNADA MAIS NOS RESISTIRÁn MAIOR É O QUE ESTÁ EM NÓSnDO QUE O QUE ESTÁ NO MUNDO', 'SEXTA, SEXTA-FEIRA'),
+                ('O REI E O LADRÃO', 'MEUS OLHOS TÃO CANSADOSnE MARCADOS PELA DORnNÃO ME IMPORTAVA MAIS A VIDAnSEM QUALQUER VALORnHUMILHADO EM UMA CRUZnVENDO ÓDIO EM CADA OLHAR', 'CONHECIDAS, DOMINGO, DOMINGO, QUARTA, QUARTA-FEIRA, SEXTA, SEXTA-FEIRA')
+            ]
+            conn.executemany('INSERT INTO songs (title, content, categories) VALUES (?, ?, ?)', sample_songs)
+        logger.info("Banco de dados de músicas inicializado com exemplos")
+    with songs_db.write() as conn:
+        journal_mode = conn.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}').fetchone()[0]
+        if journal_mode.upper() != SQLITE_JOURNAL_MODE.upper():
+            logger.warning(f"Não foi possível ativar o modo {SQLITE_JOURNAL_MODE} no banco de músicas (modo atual: {journal_mode}).")
+    migrate_songs_db()
+    with songs_db.write() as conn:
+        songs_fts_available = ensure_search_index(conn)
+        sync_song_categories(conn)
+        sync_song_lines(conn)
+
+# --- Migrações do schema do songs.db ---
+# Cada migração roda uma única vez, em ordem e dentro de uma transação. A última
+# versão aplicada fica em PRAGMA user_version, então a inicialização pula as que
+# já foram feitas. Novas migrações devem ser adicionadas ao final da lista.
+def migrate_songs_db():
+    with songs_db.write() as conn:
+        current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, description, migration in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        logger.info(f"Aplicando migração {version} do banco de músicas: {description}")
+        with songs_db.write() as conn:
+            conn.execute('BEGIN')
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        current_version = version
+
+# 1: songs.id passa a ser INTEGER PRIMARY KEY (busca por id sem varrer a tabela)
+def migration_songs_primary_key(conn):
+    # Índice criado pela primeira versão do FTS; com id como chave primária ele é redundante
+    conn.execute('DROP INDEX IF EXISTS idx_songs_id')
+    columns = {column['name']: column for column in conn.execute('PRAGMA table_info(songs)')}
+    if columns['id']['pk']:
+        return # Bancos criados por init_songs_db já nascem com a chave primária
+    # IDs nulos ou repetidos recebem um novo ID após o maior existente
+    next_id = (conn.execute('SELECT MAX(id) FROM songs').fetchone()[0] or 0) + 1
+    seen = set()
+    for row in conn.execute('SELECT rowid, id FROM songs ORDER BY rowid').fetchall():
+        if row['id'] is None or row['id'] in seen:
+            conn.execute('UPDATE songs SET id = ? WHERE rowid = ?', (next_id, row['rowid']))
+            logger.warning(f"Música com ID {row['id']} nulo ou duplicado recebeu o ID {next_id}.")
+            seen.add(next_id)
+            next_id += 1
+        else:
+            seen.add(row['id'])
+    conn.execute('''
+        CREATE TABLE songs_new (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            categories TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO songs_new (id, title, content, categories)
+        SELECT id, COALESCE(title, ''), COALESCE(content, ''), categories FROM songs ORDER BY rowid
+    ''')
+    conn.execute('DROP TABLE songs') # Remove também as triggers do índice FTS, recriadas em ensure_search_index
+    conn.execute('ALTER TABLE songs_new RENAME TO songs')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'songs_fts'").fetchone():
+        conn.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+
+# 2: categorias normalizadas (sem duplicatas) em categories + song_categories
+def migration_categories(conn):
+    conn.execute('''
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE song_categories (
+            song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+            category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+            PRIMARY KEY (song_id, category_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_song_categories_category ON song_categories(category_id, song_id)')
+    # A coluna songs.categories continua sendo a fonte (é ela que o DB Browser edita):
+    # ao mudar ou apagar uma música, suas linhas em song_categories são descartadas
+    # e sync_song_categories as recria.
+    conn.execute('''
+        CREATE TRIGGER song_categories_ad AFTER DELETE ON songs BEGIN
+            DELETE FROM song_categories WHERE song_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER song_categories_au AFTER UPDATE OF id, categories ON songs BEGIN
+            DELETE FROM song_categories WHERE song_id = old.id;
+        END
+    ''')
+    sync_song_categories(conn)
+
+# 3: data da última alteração de cada música (Last-Modified de /api/songs/<id>).
+# Fica em uma tabela separada para que as triggers não precisem alterar songs,
+# o que dispararia de novo as triggers do índice FTS.
+def migration_song_revisions(conn):
+    conn.execute('''
+        CREATE TABLE song_revisions (
+            song_id INTEGER PRIMARY KEY,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('INSERT INTO song_revisions (song_id, updated_at) SELECT id, CURRENT_TIMESTAMP FROM songs')
+    conn.execute('''
+        CREATE TRIGGER song_revisions_ai AFTER INSERT ON songs BEGIN
+            INSERT OR REPLACE INTO song_revisions (song_id, updated_at) VALUES (new.id, CURRENT_TIMESTAMP);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER song_revisions_au AFTER UPDATE ON songs BEGIN
+            DELETE FROM song_revisions WHERE song_id = old.id;
+            INSERT OR REPLACE INTO song_revisions (song_id, updated_at) VALUES (new.id, CURRENT_TIMESTAMP);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER song_revisions_ad AFTER DELETE ON songs BEGIN
+            DELETE FROM song_revisions WHERE song_id = old.id;
+        END
+    ''')
+
+# 4: letras já divididas em estrofes e versos, uma linha por verso
+def migration_song_lines(conn):
+    conn.execute('''
+        CREATE TABLE song_lines (
+            song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            stanza INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (song_id, position)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER song_lines_ad AFTER DELETE ON songs BEGIN
+            DELETE FROM song_lines WHERE song_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER song_lines_au AFTER UPDATE OF id, content ON songs BEGIN
+            DELETE FROM song_lines WHERE song_id = old.id;
+        END
+    ''')
+    sync_song_lines(conn)
+
+SCHEMA_MIGRATIONS = [
+    (1, 'chave primária em songs.id', migration_songs_primary_key),
+    (2, 'tabelas categories e song_categories', migration_categories),
+    (3, 'tabela song_revisions', migration_song_revisions),
+    (4, 'tabela song_lines', migration_song_lines),
+]
+
+def parse_categories(categories):
+    names = []
+    for name in (categories or '').split(','):
+        name = ' '.join(name.split()).upper()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+# Preenche song_categories para as músicas que ainda não têm linhas lá
+# (músicas novas ou com categorias alteradas desde a última sincronização)
+def sync_song_categories(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'song_categories'").fetchone():
+        return 0
+    rows = conn.execute('''
+        SELECT id, categories FROM songs
+        WHERE categories IS NOT NULL AND categories != ''
+          AND id NOT IN (SELECT song_id FROM song_categories)
+    ''').fetchall()
+    for row in rows:
+        for name in parse_categories(row['categories']):
+            conn.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (name,))
+            conn.execute('''
+                INSERT OR IGNORE INTO song_categories (song_id, category_id)
+                SELECT ?, id FROM categories WHERE name = ?
+            ''', (row['id'], name))
+    # Categorias que não têm mais nenhuma música
+    conn.execute('DELETE FROM categories WHERE id NOT IN (SELECT category_id FROM song_categories)')
+    return len(rows)
+
+# Divide a letra em estrofes (listas de versos). Versos são separados por ';' ou
+# quebra de linha e um verso vazio separa estrofes. Letras antigas usam um 'n'
+# minúsculo como separador no meio do texto em maiúsculas: só nesse caso o 'n' é
+# tratado como quebra de linha, para não cortar palavras de letras normais.
+def parse_song_content(content):
+    text = content or ''
+    if 'n' in text and not any(char.islower() for char in text.replace('n', '')):
+        text = text.replace('n', '\n')
+    stanzas = [[]]
+    for line in re.split(r'\r?\n|;', text):
+        line = line.strip()
+        if line:
+            stanzas[-1].append(line)
+        elif stanzas[-1]:
+            stanzas.append([])
+    if not stanzas[-1]:
+        stanzas.pop()
+    return stanzas
+
+# Preenche song_lines para as músicas que ainda não têm versos lá (músicas
+# novas ou com a letra alterada desde a última sincronização)
+def sync_song_lines(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'song_lines'").fetchone():
+        return 0
+    rows = conn.execute('''
+        SELECT id, content FROM songs
+        WHERE content IS NOT NULL AND content != ''
+          AND id NOT IN (SELECT song_id FROM song_lines)
+    ''').fetchall()
+    for row in rows:
+        lines = []
+        for stanza, verses in enumerate(parse_song_content(row['content'])):
+            for text in verses:
+                lines.append((row['id'], len(lines), stanza, text))
+        conn.executemany('INSERT INTO song_lines (song_id, position, stanza, text) VALUES (?, ?, ?, ?)', lines)
+    return len(rows)
+
+# Música com a letra em estrofes, lida de song_lines (ou da letra bruta, se a
+# música foi editada há pouco e ainda não foi sincronizada)
+def read_song(conn, song_id):
+    song = conn.execute('''
+        SELECT s.id, s.title, s.content, s.categories, r.updated_at
+        FROM songs s LEFT JOIN song_revisions r ON r.song_id = s.id
+        WHERE s.id = ?
+    ''', (song_id,)).fetchone()
+    if song is None:
+        return None, None
+    lines = conn.execute('SELECT stanza, text FROM song_lines WHERE song_id = ? ORDER BY position', (song_id,)).fetchall()
+    if not lines:
+        return song, parse_song_content(song['content'])
+    return song, [[line['text'] for line in group] for _, group in itertools.groupby(lines, key=lambda line: line['stanza'])]
+
+songs_fts_available = False
+_songs_db_ready = False
+_songs_db_lock = threading.Lock()
+
+# Garante (uma única vez por processo) que o banco e os índices de pesquisa existam
+def ensure_songs_db():
+    global _songs_db_ready
+    if _songs_db_ready:
+        return
+    with _songs_db_lock:
+        if not _songs_db_ready:
+            init_songs_db()
+            _songs_db_ready = True
+    if SONGS_IN_MEMORY:
+        song_corpus.start()
+
+# Índice de texto completo (FTS5) sobre a tabela songs. O índice usa a própria
+# tabela songs como conteúdo externo e é mantido em sincronia por triggers, então
+# edições feitas no DB Browser também são indexadas.
+SONGS_FTS_TRIGGERS = {
+    'songs_fts_ai': '''
+        CREATE TRIGGER IF NOT EXISTS songs_fts_ai AFTER INSERT ON songs BEGIN
+            INSERT INTO songs_fts(rowid, title, content, categories)
+            VALUES (new.id, new.title, new.content, new.categories);
+        END
+    ''',
+    'songs_fts_ad': '''
+        CREATE TRIGGER IF NOT EXISTS songs_fts_ad AFTER DELETE ON songs BEGIN
+            INSERT INTO songs_fts(songs_fts, rowid, title, content, categories)
+            VALUES ('delete', old.id, old.title, old.content, old.categories);
+        END
+    ''',
+    'songs_fts_au': '''
+        CREATE TRIGGER IF NOT EXISTS songs_fts_au AFTER UPDATE ON songs BEGIN
+            INSERT INTO songs_fts(songs_fts, rowid, title, content, categories)
+            VALUES ('delete', old.id, old.title, old.content, old.categories);
+            INSERT INTO songs_fts(rowid, title, content, categories)
+            VALUES (new.id, new.title, new.content, new.categories);
+        END
+    '''
+}
+
+def ensure_search_index(conn):
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'songs_fts'").fetchone() is not None
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+                title, content, categories,
+                content='songs', content_rowid='id',
+                tokenize='{SONGS_FTS_TOKENIZER}'
             )
         ''')
-        sample_songs = [
-            ('TUDO O QUE JESUS CONQUISTOU NA CRUZ', 'É DIREITO NOSSO E NOSSA HERANÇAnTODAS AS BENÇÃOS DE DEUS PRA NÓSnTOMAMOS POSSE É NOSSA HERANÇAn TODA VIDA TODO PODERnTUDO O QUE DEUS TEM PARA DARnABRIMOS NOSSAS VIDAS PRA RECEBERnNADA MAIS NOS RESISTIRÁn MAIOR É O QUE ESTÁ EM NÓSnDO QUE O QUE ESTÁ NO MUNDO', 'SEXTA, SEXTA-FEIRA'),
-            ('O REI E O LADRÃO', 'MEUS OLHOS TÃO CANSADOSnE MARCADOS PELA DORnNÃO ME IMPORTAVA MAIS A VIDAnSEM QUALQUER VALORnHUMILHADO EM UMA CRUZnVENDO ÓDIO EM CADA OLHAR', 'CONHECIDAS, DOMINGO, DOMINGO, QUARTA, QUARTA-FEIRA, SEXTA, SEXTA-FEIRA')
-        ]
-        cursor.executemany('INSERT INTO songs (title, content, categories) VALUES (?, ?, ?)', sample_songs)
+        for trigger_sql in SONGS_FTS_TRIGGERS.values():
+            conn.execute(trigger_sql)
+        if not exists:
+            conn.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+            logger.info("Índice de texto completo (FTS5) das músicas criado.")
         conn.commit()
-        conn.close()
-        logger.info("Banco de dados de músicas inicializado com exemplos")
+        return True
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        logger.warning(f"FTS5 indisponível no SQLite ({str(e)}). A pesquisa usará LIKE.")
+        return False
+
+# Converte o termo digitado em uma consulta FTS5: cada palavra vira um prefixo e todas são obrigatórias
+def build_fts_query(search_term):
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', search_term))
+
+# Normaliza texto para comparação: sem acentos, minúsculo e só letras/números
+def normalize_text(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.findall(r'[^\W_]+', text))
+
+# normalize_text para uma única palavra, com cache (o vocabulário do hinário é pequeno)
+@functools.lru_cache(maxsize=65536)
+def fold_word(word):
+    return normalize_text(word)
+
+def first_lines(content, count):
+    lines = [line for stanza in parse_song_content(content) for line in stanza]
+    return ' '.join(lines[:count])
+
+# --- Detecção de mudanças no songs.db ---
+# Mantém um contador de versão que só aumenta quando o banco muda (PRAGMA
+# data_version ou tamanho/mtime do arquivo), inclusive por edições no DB Browser.
+# Os índices em memória comparam esse contador antes de usar seus dados.
+class SongsChangeMonitor:
+    def __init__(self, db_path, interval):
+        self.db_path = db_path
+        self.interval = interval
+        self.version = 0
+        self._conn = None
+        self._signature = None
+        self._last_check = 0
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        if time.monotonic() - self._last_check < self.interval:
+            return self.version
+        with self._lock:
+            if time.monotonic() - self._last_check >= self.interval:
+                signature = self._read_signature()
+                if signature != self._signature:
+                    if self._signature is not None:
+                        logger.info("Mudança detectada no banco de músicas.")
+                    self._signature = signature
+                    self.version += 1
+                self._last_check = time.monotonic()
+        return self.version
+
+    def _read_signature(self):
+        try:
+            stat = os.stat(self.db_path)
+            if self._conn is None:
+                self._conn = songs_db.connect(readonly=True)
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            return (data_version, stat.st_mtime_ns, stat.st_size)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Não foi possível verificar mudanças no banco de músicas: {str(e)}")
+            return None
+
+songs_monitor = SongsChangeMonitor(SONGS_DB_PATH, SONGS_CHANGE_CHECK_INTERVAL)
+
+# --- Índice de trigramas para pesquisa aproximada ---
+# Indexa título e primeiros versos normalizados de cada música. É construído na
+# primeira pesquisa e, a cada mudança no banco, só as músicas alteradas são
+# reindexadas. Nenhuma consulta percorre as letras completas.
+class TrigramIndex:
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self._version = None
+        self._postings = defaultdict(set) # trigrama -> {(id da música, campo)}
+        self._keys = {} # (id da música, campo) -> (texto normalizado, trigramas)
+        self._sources = {} # id da música -> (título, primeiros versos)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def trigrams(text):
+        grams = set()
+        for word in text.split():
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    def ensure_current(self):
+        version = self.monitor.current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            with songs_db.read() as conn:
+                rows = conn.execute('SELECT id, title, substr(content, 1, 400) AS head FROM songs').fetchall()
+            changed = self._sync((row['id'], row['title'] or '', first_lines(row['head'], FUZZY_FIRST_LINES)) for row in rows)
+            if self._version is not None:
+                logger.info(f"Índice de trigramas atualizado ({changed} música(s) alterada(s)).")
+            self._version = version
+
+    def _sync(self, songs):
+        changed = 0
+        seen = set()
+        for song_id, title, lines in songs:
+            seen.add(song_id)
+            if self._sources.get(song_id) != (title, lines):
+                self._remove(song_id)
+                self._add(song_id, title, lines)
+                changed += 1
+        for song_id in set(self._sources) - seen:
+            self._remove(song_id)
+            changed += 1
+        return changed
+
+    def _add(self, song_id, title, lines):
+        self._sources[song_id] = (title, lines)
+        for field, text in (('title', title), ('lines', lines)):
+            normalized = normalize_text(text)
+            grams = self.trigrams(normalized)
+            if not grams:
+                continue
+            key = (song_id, field)
+            self._keys[key] = (text, grams)
+            for gram in grams:
+                self._postings[gram].add(key)
+
+    def _remove(self, song_id):
+        if self._sources.pop(song_id, None) is None:
+            return
+        for field in ('title', 'lines'):
+            entry = self._keys.pop((song_id, field), None)
+            if entry is None:
+                continue
+            for gram in entry[1]:
+                self._postings[gram].discard((song_id, field))
+                if not self._postings[gram]:
+                    del self._postings[gram]
+
+    # Retorna [(id, similaridade, texto casado)] ordenado pela melhor similaridade
+    def search(self, query, limit, min_similarity=FUZZY_MIN_SIMILARITY):
+        self.ensure_current()
+        query_grams = self.trigrams(normalize_text(query))
+        if not query_grams:
+            return []
+        with self._lock:
+            shared = defaultdict(int)
+            for gram in query_grams:
+                for key in self._postings.get(gram, ()):
+                    shared[key] += 1
+            best = {}
+            for key, count in shared.items():
+                text, grams = self._keys[key]
+                similarity = count / (len(query_grams) + len(grams) - count)
+                if similarity >= min_similarity and similarity > best.get(key[0], (0,))[0]:
+                    best[key[0]] = (similarity, text)
+        ranked = sorted(best.items(), key=lambda item: -item[1][0])[:limit]
+        return [(song_id, similarity, text) for song_id, (similarity, text) in ranked]
+
+fuzzy_index = TrigramIndex(songs_monitor)
+
+# --- Índice de prefixos para o autocompletar ---
+# Lista ordenada com o título e o primeiro verso normalizados de cada música, a
+# partir de cada início de palavra ("je" encontra "TUDO O QUE JESUS..."). Uma
+# consulta é uma busca binária seguida de uma varredura curta. É refeito quando
+# o banco muda.
+class PrefixIndex:
+    def __init__(self, monitor):
+        self.monitor = monitor
+        # (versão, textos normalizados ordenados, [(id da música, rank, texto original)]
+        # paralelos aos textos, {id da música: título}). Trocado numa única atribuição,
+        # então quem lê sem o lock nunca mistura dados de duas versões.
+        self._index = (None, [], [], {})
+        self._lock = threading.Lock()
+
+    def ensure_current(self):
+        version = self.monitor.current_version()
+        if version == self._index[0]:
+            return
+        with self._lock:
+            if version == self._index[0]:
+                return
+            with songs_db.read() as conn:
+                rows = conn.execute('SELECT id, title, substr(content, 1, 400) AS head FROM songs').fetchall()
+            items = []
+            for row in rows:
+                # rank: 0 = início do título, 1 = início do primeiro verso, 2/3 = outra palavra deles
+                for rank, text in ((0, row['title'] or ''), (1, first_lines(row['head'], 1))):
+                    words = normalize_text(text).split()
+                    for index in range(len(words)):
+                        items.append((' '.join(words[index:]), (row['id'], rank if index == 0 else rank + 2, text)))
+            items.sort(key=lambda item: item[0])
+            self._index = (version, [key for key, _ in items], [entry for _, entry in items],
+                           {row['id']: row['title'] for row in rows})
+
+    def suggest(self, prefix, limit):
+        self.ensure_current()
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+        _, keys, entries, titles = self._index
+        best = {}
+        start = bisect.bisect_left(keys, prefix)
+        for position in range(start, min(start + SUGGEST_MAX_CANDIDATES, len(keys))):
+            if not keys[position].startswith(prefix):
+                break
+            song_id, rank, text = entries[position]
+            if song_id not in best or rank < best[song_id][0]:
+                best[song_id] = (rank, text)
+        ranked = sorted(best.items(), key=lambda item: (item[1][0], len(item[1][1]), item[1][1]))[:limit]
+        return [{
+            'id': song_id,
+            'title': titles.get(song_id, text),
+            'match': 'title' if rank in (0, 2) else 'line',
+            'text': text
+        } for song_id, (rank, text) in ranked]
+
+prefix_index = PrefixIndex(songs_monitor)
+
+# Última consulta de autocompletar de cada cliente (aba do navegador). Consultas
+# que chegam atrasadas, ou que terminam depois de uma mais nova do mesmo cliente,
+# são descartadas sem resposta.
+class SuggestRequestTracker:
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+        self.superseded = 0
+
+    # Registra a consulta; False se já existe uma mais nova do mesmo cliente
+    def begin(self, client, seq):
+        with self._lock:
+            if seq < self._latest.get(client, -1):
+                self.superseded += 1
+                return False
+            self._latest[client] = seq
+            self._latest.move_to_end(client)
+            while len(self._latest) > self.max_clients:
+                self._latest.popitem(last=False)
+            return True
+
+    def is_current(self, client, seq):
+        with self._lock:
+            if self._latest.get(client, seq) > seq:
+                self.superseded += 1
+                return False
+            return True
+
+suggest_tracker = SuggestRequestTracker(SUGGEST_CLIENTS)
+
+# --- Hinário em memória ---
+# Uma cópia compacta de todas as músicas, organizada em "slots" (posição nas
+# listas paralelas), com índice invertido palavra -> slots. Cada snapshot é
+# imutável: quando o banco muda, um novo snapshot é montado em segundo plano e
+# trocado de uma vez, então as pesquisas nunca esperam a recarga.
+class CorpusSnapshot:
+    COLUMN_WEIGHTS = SEARCH_FTS_WEIGHTS # título, letra e categorias, como no bm25() do FTS5
+    BM25_K1, BM25_B = 1.2, 0.75 # Constantes fixas do bm25() do FTS5
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.ids = array('q')
+        self.titles = []
+        self.contents = []
+        self.categories = []
+        self.folded = [] # (título, letra, categorias) em casefold, para o modo exact
+        self.lengths = array('I') # Palavras por música, somando as três colunas
+        self.slot_by_id = {}
+        postings = (defaultdict(list), defaultdict(list), defaultdict(list))
+        for slot, row in enumerate(rows):
+            song_id, title, content, categories = row[0], row[1] or '', row[2] or '', row[3] or ''
+            self.ids.append(song_id)
+            self.titles.append(title)
+            self.contents.append(content)
+            self.categories.append(categories)
+            self.folded.append((title.casefold(), content.casefold(), categories.casefold()))
+            self.slot_by_id[song_id] = slot
+            length = 0
+            for column, text in enumerate((title, content, categories)):
+                tokens = normalize_text(text).split()
+                length += len(tokens)
+                for token, count in Counter(tokens).items():
+                    postings[column][token].append((slot, count))
+            self.lengths.append(length)
+        # Por coluna: palavra -> (slots, ocorrências em cada slot)
+        self.postings = tuple({token: (array('I', [slot for slot, _ in entries]), array('I', [count for _, count in entries]))
+                               for token, entries in column.items()} for column in postings)
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        self.vocabulary = sorted(set().union(*self.postings))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, search_term, mode, limit, offset=0):
+        if mode == 'fuzzy':
+            return [self._song(self.slot_by_id[song_id], snippet=text, score=round(similarity, 3))
+                    for song_id, similarity, text in fuzzy_index.search(search_term, offset + limit)[offset:]
+                    if song_id in self.slot_by_id]
+        if mode == 'exact':
+            term = search_term.casefold()
+            slots = (slot for slot, fields in enumerate(self.folded) if any(term in field for field in fields))
+            return [self._song(slot) for slot in itertools.islice(slots, offset, offset + limit)]
+        return self._search_tokens(normalize_text(search_term).split(), limit, offset)
+
+    # Todas as palavras são obrigatórias e valem como prefixo. O ranking é o mesmo
+    # bm25 do FTS5 (pesos por coluna, mesmas constantes), com score negativo:
+    # menor é melhor, então as duas implementações devolvem a mesma ordem.
+    def _search_tokens(self, tokens, limit, offset):
+        if not tokens:
+            return []
+        matches = None
+        per_token = []
+        for token in tokens:
+            frequencies = defaultdict(float) # slot -> ocorrências ponderadas pelo peso da coluna
+            start = bisect.bisect_left(self.vocabulary, token)
+            for word in self.vocabulary[start:start + SEARCH_PREFIX_EXPANSIONS]:
+                if not word.startswith(token):
+                    break
+                for column, weight in enumerate(self.COLUMN_WEIGHTS):
+                    slots, counts = self.postings[column].get(word, ((), ()))
+                    for slot, count in zip(slots, counts):
+                        frequencies[slot] += weight * count
+            matches = set(frequencies) if matches is None else matches & set(frequencies)
+            if not matches:
+                return []
+            idf = math.log((len(self) - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+            per_token.append((max(idf, 1e-6), frequencies))
+        scores = {}
+        for slot in matches:
+            norm = self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * self.lengths[slot] / self.average_length)
+            scores[slot] = -sum(idf * frequencies[slot] * (self.BM25_K1 + 1) / (frequencies[slot] + norm)
+                                for idf, frequencies in per_token)
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]))[offset:offset + limit]
+        # Trechos destacados só para a página pedida
+        return [self._song(slot, snippet=self._snippet(self.contents[slot], tokens),
+                           title_highlight=self._highlight(self.titles[slot], tokens), score=score)
+                for slot, score in ranked]
+
+    # Marca as palavras que começam com algum dos termos, como o highlight() do FTS5
+    @staticmethod
+    def _highlight(text, tokens):
+        return re.sub(r'[^\W_]+', lambda match: f'{SEARCH_MARK_START}{match.group()}{SEARCH_MARK_END}'
+                      if fold_word(match.group()).startswith(tuple(tokens)) else match.group(), text)
+
+    @staticmethod
+    def _snippet(content, tokens):
+        words = list(re.finditer(r'[^\W_]+', content))
+        hits = set()
+        first = None
+        for index, match in enumerate(words):
+            if first is not None and index >= first + SEARCH_SNIPPET_TOKENS:
+                break
+            if fold_word(match.group()).startswith(tuple(tokens)):
+                hits.add(index)
+                if first is None:
+                    first = max(index - SEARCH_SNIPPET_TOKENS // 3, 0)
+        if first is None:
+            return None
+        window = words[first:first + SEARCH_SNIPPET_TOKENS]
+        parts = []
+        position = window[0].start()
+        for index, match in enumerate(window, start=first):
+            parts.append(content[position:match.start()])
+            parts.append(f'{SEARCH_MARK_START}{match.group()}{SEARCH_MARK_END}' if index in hits else match.group())
+            position = match.end()
+        prefix = '…' if first > 0 else ''
+        suffix = '…' if first + SEARCH_SNIPPET_TOKENS < len(words) else ''
+        return prefix + ''.join(parts) + suffix
+
+    def _song(self, slot, snippet=None, title_highlight=None, score=None):
+        return {
+            'id': self.ids[slot],
+            'title': self.titles[slot],
+            'content': self.contents[slot],
+            'categories': self.categories[slot],
+            'title_highlight': title_highlight,
+            'snippet': snippet,
+            'score': score
+        }
+
+class SongCorpus:
+    def __init__(self, monitor, interval):
+        self.monitor = monitor
+        self.interval = interval
+        self.snapshot = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='songs-corpus', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            version = self.monitor.current_version()
+            if self.snapshot is None or self.snapshot.version != version:
+                try:
+                    self.snapshot = self._build(version)
+                    fuzzy_index.ensure_current() # Atualiza também o índice de trigramas fora das pesquisas
+                    prefix_index.ensure_current()
+                    category_facets.ensure_current()
+                except Exception as e:
+                    logger.error(f"Erro ao carregar o hinário em memória: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def _build(self, version):
+        started = time.monotonic()
+        with songs_db.write() as conn:
+            sync_song_lines(conn) # Divide em versos as letras novas ou editadas por fora
+        with songs_db.read() as conn:
+            rows = conn.execute('SELECT id, title, content, categories FROM songs ORDER BY rowid').fetchall()
+        snapshot = CorpusSnapshot(version, rows)
+        logger.info(f"Hinário carregado em memória: {len(snapshot)} músicas em {(time.monotonic() - started) * 1000:.0f} ms.")
+        return snapshot
+
+song_corpus = SongCorpus(songs_monitor, SONGS_CORPUS_RELOAD_INTERVAL)
+
+# --- Facetas de categoria ---
+# Cada categoria guarda um bitmap (int do Python) com um bit por música; as
+# músicas ficam ordenadas por título, então a interseção de várias categorias
+# já sai em ordem alfabética. Tudo é recalculado só quando o banco muda.
+class CategoryFacets:
+    def __init__(self, monitor):
+        self.monitor = monitor
+        # (versão, [(id, título, categorias)] por posição do bit, [(id, nome, quantidade)]
+        # em ordem alfabética, {nome da categoria: bitmap das músicas}). Publicado numa
+        # única atribuição: bitmaps e lista de músicas são sempre da mesma versão.
+        self._facets = (None, [], [], {})
+        self._lock = threading.Lock()
+
+    def ensure_current(self):
+        version = self.monitor.current_version()
+        if version == self._facets[0]:
+            return
+        with self._lock:
+            if version == self._facets[0]:
+                return
+            started = time.monotonic()
+            with songs_db.write() as conn:
+                sync_song_categories(conn) # Músicas editadas por fora desde a última vez
+            with songs_db.read() as conn:
+                songs = conn.execute('SELECT id, title FROM songs ORDER BY title, id').fetchall()
+                links = conn.execute('''
+                    SELECT sc.song_id, c.name FROM song_categories sc
+                    JOIN categories c ON c.id = sc.category_id
+                    ORDER BY c.name
+                ''').fetchall()
+                categories = conn.execute('SELECT id, name FROM categories ORDER BY name').fetchall()
+            slot_by_id = {row['id']: slot for slot, row in enumerate(songs)}
+            names_by_slot = defaultdict(list)
+            bitmaps = defaultdict(int)
+            for link in links:
+                slot = slot_by_id.get(link['song_id'])
+                if slot is not None:
+                    bitmaps[link['name']] |= 1 << slot
+                    names_by_slot[slot].append(link['name'])
+            counts = [(row['id'], row['name'], bin(bitmaps[row['name']]).count('1')) for row in categories if bitmaps[row['name']]]
+            self._facets = (version, [(row['id'], row['title'], ', '.join(names_by_slot[slot])) for slot, row in enumerate(songs)],
+                            counts, dict(bitmaps))
+            logger.info(f"Facetas de categoria calculadas: {len(counts)} categorias em {(time.monotonic() - started) * 1000:.0f} ms.")
+
+    def categories(self):
+        self.ensure_current()
+        return [{'id': category_id, 'name': name, 'count': count} for category_id, name, count in self._facets[2]]
+
+    # Músicas que estão em todas as categorias pedidas (sem categorias: todas as músicas)
+    def songs(self, names):
+        self.ensure_current()
+        _, songs, _, bitmaps = self._facets
+        if names:
+            bits = -1
+            for name in names:
+                bits &= bitmaps.get(name, 0)
+        else:
+            bits = (1 << len(songs)) - 1
+        result = []
+        while bits:
+            low = bits & -bits
+            song_id, title, categories = songs[low.bit_length() - 1]
+            result.append({'id': song_id, 'title': title, 'categories': categories})
+            bits ^= low
+        return result
+
+category_facets = CategoryFacets(songs_monitor)
+
+# --- Cache de resultados de pesquisa ---
+# LRU com limite de tamanho e TTL. Cada entrada guarda a versão dos dados que a
+# produziu; quando a versão muda (banco alterado), o cache inteiro é descartado.
+class SearchCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._check_version(version)
+            if version != self._version:
+                return # Resultado de uma versão antiga dos dados
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _check_version(self, version):
+        if self._version is None or version > self._version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxSize': self.maxsize,
+                'ttl': self.ttl,
+                'dataVersion': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+# Chave do cache: o modo exact diferencia acentos; os demais modos já os ignoram
+def search_cache_key(search_term, mode, offset=0, limit=SEARCH_RESULTS_LIMIT):
+    if mode == 'exact':
+        return (mode, ' '.join(search_term.casefold().split()), offset, limit)
+    return (mode, normalize_text(search_term), offset, limit)
+
+# O cursor de paginação é opaco para o cliente; por dentro é só a posição no ranking
+def encode_search_cursor(offset):
+    return base64.urlsafe_b64encode(f'o{offset}'.encode()).decode().rstrip('=')
+
+def decode_search_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        offset = int(value[1:]) if value.startswith('o') else -1
+    except (ValueError, UnicodeDecodeError):
+        offset = -1
+    if offset < 0:
+        raise ValueError(f'Cursor de paginação inválido: {cursor}')
+    return offset
+
+# --- Loop asyncio em segundo plano ---
+# Um único event loop, em uma thread da aplicação, executa todo o código asyncio
+# (sessão com o OBS, preview, projeção). As rotas síncronas do Flask entregam
+# corrotinas com run(): no máximo max_pending executam ao mesmo tempo, cada uma
+# com timeout aplicado dentro do loop (a corrotina é cancelada, não abandonada),
+# e com o limite atingido a rota recebe BackgroundLoopBusy em vez de acumular
+# threads esperando.
+class BackgroundLoopBusy(Exception):
+    pass
+
+class BackgroundLoop:
+    def __init__(self, name, max_pending, queue_wait):
+        self.name = name
+        self.max_pending = max_pending
+        self.queue_wait = queue_wait
+        self.loop = None
+        self.pending = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._thread = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def stop(self, timeout=5):
+        with self._lock:
+            if self._thread is None:
+                return
+            thread, loop = self._thread, self.loop
+            self._thread = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        self._started.clear()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        self.loop.run_forever()
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    # Tarefas de longa duração (reconexão, produtores em segundo plano): sem limite nem timeout
+    def spawn(self, coro):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
-# Função genérica para requisições ao OBS (do código fornecido)
+    # Executa uma corrotina a partir de código síncrono (handlers do Flask) e devolve o resultado
+    def run(self, coro, timeout):
+        if not self._slots.acquire(timeout=self.queue_wait):
+            coro.close()
+            with self._lock:
+                self.rejected += 1
+            raise BackgroundLoopBusy(f'Servidor ocupado: {self.max_pending} operações assíncronas em andamento')
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self.spawn(asyncio.wait_for(coro, timeout))
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout + 1) # Margem: o timeout é aplicado dentro do loop
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            future.cancel()
+            raise TimeoutError(f'Tempo esgotado após {timeout}s') from None
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def snapshot(self):
+        return {
+            'running': self._thread is not None,
+            'pending': self.pending,
+            'maxPending': self.max_pending,
+            'rejected': self.rejected
+        }
+
+app_loop = BackgroundLoop('asyncio-loop', ASYNC_LOOP_MAX_PENDING, ASYNC_LOOP_QUEUE_WAIT)
+
+# --- Circuit breakers dos serviços externos (OBS e API de relés) ---
+# Depois de algumas falhas seguidas o circuito abre e as chamadas falham na hora,
+# sem esperar timeouts, liberando as threads do Flask. A recuperação é testada em
+# segundo plano: pela função probe, quando informada, ou deixando uma única
+# requisição de teste passar após reset_timeout (estado half_open).
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_timeout, probe=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self.state = 'closed' # 'closed', 'open' ou 'half_open'
+        self.failures = 0 # Falhas seguidas
+        self.last_error = None
+        self.opened_at = None
+        self.rejected = 0 # Chamadas recusadas desde que o circuito abriu
+        self._retry_at = 0
+        self._probe_thread = None
+        self._close_handlers = []
+        self._lock = threading.Lock()
+
+    # Registra funções chamadas quando o serviço volta a responder
+    def add_close_handler(self, callback):
+        self._close_handlers.append(callback)
+
+    def is_open(self):
+        return self.state != 'closed'
+
+    def unavailable_message(self):
+        return f'{self.name} indisponível: {self.last_error}'
+
+    # Falha na hora se o serviço estiver fora do ar, sem ocupar uma tentativa de teste
+    def check(self):
+        if self.is_open():
+            raise CircuitOpenError(self.unavailable_message())
+
+    # Chamado antes de acessar o serviço; levanta CircuitOpenError se a chamada não deve ser feita
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and self.probe is None and time.monotonic() >= self._retry_at:
+                self.state = 'half_open' # Esta chamada é a tentativa de teste
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.unavailable_message())
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != 'closed'
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = None
+            self.rejected = 0
+            self._probe_thread = None
+        if recovered:
+            logger.info(f"{self.name} voltou a responder. Circuito fechado.")
+            for callback in self._close_handlers:
+                callback()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) or error.__class__.__name__
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self._open()
+
+    # Abre o circuito imediatamente (falha já conhecida, como a queda da conexão)
+    def trip(self, error):
+        with self._lock:
+            self.last_error = error
+            if self.state != 'open':
+                self._open()
+
+    def _open(self):
+        if self.state == 'closed':
+            self.opened_at = time.time()
+            logger.warning(f"{self.name} fora do ar ({self.last_error}). Chamadas vão falhar na hora até ele voltar.")
+        self.state = 'open'
+        self._retry_at = time.monotonic() + self.reset_timeout
+        if self.probe is not None and self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name=f'probe-{self.name}', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(max(0, self._retry_at - time.monotonic()))
+            with self._lock:
+                self.state = 'half_open'
+            try:
+                self.probe()
+            except Exception as e:
+                with self._lock:
+                    self.last_error = str(e) or e.__class__.__name__
+                    self.state = 'open'
+                    self._retry_at = time.monotonic() + self.reset_timeout
+                continue
+            self.record_success()
+            return
+
+    # Executa fn(*args, **kwargs) protegida pelo circuito; exceções de fn contam como falha
+    def call(self, fn, *args, **kwargs):
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    # Versão para corrotinas; cancelamentos (timeout de quem aguardava) também contam como falha
+    async def guard(self, coro):
+        try:
+            self.before_call()
+        except CircuitOpenError:
+            coro.close()
+            raise
+        try:
+            result = await coro
+        except BaseException as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'lastError': self.last_error,
+                'openedAt': self.opened_at,
+                'retryIn': round(max(0, self._retry_at - time.monotonic()), 1) if self.state != 'closed' else None,
+                'rejected': self.rejected
+            }
+
+# Código HTTP para erros de serviços externos: 503 quando o circuito ou o loop asyncio recusou a chamada
+def backend_error_status(error):
+    return 503 if isinstance(error, (CircuitOpenError, BackgroundLoopBusy)) else 500
+
+# --- Sessão persistente com o OBS WebSocket ---
+# Uma única conexão autenticada é compartilhada por todos os endpoints. Ela roda
+# no loop asyncio da aplicação, reconecta automaticamente com backoff exponencial
+# e expõe o estado da conexão sem precisar consultar o OBS.
+class OBSConnectionLost(Exception):
+    pass
+
+class OBSSession:
+    def __init__(self, loop, host, port, password):
+        self.loop = loop
+        self.url = f'ws://{host}:{port}'
+        self.password = password
+        self.state = 'disconnected' # 'disconnected', 'connecting' ou 'connected'
+        self.last_error = None
+        self.connected_since = None
+        self.reconnect_attempts = 0
+        self._ws = None
+        self._task = None # Tarefa de _supervise no loop
+        self._connected = None # asyncio.Event criado dentro do loop
+        self._inflight = set()
+        self._event_handlers = []
+        self._connect_handlers = []
+        self._disconnect_handlers = []
+        self._connect_failure_handlers = []
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._task is not None:
+                return
+            self._stopping = False
+            self.state = 'connecting'
+            # Agendada sob o lock: roda no loop antes de qualquer requisição enviada depois
+            self._task = self.loop.spawn(self._supervise())
+
+    def stop(self, timeout=5):
+        with self._lock:
+            if self._task is None:
+                return
+            task, self._task = self._task, None
+        self._stopping = True
+        try:
+            self.loop.spawn(self._shutdown()).result(timeout)
+        except Exception as e:
+            logger.warning(f"Erro ao encerrar sessão com o OBS: {str(e)}")
+        task.cancel() # Interrompe a espera do backoff de reconexão
+
+    # Registra uma corrotina chamada a cada evento do OBS (event=None recebe todos)
+    def add_event_handler(self, callback, event=None):
+        self._event_handlers.append((callback, event))
+
+    # Registra corrotinas chamadas quando a sessão conecta/desconecta
+    def add_connect_handler(self, callback):
+        self._connect_handlers.append(callback)
+
+    def add_disconnect_handler(self, callback):
+        self._disconnect_handlers.append(callback)
+
+    # Registra corrotinas chamadas a cada tentativa de conexão que falha (inclusive antes da primeira conexão)
+    def add_connect_failure_handler(self, callback):
+        self._connect_failure_handlers.append(callback)
+
+    def _notify(self, handlers):
+        loop = asyncio.get_running_loop()
+        for callback in handlers:
+            loop.create_task(callback())
+
+    async def _supervise(self):
+        self._connected = asyncio.Event()
+        delay = OBS_RECONNECT_MIN_DELAY
+        while not self._stopping:
+            self.state = 'connecting'
+            parameters = simpleobsws.IdentificationParameters(ignoreNonFatalRequestChecks=False)
+            ws = simpleobsws.WebSocketClient(url=self.url, password=self.password, identification_parameters=parameters)
+            for callback, event in self._event_handlers:
+                ws.register_event_callback(callback, event)
+            try:
+                await asyncio.wait_for(ws.connect(), OBS_CONNECT_TIMEOUT)
+                if not await ws.wait_until_identified(OBS_CONNECT_TIMEOUT):
+                    raise Exception('Tempo esgotado aguardando identificação no OBS WebSocket')
+            except asyncio.CancelledError:
+                # Sessão encerrada no meio da conexão: fecha o socket já aberto
+                try:
+                    await ws.disconnect()
+                except Exception:
+                    pass
+                raise
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+                self.reconnect_attempts += 1
+                self.state = 'disconnected'
+                try:
+                    await ws.disconnect()
+                except Exception:
+                    pass
+                self._notify(self._connect_failure_handlers)
+                logger.warning(f"Falha ao conectar ao OBS ({self.last_error}). Nova tentativa em {delay:.0f}s.")
+                await asyncio.sleep(delay + random.uniform(0, delay / 4))
+                delay = min(delay * 2, OBS_RECONNECT_MAX_DELAY)
+                continue
+
+            if self._stopping:
+                # stop() chegou durante a conexão (_shutdown não tinha socket para fechar)
+                await ws.disconnect()
+                break
+            delay = OBS_RECONNECT_MIN_DELAY
+            self._ws = ws
+            self.state = 'connected'
+            self.last_error = None
+            self.reconnect_attempts = 0
+            self.connected_since = time.time()
+            self._connected.set()
+            logger.info(f"Sessão com o OBS WebSocket estabelecida em {self.url}")
+            self._notify(self._connect_handlers)
+
+            # Aguarda o fim da tarefa de recepção da biblioteca, que termina quando a conexão cai
+            await asyncio.wait([ws.recv_task])
+
+            self._connected.clear()
+            self._ws = None
+            self.connected_since = None
+            self.state = 'disconnected'
+            self._notify(self._disconnect_handlers)
+            if not self._stopping:
+                self.last_error = 'Conexão com o OBS perdida'
+                logger.warning("Conexão com o OBS WebSocket perdida. Reconectando...")
+                # Requisições pendentes nunca receberiam resposta nesta conexão
+                for lost in list(self._inflight):
+                    if not lost.done():
+                        lost.set_result(None)
+
+    async def _shutdown(self):
+        ws = self._ws
+        if ws is not None:
+            await ws.disconnect()
+
+    async def call(self, request_type, request_data=None, timeout=OBS_REQUEST_TIMEOUT):
+        ws = await self._wait_connected()
+        return await self._track(ws.call(simpleobsws.Request(request_type, request_data or {}), timeout=timeout))
+
+    # Envia várias requisições em uma única ida e volta (RequestBatch do OBS WebSocket v5)
+    async def call_batch(self, requests, halt_on_failure=False, execution_type=None, timeout=OBS_REQUEST_TIMEOUT):
+        ws = await self._wait_connected()
+        return await self._track(ws.call_batch(requests, timeout=timeout, halt_on_failure=halt_on_failure,
+                                               execution_type=execution_type))
+
+    async def _wait_connected(self):
+        if not self._connected.is_set():
+            try:
+                await asyncio.wait_for(self._connected.wait(), OBS_CONNECTED_WAIT)
+            except asyncio.TimeoutError:
+                raise Exception(f'OBS desconectado: {self.last_error or "conectando..."}')
+        return self._ws
+
+    # Executa a requisição acompanhando a conexão: se ela cair, só a requisição falha com
+    # OBSConnectionLost. A tarefa de quem chamou (worker, produtor) não é cancelada.
+    async def _track(self, coro):
+        request = asyncio.ensure_future(coro)
+        lost = asyncio.get_running_loop().create_future()
+        self._inflight.add(lost)
+        try:
+            await asyncio.wait({request, lost}, return_when=asyncio.FIRST_COMPLETED)
+            if request.done():
+                return request.result()
+            raise OBSConnectionLost('Conexão com o OBS perdida durante a requisição')
+        finally:
+            self._inflight.discard(lost)
+            if not request.done():
+                request.cancel()
+
+    # Executa uma corrotina no loop a partir de código síncrono (handlers do Flask),
+    # com limite de operações simultâneas e timeout por chamada
+    def run(self, coro, timeout=OBS_REQUEST_TIMEOUT + OBS_CONNECTED_WAIT):
+        self.start()
+        try:
+            return self.loop.run(coro, timeout)
+        except TimeoutError:
+            raise Exception('Tempo esgotado aguardando resposta do OBS')
+        except concurrent.futures.CancelledError:
+            raise Exception('Conexão com o OBS perdida durante a requisição')
+
+    # Tarefas em segundo plano (produtor do preview, troca de cena) que não bloqueiam a rota
+    def submit(self, coro):
+        self.start()
+        return self.loop.spawn(coro)
+
+    def snapshot(self):
+        self.start()
+        return {
+            'state': self.state,
+            'connected': self.state == 'connected',
+            'url': self.url,
+            'connectedSince': self.connected_since,
+            'reconnectAttempts': self.reconnect_attempts,
+            'lastError': self.last_error
+        }
+
+obs_session = OBSSession(app_loop, OBS_HOST, OBS_PORT, OBS_PASSWORD)
+
+# O circuito do OBS abre assim que a sessão cai ou uma tentativa de conexão falha
+# (também quando o OBS nunca esteve no ar) e fecha quando ela conecta: a própria
+# sessão faz a sondagem em segundo plano, com backoff.
+obs_breaker = CircuitBreaker('OBS', OBS_BREAKER_FAILURES, OBS_BREAKER_RESET_TIMEOUT)
+
+async def _close_obs_breaker():
+    obs_breaker.record_success()
+
+async def _trip_obs_breaker():
+    obs_breaker.trip(obs_session.last_error or 'Conexão com o OBS perdida')
+
+obs_session.add_connect_handler(_close_obs_breaker) # Registrado antes dos demais: o espelho já sincroniza com o circuito fechado
+obs_session.add_disconnect_handler(_trip_obs_breaker)
+obs_session.add_connect_failure_handler(_trip_obs_breaker)
+
+# Função genérica para requisições ao OBS (executada no loop da sessão compartilhada)
 async def obs_request(request_type, request_data=None):
-    parameters = simpleobsws.IdentificationParameters(ignoreNonFatalRequestChecks=False)
-    ws = simpleobsws.WebSocketClient(
-        url=f'ws://{OBS_HOST}:{OBS_PORT}',
-        password=OBS_PASSWORD,
-        identification_parameters=parameters
-    )
-    await ws.connect()
-    await ws.wait_until_identified()
-    response = await ws.call(simpleobsws.Request(request_type, request_data or {}))
-    await ws.disconnect()
+    response = await obs_breaker.guard(obs_session.call(request_type, request_data))
     if response.ok():
-        return response.responseData
+        return response.responseData or {}
     else:
-        status = response.requestStatus
-        error_message = status.comment if hasattr(status, 'comment') and status.comment else f'Código de erro: {status.code}'
-        raise Exception(f'Falha na requisição OBS ({request_type}): {error_message}')
+        raise Exception(f'Falha na requisição OBS ({request_type}): {obs_error_message(response)}')
+
+# Envia um lote de simpleobsws.Request e retorna as respostas na mesma ordem
+async def obs_request_batch(requests, halt_on_failure=False, execution_type=None):
+    return await obs_breaker.guard(obs_session.call_batch(requests, halt_on_failure=halt_on_failure,
+                                                         execution_type=execution_type))
+
+def obs_error_message(response):
+    status = response.requestStatus
+    return status.comment if hasattr(status, 'comment') and status.comment else f'Código de erro: {status.code}'
+
+# Versão síncrona de obs_request para uso nas rotas do Flask
+def obs_request_sync(request_type, request_data=None):
+    return obs_session.run(obs_request(request_type, request_data))
+
+# --- Estado compartilhado com notificação de mudanças ---
+# Guarda um dicionário com um número de versão. Leitores obtêm um snapshot sem
+# bloquear e streams (SSE) aguardam a próxima versão em vez de fazer polling.
+class VersionedState:
+    _any_change = threading.Condition() # Comum a todas as instâncias: um stream pode aguardar vários estados
+
+    def __init__(self, initial):
+        self.data = dict(initial)
+        self.version = 0
+        self._cond = threading.Condition()
+
+    def update(self, **changes):
+        with self._cond:
+            if all(self.data.get(key) == value for key, value in changes.items()):
+                return False
+            self.data = {**self.data, **changes, 'updatedAt': time.time()}
+            self.version += 1
+            self._cond.notify_all()
+        with VersionedState._any_change:
+            VersionedState._any_change.notify_all()
+        return True
+
+    def snapshot(self):
+        with self._cond:
+            return self.version, self.data
+
+    def wait_for_change(self, version, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.data
+
+    # Aguarda até algum dos estados passar da versão em versions ({nome: versão}); False no timeout
+    @staticmethod
+    def wait_for_any(states, versions, timeout):
+        with VersionedState._any_change:
+            return VersionedState._any_change.wait_for(
+                lambda: any(state.version != versions[name] for name, state in states.items()), timeout)
+
+# Resposta Server-Sent Events que envia o estado completo a cada nova versão. Vários
+# estados ({nome do evento: estado}) compartilham o mesmo stream, cada um com seu
+# tipo de evento, para que cada página ocupe uma única conexão.
+def sse_response(states):
+    def generate():
+        versions = dict.fromkeys(states)
+        while True:
+            for name, state in states.items():
+                version, data = state.snapshot()
+                if version != versions[name]:
+                    versions[name] = version
+                    yield f'event: {name}\ndata: {json.dumps(data)}\n\n'
+            if not VersionedState.wait_for_any(states, versions, SSE_KEEPALIVE_INTERVAL):
+                yield ': keep-alive\n\n'
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- Limite de streams abertos ---
+# Cada stream (SSE, preview MJPEG) ocupa uma thread do servidor enquanto a página
+# estiver aberta. O limite é o número de threads menos SERVER_RESERVED_THREADS, o que
+# comporta (threads - reservadas) / STREAMS_PER_CLIENT páginas. Acima dele, novos
+# streams recebem 503 com Retry-After e as threads reservadas seguem atendendo as rotas.
+class StreamLimiter:
+    def __init__(self, max_streams):
+        self.max_streams = max_streams
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def configure(self, threads):
+        self.max_streams = max(threads - SERVER_RESERVED_THREADS, 1)
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.max_streams:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'active': self.active, 'max': self.max_streams, 'rejected': self.rejected,
+                    'clients': self.max_streams // STREAMS_PER_CLIENT}
+
+stream_limiter = StreamLimiter(max(SERVER_THREADS - SERVER_RESERVED_THREADS, 1))
+
+# Decorador das rotas de stream: reserva uma vaga e a libera quando o servidor fecha a resposta
+def limit_streams(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not stream_limiter.acquire():
+            response = jsonify({'success': False, 'message': f'Limite de {stream_limiter.max_streams} streams abertos atingido. '
+                                                             f'Feche outras páginas ou tente novamente.'})
+            response.status_code = 503 # Service Unavailable
+            response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+            return response
+        try:
+            response = view(*args, **kwargs)
+        except BaseException:
+            stream_limiter.release()
+            raise
+        if isinstance(response, Response) and response.is_streamed:
+            response.call_on_close(stream_limiter.release)
+        else:
+            stream_limiter.release() # Erro de validação: nenhum stream foi aberto
+        return response
+    return wrapper
+
+# --- Espelho do estado do OBS ---
+# Mantido por eventos do OBS WebSocket v5: após conectar, o estado é lido uma vez
+# e depois só muda com eventos. As rotas de leitura respondem direto da memória.
+class OBSStateMirror(VersionedState):
+    def __init__(self, session):
+        super().__init__({
+            'connected': False,
+            'synced': False,
+            'scenes': [],
+            'currentProgramScene': None,
+            'currentPreviewScene': None,
+            'streaming': False,
+            'recording': False,
+            'recordPaused': False
+        })
+        session.add_connect_handler(self._on_connect)
+        session.add_disconnect_handler(self._on_disconnect)
+        session.add_event_handler(self._on_scene_list_changed, 'SceneListChanged')
+        session.add_event_handler(self._on_scene_name_changed, 'SceneNameChanged')
+        session.add_event_handler(self._on_program_scene_changed, 'CurrentProgramSceneChanged')
+        session.add_event_handler(self._on_preview_scene_changed, 'CurrentPreviewSceneChanged')
+        session.add_event_handler(self._on_studio_mode_changed, 'StudioModeStateChanged')
+        session.add_event_handler(self._on_stream_state_changed, 'StreamStateChanged')
+        session.add_event_handler(self._on_record_state_changed, 'RecordStateChanged')
+
+    async def _on_connect(self):
+        try:
+            scene_list = await obs_request('GetSceneList')
+            stream_status = await obs_request('GetStreamStatus')
+            record_status = await obs_request('GetRecordStatus')
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar estado do OBS: {str(e)}")
+            self.update(connected=True, synced=False)
+            return
+        self.update(
+            connected=True,
+            synced=True,
+            scenes=[scene['sceneName'] for scene in scene_list.get('scenes', [])],
+            currentProgramScene=scene_list.get('currentProgramSceneName'),
+            currentPreviewScene=scene_list.get('currentPreviewSceneName'),
+            streaming=stream_status.get('outputActive', False),
+            recording=record_status.get('outputActive', False),
+            recordPaused=record_status.get('outputPaused', False)
+        )
+        logger.info("Estado do OBS sincronizado (cenas, programa e saídas).")
+
+    async def _on_disconnect(self):
+        self.update(connected=False, synced=False)
+
+    async def _on_scene_list_changed(self, event_data):
+        self.update(scenes=[scene['sceneName'] for scene in event_data.get('scenes', [])])
+
+    async def _on_scene_name_changed(self, event_data):
+        old_name, new_name = event_data.get('oldSceneName'), event_data.get('sceneName')
+        _, data = self.snapshot()
+        self.update(
+            scenes=[new_name if name == old_name else name for name in data['scenes']],
+            currentProgramScene=new_name if data['currentProgramScene'] == old_name else data['currentProgramScene'],
+            currentPreviewScene=new_name if data['currentPreviewScene'] == old_name else data['currentPreviewScene']
+        )
+
+    async def _on_program_scene_changed(self, event_data):
+        self.update(currentProgramScene=event_data.get('sceneName'))
+
+    async def _on_preview_scene_changed(self, event_data):
+        self.update(currentPreviewScene=event_data.get('sceneName'))
+
+    async def _on_studio_mode_changed(self, event_data):
+        if not event_data.get('studioModeEnabled'):
+            self.update(currentPreviewScene=None)
+
+    async def _on_stream_state_changed(self, event_data):
+        self.update(streaming=event_data.get('outputActive', False))
+
+    async def _on_record_state_changed(self, event_data):
+        self.update(
+            recording=event_data.get('outputActive', False),
+            recordPaused=event_data.get('outputState') == 'OBS_WEBSOCKET_OUTPUT_PAUSED'
+        )
+
+obs_state = OBSStateMirror(obs_session)
+
+# --- Fila de troca de cenas ---
+# Um único worker no loop da sessão envia as trocas em ordem. Se vários cliques
+# chegam enquanto uma troca está em andamento, só o mais recente é enviado e os
+# anteriores ficam como 'superseded'. Cada comando recebe um ID para consulta.
+class SceneCommand:
+    FINAL_STATUSES = ('confirmed', 'accepted', 'failed', 'superseded')
+
+    def __init__(self, scene_name):
+        self.id = uuid.uuid4().hex[:12]
+        self.scene_name = scene_name
+        self.status = 'pending' # pending, sending, confirmed, accepted, failed ou superseded
+        self.message = None
+        self.superseded_by = None
+        self.requested_at = time.time()
+        self.latency_ms = None
+        self._started = time.monotonic()
+
+    def is_final(self):
+        return self.status in self.FINAL_STATUSES
+
+    def to_dict(self):
+        return {
+            'commandId': self.id,
+            'sceneName': self.scene_name,
+            'status': self.status,
+            'message': self.message,
+            'supersededBy': self.superseded_by,
+            'requestedAt': self.requested_at,
+            'latencyMs': self.latency_ms
+        }
+
+class SceneSwitchWorker:
+    def __init__(self, session, state):
+        self.session = session
+        self.state = state
+        self._commands = OrderedDict()
+        self._pending = None
+        self._send_lock = None # asyncio.Lock criado dentro do loop da sessão
+        self._confirmation = None # (nome da cena, future) aguardando o evento do OBS
+        self._cond = threading.Condition()
+        session.add_event_handler(self._on_program_scene_changed, 'CurrentProgramSceneChanged')
+
+    def enqueue(self, scene_name):
+        command = SceneCommand(scene_name)
+        with self._cond:
+            if self._pending is not None:
+                self._finish(self._pending, 'superseded', f'Substituído pela troca para {scene_name}')
+                self._pending.superseded_by = command.id
+            self._pending = command
+            self._commands[command.id] = command
+            while len(self._commands) > OBS_COMMAND_HISTORY:
+                self._commands.popitem(last=False)
+        self.session.submit(self._process())
+        return command
+
+    def get(self, command_id):
+        with self._cond:
+            return self._commands.get(command_id)
+
+    # Aguarda o comando chegar a um estado final (usado pelo long-poll)
+    def wait(self, command, timeout):
+        with self._cond:
+            self._cond.wait_for(command.is_final, timeout)
+            return command.to_dict()
+
+    def _finish(self, command, status, message):
+        command.status = status
+        command.message = message
+        if status in ('confirmed', 'accepted'):
+            command.latency_ms = round((time.monotonic() - command._started) * 1000, 1)
+        self._cond.notify_all()
+
+    async def _process(self):
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            with self._cond:
+                command, self._pending = self._pending, None
+                if command is None:
+                    return # Já atendido por um comando mais recente
+                command.status = 'sending'
+            _, state = self.state.snapshot()
+            already_live = state['synced'] and state['currentProgramScene'] == command.scene_name
+            confirmation = asyncio.get_running_loop().create_future()
+            self._confirmation = (command.scene_name, confirmation)
+            try:
+                await obs_request('SetCurrentProgramScene', {'sceneName': command.scene_name})
+                if not already_live:
+                    await asyncio.wait_for(confirmation, OBS_SCENE_CONFIRM_TIMEOUT)
+                with self._cond:
+                    self._finish(command, 'confirmed', f'Cena {command.scene_name} no ar')
+                logger.info(f"Troca para a cena '{command.scene_name}' confirmada em {command.latency_ms} ms.")
+            except asyncio.CancelledError:
+                # Encerramento do loop: o comando não fica em 'sending' para sempre
+                with self._cond:
+                    self._finish(command, 'failed', 'Envio interrompido antes da confirmação do OBS')
+                raise
+            except asyncio.TimeoutError:
+                with self._cond:
+                    self._finish(command, 'accepted', 'OBS aceitou o comando, mas não confirmou a troca')
+                logger.warning(f"OBS não confirmou a troca para a cena '{command.scene_name}'.")
+            except Exception as e:
+                with self._cond:
+                    self._finish(command, 'failed', str(e))
+                logger.error(f"Erro ao tentar alterar cena para '{command.scene_name}': {str(e)}")
+            finally:
+                self._confirmation = None
+
+    async def _on_program_scene_changed(self, event_data):
+        if self._confirmation is not None:
+            scene_name, confirmation = self._confirmation
+            if event_data.get('sceneName') == scene_name and not confirmation.done():
+                confirmation.set_result(True)
+
+obs_scene_switcher = SceneSwitchWorker(obs_session, obs_state)
+
+# --- Cache do preview do OBS ---
+# Um único produtor captura o programa atual na cadência OBS_PREVIEW_INTERVAL e
+# guarda o último quadro em memória. Todas as telas abertas são servidas a partir
+# desse cache, então a carga no OBS não cresce com o número de espectadores.
+class PreviewFrame:
+    def __init__(self, seq, image_data, scene_name, captured_at):
+        self.seq = seq
+        self.image_data = image_data # Data URI (base64) retornado pelo OBS
+        self.jpeg = base64.b64decode(image_data.split(',', 1)[-1]) # Decodificado uma única vez, na captura
+        self.etag = hashlib.sha1(self.jpeg).hexdigest()[:20]
+        self.scene_name = scene_name
+        self.captured_at = captured_at
+
+class OBSPreviewProducer:
+    def __init__(self, session, interval, idle_timeout):
+        self.session = session
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.frame = None
+        self.last_error = None
+        self.failed_captures = 0
+        self._seq = 0
+        self._last_viewer = 0
+        self._future = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+
+    # Registra que alguém está assistindo e garante que o produtor esteja rodando
+    def touch(self):
+        self._last_viewer = time.monotonic()
+        with self._lock:
+            if self._future is None or self._future.done():
+                logger.info("Iniciando captura do preview do OBS.")
+                self._future = self.session.submit(self._produce())
+
+    def latest(self):
+        self.touch()
+        return self.frame
+
+    # Aguarda um quadro mais novo que after_seq (ou retorna o atual após o timeout).
+    # Com stop_on_error, retorna também na primeira captura que falhar.
+    def wait_for_frame(self, after_seq, timeout, stop_on_error=False):
+        self.touch()
+        with self._cond:
+            failed = self.failed_captures
+            self._cond.wait_for(lambda: (self.frame is not None and self.frame.seq > after_seq)
+                                or (stop_on_error and self.failed_captures != failed), timeout)
+            return self.frame
+
+    def is_stale(self, frame):
+        return time.time() - frame.captured_at > max(self.interval * 3, 10)
+
+    async def _produce(self):
+        while time.monotonic() - self._last_viewer < self.idle_timeout:
+            started = time.monotonic()
+            try:
+                await self._capture()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    logger.error(f"Erro ao capturar preview do OBS: {str(e)}")
+                with self._cond:
+                    self.last_error = str(e)
+                    self.failed_captures += 1
+                    self._cond.notify_all()
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+        logger.info("Captura do preview do OBS pausada (nenhum espectador).")
+
+    async def _capture(self):
+        # Cena atual e screenshot em um único lote: a saída da primeira vira a entrada da segunda
+        results = await obs_request_batch([
+            simpleobsws.Request('GetCurrentProgramScene', outputVariables={'sceneName': 'currentProgramSceneName'}),
+            simpleobsws.Request('GetSourceScreenshot', {
+                'imageFormat': 'jpeg',
+                'imageWidth': OBS_PREVIEW_WIDTH,
+                'imageCompressionQuality': OBS_PREVIEW_QUALITY
+            }, inputVariables={'sourceName': 'sceneName'})
+        ], halt_on_failure=True)
+        for response in results:
+            if not response.ok():
+                raise Exception(f'Falha na requisição OBS ({response.requestType}): {obs_error_message(response)}')
+        if len(results) < 2:
+            raise Exception("Não foi possível obter a cena atual do programa.")
+        current_scene_name = (results[0].responseData or {}).get('currentProgramSceneName')
+        image_data_uri = (results[1].responseData or {}).get('imageData')
+        if not image_data_uri:
+            raise Exception("Não foi possível obter os dados da imagem do screenshot.")
+        self._publish(image_data_uri, current_scene_name)
+
+    def _publish(self, image_data_uri, scene_name):
+        frame = PreviewFrame(self._seq + 1, image_data_uri, scene_name, time.time())
+        with self._cond:
+            if self.frame is not None and self.frame.etag == frame.etag:
+                # Imagem idêntica à anterior (cena parada): só renova o horário da captura
+                self.frame.captured_at = frame.captured_at
+                return
+            self._seq = frame.seq
+            self.frame = frame
+            self._cond.notify_all()
+
+obs_preview = OBSPreviewProducer(obs_session, OBS_PREVIEW_INTERVAL, OBS_PREVIEW_IDLE_TIMEOUT)
+
+# --- Projeção de letras no OBS ---
+# Uma música (ou a lista inteira do culto) é carregada em um deck de slides já
+# divididos a partir de song_lines. Cada slide guarda pronta a requisição
+# SetInputSettings da fonte de texto, então avançar um verso é uma única mensagem
+# no WebSocket. Cliques rápidos são coalescidos: o OBS recebe sempre o slide
+# mais recente, sem reenviar os intermediários.
+class LyricsProjector(VersionedState):
+    def __init__(self, session, source_name):
+        super().__init__({
+            'songs': [], # [{'id', 'title', 'firstSlide', 'slideCount'}]
+            'slideCount': 0,
+            'position': -1, # Slide atual no deck (-1: nenhum ainda)
+            'songIndex': None,
+            'stanza': None,
+            'blank': True,
+            'text': '', # Texto que está (ou deveria estar) na tela
+            'lastError': None
+        })
+        self.session = session
+        self.source_name = source_name
+        self._slides = [] # [(índice da música, estrofe, texto, requisição)]
+        self._blank = self._build_request('')
+        self._target = self._blank # Requisição que deveria estar aplicada no OBS
+        self._sent = None # Última requisição aplicada com sucesso
+        self._send_lock = None # asyncio.Lock criado dentro do loop da sessão
+        self._lock = threading.Lock()
+        session.add_connect_handler(self._on_connect)
+
+    def _build_request(self, text):
+        return {'inputName': self.source_name, 'inputSettings': {'text': text}, 'overlay': True}
+
+    # Slides e entradas do deck para songs, numerados a partir do fim do deck atual
+    def _build_deck(self, songs, first_song_index=0, first_slide=0):
+        slides = []
+        deck = []
+        for offset, (song_id, title, stanzas) in enumerate(songs):
+            song_index = first_song_index + offset
+            song_first_slide = first_slide + len(slides)
+            for stanza, verses in enumerate(stanzas):
+                for start in range(0, len(verses), PROJECTION_LINES_PER_SLIDE):
+                    text = '\n'.join(verses[start:start + PROJECTION_LINES_PER_SLIDE])
+                    slides.append((song_index, stanza, text, self._build_request(text)))
+            deck.append({'id': song_id, 'title': title, 'firstSlide': song_first_slide,
+                         'slideCount': first_slide + len(slides) - song_first_slide})
+        return slides, deck
+
+    # songs: [(id, título, estrofes)]. Substitui o deck e volta ao início, mas não
+    # mexe na tela: a próxima música pode ser carregada enquanto a atual é cantada.
+    def load(self, songs):
+        slides, deck = self._build_deck(songs)
+        with self._lock:
+            self._slides = slides
+            self.update(songs=deck, slideCount=len(slides), position=-1, songIndex=None, stanza=None)
+        return len(slides)
+
+    # Acrescenta músicas ao fim do deck mantendo o slide atual: o próximo "Próximo"
+    # continua a música que está sendo cantada
+    def append(self, songs):
+        with self._lock:
+            slides, deck = self._build_deck(songs, len(self.data['songs']), len(self._slides))
+            self._slides = self._slides + slides
+            self.update(songs=self.data['songs'] + deck, slideCount=len(self._slides))
+        return len(slides)
+
+    # A posição muda na hora (sob o lock); o envio ao OBS acontece fora dele
+    def next(self):
+        with self._lock:
+            self._show(self.data['position'] + 1)
+        return self._flush_sync()
+
+    def prev(self):
+        with self._lock:
+            self._show(self.data['position'] - 1)
+        return self._flush_sync()
+
+    def goto(self, slide):
+        with self._lock:
+            self._show(slide)
+        return self._flush_sync()
+
+    # Primeiro slide de uma estrofe; sem song_index, da música atual
+    def goto_stanza(self, stanza, song_index=None):
+        with self._lock:
+            if song_index is None:
+                song_index = self.data['songIndex'] or 0
+            position = next((position for position, slide in enumerate(self._slides)
+                             if slide[0] == song_index and slide[1] == stanza), None)
+            if position is None:
+                raise ValueError(f'Estrofe {stanza + 1} não encontrada na música {song_index + 1} do deck')
+            self._show(position)
+        return self._flush_sync()
+
+    def clear(self):
+        with self._lock:
+            self._target = self._blank
+            self.update(blank=True, text='')
+        return self._flush_sync()
+
+    def _show(self, position):
+        if not self._slides:
+            raise ValueError('Nenhuma música carregada para projeção')
+        position = min(max(position, 0), len(self._slides) - 1)
+        song_index, stanza, text, request_data = self._slides[position]
+        self._target = request_data
+        self.update(position=position, songIndex=song_index, stanza=stanza, blank=False, text=text)
+
+    def _flush_sync(self):
+        try:
+            self.session.run(self._flush())
+        except Exception as e:
+            self.update(lastError=str(e))
+            raise
+        self.update(lastError=None)
+        return self.data
+
+    async def _flush(self):
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            target = self._target
+            if target is self._sent:
+                return # Já aplicado por uma chamada concorrente
+            await obs_request('SetInputSettings', target)
+            self._sent = target
+
+    async def _on_connect(self):
+        if self._sent is None:
+            return # Projeção ainda não usada: não apaga o texto configurado no OBS
+        self._sent = None # OBS pode ter reiniciado: reaplica o slide atual
+        try:
+            await self._flush()
+        except Exception as e:
+            logger.error(f"Erro ao reaplicar a letra projetada após reconectar: {str(e)}")
+
+projection = LyricsProjector(obs_session, OBS_LYRICS_SOURCE)
+
+# --- Cliente da API de relés ---
+# Uma única sessão HTTP com conexões keep-alive reaproveitadas com o Raspberry Pi
+# e um pool limitado de threads: os relés de um grupo recebem o comando ao mesmo
+# tempo, então alterar um grupo leva o tempo de uma única requisição.
+relay_http = requests.Session()
+relay_http.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=RELAY_MAX_WORKERS))
+relay_http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=RELAY_MAX_WORKERS))
+relay_executor = concurrent.futures.ThreadPoolExecutor(max_workers=RELAY_MAX_WORKERS, thread_name_prefix='relay')
+
+# Enquanto a API de relés está fora do ar, os comandos falham na hora e uma
+# thread consulta /relay/status a cada RELAY_BREAKER_RESET_TIMEOUT até ela voltar
+def probe_relay_api():
+    relay_http.get(f"{RELAY_API_BASE_URL}/relay/status", timeout=RELAY_TIMEOUT).raise_for_status()
+
+relay_breaker = CircuitBreaker('API de relés', RELAY_BREAKER_FAILURES, RELAY_BREAKER_RESET_TIMEOUT, probe=probe_relay_api)
+
+# Envia o comando a um relé; devolve {'relay', 'success', 'message'} em vez de levantar exceção
+def send_relay_command(relay_num, state):
+    api_url = f"{RELAY_API_BASE_URL}/relay/{relay_num}/{state}"
+    try:
+        response = relay_breaker.call(relay_http.post, api_url, timeout=RELAY_TIMEOUT)
+        response.raise_for_status() # Levanta erro para status 4xx/5xx
+        response_data = response.json()
+        if not response_data.get('success'):
+            error_msg = response_data.get('message', f'Erro na API do relé {relay_num}')
+            logger.error(f"Falha ao controlar relé {relay_num} via API: {error_msg}")
+            return {'relay': relay_num, 'success': False, 'message': error_msg}
+        logger.info(f"Relé {relay_num} controlado com sucesso via API para {state.upper()}")
+        return {'relay': relay_num, 'success': True, 'message': response_data.get('message', '')}
+    except CircuitOpenError as e:
+        error_msg = str(e)
+    except requests.exceptions.Timeout:
+        error_msg = f"Timeout ao conectar com API do relé {relay_num}"
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Erro de conexão/requisição para API do relé {relay_num}: {e}"
+    except Exception as e:
+        error_msg = f"Erro inesperado ao controlar relé {relay_num}: {e}"
+    logger.error(error_msg)
+    return {'relay': relay_num, 'success': False, 'message': error_msg}
+
+relay_bulk_supported = True # Vira False se a API do Raspberry Pi for de uma versão sem /relay/bulk
+
+# Vários relés em uma única requisição (/relay/bulk): o Raspberry Pi aplica todos
+# de uma vez. Devolve None se a API não tiver essa rota.
+def send_relay_bulk(relay_nums, state):
+    api_url = f"{RELAY_API_BASE_URL}/relay/bulk"
+    try:
+        response = relay_breaker.call(relay_http.post, api_url, json={'relays': {str(relay_num): state for relay_num in relay_nums}},
+                                      timeout=RELAY_TIMEOUT)
+        if response.status_code in (404, 405):
+            return None
+        response_data = response.json()
+        if response.ok and response_data.get('success'):
+            logger.info(f"Relés {relay_nums} controlados com sucesso via API para {state.upper()}")
+            return [{'relay': relay_num, 'success': True, 'message': response_data.get('message', '')} for relay_num in relay_nums]
+        error_msg = response_data.get('message', f'Erro na API dos relés {relay_nums}')
+        logger.error(f"Falha ao controlar relés {relay_nums} via API: {error_msg}")
+    except CircuitOpenError as e:
+        error_msg = str(e)
+    except requests.exceptions.Timeout:
+        error_msg = f"Timeout ao conectar com API dos relés {relay_nums}"
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Erro de conexão/requisição para API dos relés {relay_nums}: {e}"
+    except ValueError as e:
+        error_msg = f"Resposta inválida da API dos relés {relay_nums}: {e}"
+    logger.error(error_msg)
+    return [{'relay': relay_num, 'success': False, 'message': error_msg} for relay_num in relay_nums]
+
+# Envia o mesmo estado a vários relés; resultados na ordem dos relés. Usa
+# /relay/bulk quando disponível e, em APIs antigas, um comando por relé em paralelo.
+def control_relays(relay_nums, state):
+    global relay_bulk_supported
+    if len(relay_nums) == 1:
+        return [send_relay_command(relay_nums[0], state)]
+    if relay_bulk_supported:
+        results = send_relay_bulk(relay_nums, state)
+        if results is not None:
+            return results
+        relay_bulk_supported = False
+        logger.warning("API de relés sem /relay/bulk (versão antiga). Usando um comando por relé.")
+    futures = [relay_executor.submit(send_relay_command, relay_num, state) for relay_num in relay_nums]
+    return [future.result() for future in futures]
+
+# --- Estado dos relés ---
+# Cópia em memória do estado dos disjuntores, compartilhada por todos os painéis.
+# É atualizada pelos resultados dos comandos e reconciliada por uma única thread
+# que consulta /relay/status em baixa frequência (ou logo após um comando falhar,
+# quando o estado real deixa de ser conhecido). As páginas leem daqui e recebem
+# as mudanças por SSE, sem consultar o Raspberry Pi a cada carregamento.
+class RelayStateMirror(VersionedState):
+    def __init__(self, interval):
+        super().__init__({'connected': False, 'synced': False, 'status': {}, 'lastError': None, 'failedAt': None})
+        self.interval = interval
+        self._commands = 0 # Incrementado a cada comando; descarta leituras iniciadas antes dele
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='relay-status', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join()
+
+    def reconcile_soon(self):
+        self._wake.set()
+
+    def record_results(self, results, state):
+        with self._lock:
+            self._commands += 1
+            status = dict(self.data['status'])
+            status.update({str(result['relay']): state for result in results if result['success']})
+            self.update(status=status)
+        if not all(result['success'] for result in results):
+            self.reconcile_soon()
+
+    # Lê /relay/status e substitui o estado em memória; devolve True se conseguiu
+    def refresh(self):
+        commands = self._commands
+        try:
+            response = relay_breaker.call(relay_http.get, f"{RELAY_API_BASE_URL}/relay/status", timeout=RELAY_TIMEOUT)
+            response.raise_for_status()
+            response_data = response.json()
+            if not response_data.get('success'):
+                raise ValueError(response_data.get('message', "Erro na API de status dos relés"))
+            status = {str(relay): 'on' if value in ('on', True) else 'off'
+                      for relay, value in response_data.get('status', {}).items()}
+        except CircuitOpenError as e:
+            error_msg = str(e)
+        except requests.exceptions.Timeout:
+            error_msg = "Timeout ao obter status dos relés da API."
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error_msg = f"Erro ao obter status dos relés: {e}"
+        else:
+            with self._lock:
+                if commands != self._commands:
+                    self.reconcile_soon() # Um comando chegou durante a leitura: relê depois dele
+                    return True
+                if self.data['status'] and status != self.data['status']:
+                    logger.info(f"Estado dos relés reconciliado com o Raspberry Pi: {status}")
+                self.update(connected=True, synced=True, status=status, lastError=None)
+            return True
+        if error_msg != self.data['lastError']:
+            logger.error(error_msg) # Registra só quando o erro muda, não a cada tentativa
+        self.update(connected=False, lastError=error_msg, failedAt=time.time()) # Sempre notifica quem aguarda a leitura
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+relay_state = RelayStateMirror(RELAY_STATUS_POLL_INTERVAL)
+relay_breaker.add_close_handler(relay_state.reconcile_soon) # API voltou: relê o estado real dos relés
 
 # Rotas para autenticação
 @app.route('/login', methods=['GET', 'POST'])
@@ -154,28 +2334,190 @@ def hinario():
 @login_required
 def search_songs():
     search_term = request.form.get('search_term', '')
+    mode = request.form.get('mode', 'fulltext')
+    if mode not in SEARCH_MODES:
+        return jsonify({'success': False, 'message': f'Modo de pesquisa inválido: {mode}'}), 400
+    try:
+        limit = min(max(int(request.form.get('limit', SEARCH_RESULTS_LIMIT)), 1), SEARCH_PAGE_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'message': "Parâmetro 'limit' inválido"}), 400
+    try:
+        offset = decode_search_cursor(request.form['cursor']) if request.form.get('cursor') else 0
+    except ValueError:
+        return jsonify({'success': False, 'message': "Parâmetro 'cursor' inválido"}), 400
     if not search_term:
-        return jsonify([])
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(""" 
-        SELECT * FROM songs 
-        WHERE title LIKE ? OR content LIKE ? OR categories LIKE ?
-        LIMIT 10
-    """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
-    songs = cursor.fetchall()
-    conn.close()
-    result = []
-    for song in songs:
-        content_processed = song['content'].replace('n', '; ')
-        result.append({
+        return jsonify({'success': True, 'results': [], 'nextCursor': None})
+    ensure_songs_db()
+    snapshot = song_corpus.snapshot if SONGS_IN_MEMORY else None
+    # A versão é a dos dados que vão responder: o snapshot em memória pode estar um pouco atrás do banco
+    data_version = snapshot.version if snapshot is not None else songs_monitor.current_version()
+    cache_key = search_cache_key(search_term, mode, offset, limit)
+    result = search_cache.get(cache_key, data_version)
+    if result is not None:
+        return jsonify(result)
+    # Uma música a mais que a página indica se existe próxima página
+    if snapshot is not None:
+        # Hinário em memória: nenhuma consulta ao SQLite
+        songs = snapshot.search(search_term, mode, limit + 1, offset)
+    else:
+        with songs_db.read() as conn:
+            if mode == 'fuzzy':
+                songs = search_songs_fuzzy(conn, search_term, limit + 1, offset)
+            elif mode == 'fulltext' and songs_fts_available and build_fts_query(search_term):
+                songs = search_songs_fulltext(conn, search_term, limit + 1, offset)
+            else:
+                songs = search_songs_exact(conn, search_term, limit + 1, offset)
+    # Resultados compactos: a letra completa fica em /api/songs/<id>
+    hits = []
+    for song in songs[:limit]:
+        hits.append({
             'id': song['id'],
             'title': song['title'],
-            'content': content_processed,
-            'categories': song['categories']
+            'categories': song['categories'],
+            'titleHighlight': highlight_html(song['title_highlight']),
+            'snippet': highlight_html(song['snippet']),
+            'score': song['score']
         })
+    result = {
+        'success': True,
+        'results': hits,
+        'nextCursor': encode_search_cursor(offset + limit) if len(songs) > limit else None
+    }
+    search_cache.put(cache_key, data_version, result)
     return jsonify(result)
 
+# Letra completa de uma música. ETag e Last-Modified deixam o navegador reaproveitar
+# a cópia que já tem: abrir de novo a mesma música custa só um 304.
+@app.route('/api/songs/<int:song_id>', methods=['GET'])
+@login_required
+def get_song(song_id):
+    ensure_songs_db()
+    try:
+        with songs_db.read() as conn:
+            song, stanzas = read_song(conn, song_id)
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao buscar música {song_id}: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro ao buscar música: {str(e)}'}), 500
+    if song is None:
+        return jsonify({'success': False, 'message': 'Música não encontrada'}), 404
+    payload = {
+        'success': True,
+        'id': song['id'],
+        'title': song['title'],
+        'categories': song['categories'],
+        'stanzas': stanzas
+    }
+    body = json.dumps(payload, ensure_ascii=False)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest()[:20])
+    if song['updated_at']:
+        response.last_modified = datetime.strptime(song['updated_at'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+# Autocompletar: títulos e primeiros versos que começam com o texto digitado.
+# client (identificador da aba) e seq (contador crescente) permitem descartar
+# consultas já substituídas: nesse caso a resposta é 204, sem corpo.
+@app.route('/api/songs/suggest', methods=['GET'])
+@login_required
+def suggest_songs():
+    query = request.args.get('q', '')
+    client = f"{current_user.get_id()}:{request.args.get('client', '')}"
+    try:
+        seq = int(request.args.get('seq', 0))
+        limit = min(max(int(request.args.get('limit', SUGGEST_LIMIT)), 1), SEARCH_PAGE_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros seq/limit inválidos'}), 400
+    if not suggest_tracker.begin(client, seq):
+        return '', 204
+    ensure_songs_db()
+    try:
+        suggestions = prefix_index.suggest(query, limit)
+    except sqlite3.Error as e:
+        logger.error(f"Erro no autocompletar: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro no autocompletar: {str(e)}'}), 500
+    if not suggest_tracker.is_current(client, seq):
+        return '', 204
+    return jsonify({'success': True, 'query': query, 'seq': seq, 'suggestions': suggestions})
+
+# Estatísticas do cache de pesquisa (acertos, falhas, descartes)
+@app.route('/api/search_songs/cache', methods=['GET'])
+@login_required
+def get_search_cache_stats():
+    return jsonify({'success': True, 'cache': search_cache.stats()})
+
+# Categorias com a quantidade de músicas de cada uma
+@app.route('/api/categories', methods=['GET'])
+@login_required
+def get_categories():
+    ensure_songs_db()
+    try:
+        return jsonify({'success': True, 'categories': category_facets.categories()})
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao listar categorias: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro ao listar categorias: {str(e)}'}), 500
+
+# Músicas por categoria: /api/songs?category=DOMINGO&category=QUARTA devolve a interseção
+@app.route('/api/songs', methods=['GET'])
+@login_required
+def list_songs():
+    ensure_songs_db()
+    names = []
+    for name in request.args.getlist('category'):
+        names.extend(parse_categories(name))
+    try:
+        songs = category_facets.songs(names)
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao listar músicas: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro ao listar músicas: {str(e)}'}), 500
+    return jsonify({'success': True, 'categories': names, 'count': len(songs), 'songs': songs})
+
+# Título ou trecho com os termos entre SEARCH_MARK_START/END: o texto da música é escapado
+# e só então os marcadores viram <mark>, então o navegador pode exibir o HTML com segurança
+def highlight_html(text):
+    if text is None:
+        return None
+    return html.escape(text).replace(SEARCH_MARK_START, '<mark>').replace(SEARCH_MARK_END, '</mark>')
+
+# Pesquisa por substring (comportamento original)
+def search_songs_exact(conn, search_term, limit, offset=0):
+    return conn.execute(""" 
+        SELECT id, title, categories, NULL AS snippet, NULL AS title_highlight, NULL AS score FROM songs 
+        WHERE title LIKE ? OR content LIKE ? OR categories LIKE ?
+        LIMIT ? OFFSET ?
+    """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%', limit, offset)).fetchall()
+
+# Pesquisa de texto completo com ranking bm25 (título vale mais que letra e categorias)
+def search_songs_fulltext(conn, search_term, limit, offset=0):
+    return conn.execute(f"""
+        SELECT s.id, s.title, s.categories,
+               snippet(songs_fts, 1, :mark_start, :mark_end, '…', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+               highlight(songs_fts, 0, :mark_start, :mark_end) AS title_highlight,
+               bm25(songs_fts, {', '.join(str(weight) for weight in SEARCH_FTS_WEIGHTS)}) AS score
+        FROM songs_fts
+        JOIN songs s ON s.id = songs_fts.rowid
+        WHERE songs_fts MATCH :query
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """, {'query': build_fts_query(search_term), 'limit': limit, 'offset': offset,
+          'mark_start': SEARCH_MARK_START, 'mark_end': SEARCH_MARK_END}).fetchall()
+
+# Pesquisa tolerante a erros de digitação pelo índice de trigramas
+def search_songs_fuzzy(conn, search_term, limit, offset=0):
+    matches = fuzzy_index.search(search_term, offset + limit)[offset:]
+    if not matches:
+        return []
+    rows = conn.execute(f"""
+        SELECT id, title, categories FROM songs WHERE id IN ({', '.join('?' * len(matches))})
+    """, [song_id for song_id, _, _ in matches]).fetchall()
+    rows_by_id = {row['id']: row for row in rows}
+    songs = []
+    for song_id, similarity, matched_text in matches:
+        if song_id in rows_by_id:
+            songs.append({**dict(rows_by_id[song_id]), 'snippet': matched_text,
+                          'title_highlight': None, 'score': round(similarity, 3)})
+    return songs
+
 # API para controle do OBS Studio
 @app.route('/api/obs/switch_scene', methods=['POST'])
 @login_required
@@ -183,63 +2525,286 @@ def switch_obs_scene():
     scene_name = request.form.get('scene_name')
     if not scene_name:
         return jsonify({'success': False, 'message': 'Nome da cena não fornecido'}), 400
-    def run_async_task():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(obs_request('SetCurrentProgramScene', {'sceneName': scene_name}))
-            logger.info(f"Comando para alterar cena para '{scene_name}' enviado com sucesso.")
-        except Exception as e:
-            logger.error(f"Erro ao tentar alterar cena para '{scene_name}': {str(e)}")
-        finally:
-            loop.close()
-    thread = threading.Thread(target=run_async_task)
-    thread.daemon = True
-    thread.start()
-    return jsonify({'success': True, 'message': f'Comando enviado para alterar para a cena {scene_name}'})
+    command = obs_scene_switcher.enqueue(scene_name)
+    return jsonify({
+        'success': True,
+        'message': f'Comando enviado para alterar para a cena {scene_name}',
+        'commandId': command.id,
+        'status': command.status
+    })
+
+# Estado de um comando de troca de cena. Com ?wait=N, aguarda até N segundos pela confirmação.
+@app.route('/api/obs/commands/<command_id>', methods=['GET'])
+@login_required
+def get_obs_command(command_id):
+    command = obs_scene_switcher.get(command_id)
+    if command is None:
+        return jsonify({'success': False, 'message': 'Comando não encontrado'}), 404
+    wait = min(max(request.args.get('wait', 0, type=float), 0), OBS_COMMAND_WAIT_MAX)
+    return jsonify({'success': True, **obs_scene_switcher.wait(command, wait)})
 
 @app.route('/api/obs/scenes', methods=['GET'])
 @login_required
 def get_obs_scenes():
+    obs_session.start()
+    _, state = obs_state.snapshot()
+    if state['synced']:
+        return jsonify({'success': True, 'scenes': state['scenes'], 'currentProgramScene': state['currentProgramScene']})
     try:
-        scenes_data = asyncio.run(obs_request('GetSceneList'))
+        # Espelho ainda não sincronizado (OBS conectando): consulta direta
+        scenes_data = obs_request_sync('GetSceneList')
         scenes = [scene['sceneName'] for scene in scenes_data.get('scenes', [])]
-        return jsonify({'success': True, 'scenes': scenes})
+        return jsonify({'success': True, 'scenes': scenes, 'currentProgramScene': scenes_data.get('currentProgramSceneName')})
     except Exception as e:
         logger.error(f"Erro ao buscar lista de cenas do OBS: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro ao buscar cenas: {str(e)}'}), 500
+        return jsonify({'success': False, 'message': f'Erro ao buscar cenas: {str(e)}'}), backend_error_status(e)
+
+# Estado completo espelhado do OBS (cenas, programa, preview, stream e gravação)
+@app.route('/api/obs/state', methods=['GET'])
+@login_required
+def get_obs_state():
+    obs_session.start()
+    version, state = obs_state.snapshot()
+    return jsonify({'success': True, 'version': version, 'state': state})
+
+# Mudanças do estado do OBS enviadas por Server-Sent Events, sem polling
+@app.route('/api/obs/state/stream', methods=['GET'])
+@login_required
+@limit_streams
+def stream_obs_state():
+    obs_session.start()
+    return sse_response({'obs': obs_state})
 
 @app.route('/api/obs/preview', methods=['GET'])
 @login_required
 def get_obs_preview():
     try:
-        current_program_scene_data = asyncio.run(obs_request('GetCurrentProgramScene'))
-        current_scene_name = current_program_scene_data.get('currentProgramSceneName')
-        if not current_scene_name:
-            raise Exception("Não foi possível obter a cena atual do programa.")
-        screenshot_data = asyncio.run(obs_request('GetSourceScreenshot', {
-            'sourceName': current_scene_name,
-            'imageFormat': 'jpeg',
-            'imageWidth': 640,
-            'imageCompressionQuality': 70
-        }))
-        image_data_uri = screenshot_data.get('imageData')
-        if not image_data_uri:
-             raise Exception("Não foi possível obter os dados da imagem do screenshot.")
-        return jsonify({'success': True, 'imageData': image_data_uri})
+        frame = get_current_preview_frame()
+        return jsonify({
+            'success': True,
+            'imageData': frame.image_data,
+            'sceneName': frame.scene_name,
+            'capturedAt': frame.captured_at,
+            'seq': frame.seq
+        })
+    except Exception as e:
+        logger.error(f"Erro ao obter preview do OBS: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro ao obter preview: {str(e)}'}), backend_error_status(e)
+
+# Preview como JPEG binário (sem base64 em JSON), com ETag para GET condicional
+@app.route('/api/obs/preview.jpg', methods=['GET'])
+@login_required
+def get_obs_preview_jpeg():
+    try:
+        frame = get_current_preview_frame()
     except Exception as e:
         logger.error(f"Erro ao obter preview do OBS: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro ao obter preview: {str(e)}'}), 500
+        return jsonify({'success': False, 'message': f'Erro ao obter preview: {str(e)}'}), backend_error_status(e)
+    response = Response(frame.jpeg, mimetype='image/jpeg')
+    response.set_etag(frame.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Preview-Seq'] = str(frame.seq)
+    return response.make_conditional(request)
+
+def get_current_preview_frame():
+    frame = obs_preview.latest()
+    if frame is None or obs_preview.is_stale(frame):
+        obs_breaker.check() # OBS fora do ar: falha na hora em vez de aguardar um quadro
+    if frame is None:
+        # Primeira requisição: aguarda o produtor entregar o primeiro quadro
+        frame = obs_preview.wait_for_frame(0, OBS_REQUEST_TIMEOUT, stop_on_error=True)
+    if frame is None or (obs_preview.last_error and obs_preview.is_stale(frame)):
+        obs_breaker.check()
+        raise Exception(obs_preview.last_error or "Preview ainda não disponível.")
+    return frame
+
+# Stream MJPEG do preview: o navegador consome direto em um <img> e o servidor
+# só envia um quadro quando o produtor publica um novo
+@app.route('/api/obs/preview/stream', methods=['GET'])
+@login_required
+@limit_streams
+def stream_obs_preview():
+    def generate():
+        last_seq = 0
+        last_frame_at = time.monotonic()
+        while True:
+            frame = obs_preview.wait_for_frame(last_seq, OBS_PREVIEW_STREAM_KEEPALIVE)
+            if frame is None or frame.seq == last_seq:
+                # Sem quadros novos há muito tempo (OBS fechado): encerra e deixa o cliente reconectar
+                if time.monotonic() - last_frame_at > OBS_PREVIEW_IDLE_TIMEOUT:
+                    return
+                if frame is None:
+                    continue
+            else:
+                last_frame_at = time.monotonic()
+            last_seq = frame.seq
+            # Quadros repetidos também servem de keep-alive para detectar clientes desconectados
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' +
+                   str(len(frame.jpeg)).encode() + b'\r\n\r\n' + frame.jpeg + b'\r\n')
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-cache, no-store', 'X-Accel-Buffering': 'no'})
+
+# Lote de operações no OBS em uma única ida e volta, com resultados individuais em ordem.
+# Corpo JSON: {"requests": [{"requestType": "...", "requestData": {...}}, ...],
+#              "haltOnFailure": false, "executionType": "serialRealtime" | "serialFrame" | "parallel"}
+@app.route('/api/obs/batch', methods=['POST'])
+@login_required
+def obs_batch():
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'Lista de requisições não fornecida'}), 400
+    if len(items) > OBS_BATCH_MAX_REQUESTS:
+        return jsonify({'success': False, 'message': f'Máximo de {OBS_BATCH_MAX_REQUESTS} requisições por lote'}), 400
+    execution_types = {
+        'serialRealtime': simpleobsws.RequestBatchExecutionType.SerialRealtime,
+        'serialFrame': simpleobsws.RequestBatchExecutionType.SerialFrame,
+        'parallel': simpleobsws.RequestBatchExecutionType.Parallel
+    }
+    execution_type = payload.get('executionType', 'serialRealtime')
+    if execution_type not in execution_types:
+        return jsonify({'success': False, 'message': f'executionType inválido: {execution_type}'}), 400
+    requests_to_send = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('requestType'), str) \
+                or not isinstance(item.get('requestData', {}), dict):
+            return jsonify({'success': False, 'message': f'Requisição inválida na posição {index}'}), 400
+        requests_to_send.append(simpleobsws.Request(item['requestType'], item.get('requestData')))
+
+    try:
+        responses = obs_session.run(obs_request_batch(
+            requests_to_send,
+            halt_on_failure=bool(payload.get('haltOnFailure', False)),
+            execution_type=execution_types[execution_type]
+        ))
+    except Exception as e:
+        logger.error(f"Erro ao executar lote de requisições no OBS: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro ao executar lote: {str(e)}'}), backend_error_status(e)
+
+    results = [{
+        'requestType': response.requestType,
+        'success': response.ok(),
+        'code': response.requestStatus.code,
+        'comment': response.requestStatus.comment,
+        'responseData': response.responseData
+    } for response in responses]
+    # Com haltOnFailure o OBS interrompe o lote; as requisições restantes não foram executadas
+    for item in items[len(results):]:
+        results.append({'requestType': item['requestType'], 'success': False, 'code': None,
+                         'comment': 'Não executada (lote interrompido)', 'responseData': None})
+    return jsonify({'success': all(result['success'] for result in results), 'results': results})
 
 @app.route('/api/obs/status', methods=['GET'])
 @login_required
 def check_obs_status():
+    # Responde a partir do estado da sessão persistente, sem ida e volta ao OBS
+    status = obs_session.snapshot()
+    if status['connected']:
+        return jsonify({'status': 'connected', 'message': 'Conectado ao OBS Studio', 'session': status})
+    message = status['lastError'] or 'Conectando ao OBS Studio...'
+    return jsonify({'status': 'error', 'message': f'Não foi possível conectar ao OBS: {message}', 'session': status})
+
+# Saúde dos serviços externos: estado dos circuit breakers do OBS e da API de relés
+@app.route('/api/health', methods=['GET'])
+@login_required
+def get_health():
+    backends = {
+        'obs': {**obs_breaker.snapshot(), 'connection': obs_session.state},
+        'relays': {**relay_breaker.snapshot(), 'synced': relay_state.data['synced']}
+    }
+    healthy = all(backend['state'] == 'closed' for backend in backends.values())
+    return jsonify({'success': True, 'status': 'ok' if healthy else 'degraded', 'backends': backends,
+                    'asyncLoop': app_loop.snapshot(), 'streams': stream_limiter.snapshot()})
+
+# --- Projeção de letras ---
+# Carrega uma ou mais músicas no deck: song_id pode se repetir (lista do culto, na ordem)
+@app.route('/api/projection/load', methods=['POST'])
+@login_required
+def load_projection():
+    songs, error = read_projection_songs()
+    if error:
+        return error
+    slide_count = projection.load(songs)
+    _, state = projection.snapshot()
+    return jsonify({'success': True, 'message': f'{len(songs)} música(s) carregada(s) em {slide_count} slide(s)', 'projection': state})
+
+# Acrescenta músicas ao fim do deck sem mudar o slide atual nem o que está na tela
+@app.route('/api/projection/append', methods=['POST'])
+@login_required
+def append_projection():
+    songs, error = read_projection_songs()
+    if error:
+        return error
+    slide_count = projection.append(songs)
+    _, state = projection.snapshot()
+    return jsonify({'success': True, 'message': f'{len(songs)} música(s) adicionada(s) ao deck ({slide_count} slide(s))', 'projection': state})
+
+# Lê as músicas de song_id (pode se repetir) para o deck; devolve (músicas, resposta de erro)
+def read_projection_songs():
+    ensure_songs_db()
+    try:
+        song_ids = [int(song_id) for song_id in request.form.getlist('song_id')]
+    except ValueError:
+        return None, (jsonify({'success': False, 'message': 'song_id inválido'}), 400)
+    if not song_ids:
+        return None, (jsonify({'success': False, 'message': 'Nenhuma música informada'}), 400)
+    songs = []
     try:
-        asyncio.run(obs_request('GetVersion'))
-        return jsonify({'status': 'connected', 'message': 'Conectado ao OBS Studio'}) 
+        with songs_db.read() as conn:
+            for song_id in song_ids:
+                song, stanzas = read_song(conn, song_id)
+                if song is None:
+                    return None, (jsonify({'success': False, 'message': f'Música {song_id} não encontrada'}), 404)
+                songs.append((song['id'], song['title'], stanzas))
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao carregar músicas para projeção: {str(e)}")
+        return None, (jsonify({'success': False, 'message': f'Erro ao carregar músicas: {str(e)}'}), 500)
+    return songs, None
+
+@app.route('/api/projection/<action>', methods=['POST'])
+@login_required
+def control_projection(action):
+    try:
+        if action == 'next':
+            state = projection.next()
+        elif action == 'prev':
+            state = projection.prev()
+        elif action == 'clear':
+            state = projection.clear()
+        elif action == 'goto':
+            try:
+                slide, stanza, song_index = (int(request.form[name]) if request.form.get(name) is not None else None
+                                             for name in ('slide', 'stanza', 'song'))
+            except ValueError:
+                return jsonify({'success': False, 'message': 'Parâmetros slide/stanza/song inválidos'}), 400
+            if slide is not None:
+                state = projection.goto(slide)
+            elif stanza is not None:
+                state = projection.goto_stanza(stanza, song_index)
+            else:
+                return jsonify({'success': False, 'message': 'Informe slide ou stanza'}), 400
+        else:
+            return jsonify({'success': False, 'message': f'Ação de projeção inválida: {action}'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
-        logger.error(f"Falha ao verificar status do OBS: {str(e)}")
-        return jsonify({'status': 'error', 'message': f'Não foi possível conectar ao OBS: {str(e)}'})
+        logger.error(f"Erro ao projetar letra no OBS: {str(e)}")
+        _, state = projection.snapshot()
+        return jsonify({'success': False, 'message': f'Erro ao enviar a letra para o OBS: {str(e)}', 'projection': state}), backend_error_status(e)
+    return jsonify({'success': True, 'projection': state})
+
+@app.route('/api/projection/state', methods=['GET'])
+@login_required
+def get_projection_state():
+    _, state = projection.snapshot()
+    return jsonify({'success': True, 'projection': state})
+
+# Mudanças no deck e no slide atual via Server-Sent Events (várias telas de operador em sincronia)
+@app.route('/api/projection/stream', methods=['GET'])
+@login_required
+@limit_streams
+def stream_projection_state():
+    return sse_response({'projection': projection})
 
 # --- ADICIONADO: API PARA CONTROLE DOS RELÉS ---
 @app.route('/api/relay/control', methods=['POST'])
@@ -275,39 +2840,15 @@ def control_relay_via_api():
 
     logger.info(f"Recebido comando para alterar {control_target_log} para {state.upper()}")
 
-    all_success = True
-    error_messages = []
-
-    # Envia comando para cada relé individualmente
-    for r_num in relays_to_control:
-        api_url = f"{RELAY_API_BASE_URL}/relay/{r_num}/{state}"
-        try:
-            response = requests.post(api_url, timeout=RELAY_TIMEOUT)
-            response.raise_for_status() # Levanta erro para status 4xx/5xx
-            response_data = response.json()
-            if not response_data.get('success'):
-                all_success = False
-                error_msg = response_data.get('message', f'Erro na API do relé {r_num}')
-                error_messages.append(error_msg)
-                logger.error(f"Falha ao controlar relé {r_num} via API: {error_msg}")
-            else:
-                logger.info(f"Relé {r_num} controlado com sucesso via API para {state.upper()}")
-
-        except requests.exceptions.Timeout:
-            all_success = False
-            error_msg = f"Timeout ao conectar com API do relé {r_num}"
-            error_messages.append(error_msg)
-            logger.error(error_msg)
-        except requests.exceptions.RequestException as e:
-            all_success = False
-            error_msg = f"Erro de conexão/requisição para API do relé {r_num}: {e}"
-            error_messages.append(error_msg)
-            logger.error(error_msg)
-        except Exception as e:
-            all_success = False
-            error_msg = f"Erro inesperado ao controlar relé {r_num}: {e}"
-            error_messages.append(error_msg)
-            logger.error(error_msg)
+    # Envia o comando a todos os relés ao mesmo tempo
+    started = time.monotonic()
+    results = control_relays(relays_to_control, state)
+    relay_state.record_results(results, state)
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    all_success = all(result['success'] for result in results)
+    # Uma falha do lote (ou o circuito aberto) chega igual em todos os relés: cada mensagem aparece uma vez
+    error_messages = list(dict.fromkeys(result['message'] for result in results if not result['success']))
+    logger.info(f"Comando para {control_target_log} concluído em {elapsed_ms} ms.")
 
     # Personalizar mensagem com base no tipo (grupo ou individual)
     if is_group:
@@ -315,7 +2856,8 @@ def control_relay_via_api():
         teto_names = {
             "frente": "FRENTE",
             "meio": "MEIO",
-            "fundo": "FUNDO"
+            "fundo": "FUNDO",
+            "todos": "TODOS"
         }
         teto_name = teto_names.get(relay_id, relay_id.upper())
         success_message = f'Teto \'{teto_name}\' alterado(s) para {state.upper()} com sucesso'
@@ -326,39 +2868,70 @@ def control_relay_via_api():
         error_message = f'Falha ao alterar Fileira {relay_id}. Erros: {"; ".join(error_messages)}'
     
     if all_success:
-        return jsonify({'success': True, 'message': success_message}) 
+        return jsonify({'success': True, 'message': success_message, 'results': results, 'elapsedMs': elapsed_ms}) 
     else:
-        return jsonify({'success': False, 'message': error_message}), 500
+        status_code = 503 if relay_breaker.is_open() else 500 # 503: API de relés fora do ar
+        return jsonify({'success': False, 'message': error_message, 'results': results, 'elapsedMs': elapsed_ms}), status_code
 
 
-# Rota para obter o status inicial dos relés (opcional, mas bom para sincronizar a UI)
+# Status dos relés para sincronizar a UI, servido da memória. Se o estado ainda
+# não foi lido (primeiro acesso ou Pi fora do ar), pede uma leitura à thread de
+# reconciliação e aguarda o resultado em vez de consultar o Raspberry Pi aqui.
 @app.route('/api/relay/initial_status', methods=['GET'])
 @login_required
 def get_initial_relay_status():
-    api_url = f"{RELAY_API_BASE_URL}/relay/status"
-    try:
-        response = requests.get(api_url, timeout=RELAY_TIMEOUT)
-        response.raise_for_status()
-        response_data = response.json()
-        if response_data.get('success'):
-            logger.info("Status inicial dos relés obtido com sucesso da API.")
-            return jsonify({"success": True, "status": response_data.get('status', {})})
-        else:
-            raise Exception(response_data.get('message', "Erro na API de status dos relés"))
-    except requests.exceptions.Timeout:
-        error_msg = "Timeout ao obter status inicial dos relés da API."
-        logger.error(error_msg)
-        return jsonify({"success": False, "message": error_msg}), 503 # Service Unavailable
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Erro de conexão/requisição ao obter status inicial dos relés: {e}"
-        logger.error(error_msg)
-        return jsonify({"success": False, "message": error_msg}), 503
-    except Exception as e:
-        error_msg = f"Erro inesperado ao obter status inicial dos relés: {e}"
-        logger.error(error_msg)
-        return jsonify({"success": False, "message": error_msg}), 500
+    relay_state.start()
+    version, state = relay_state.snapshot()
+    if not state['synced']:
+        requested_at = time.time()
+        relay_state.reconcile_soon()
+        deadline = time.monotonic() + RELAY_TIMEOUT + 1
+        # Outras mudanças (um comando de outro painel) também acordam a espera: só para
+        # quando a leitura pedida termina, com sucesso (synced) ou falha (failedAt)
+        while not state['synced'] and (state['failedAt'] or 0) < requested_at:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            version, state = relay_state.wait_for_change(version, remaining)
+    if not state['synced']:
+        return jsonify({"success": False, "message": state['lastError'] or 'Estado dos relés ainda não disponível'}), 503 # Service Unavailable
+    return jsonify({"success": True, "status": state['status'], "connected": state['connected']})
+
+# Mudanças no estado dos relés (de qualquer painel ou da reconciliação) via Server-Sent Events
+@app.route('/api/relay/stream', methods=['GET'])
+@login_required
+@limit_streams
+def stream_relay_state():
+    relay_state.start()
+    return sse_response({'relay': relay_state})
 # --- FIM ADICIONADO ---
 
+# --- Stream único de eventos por página ---
+# Cada aba abre um só EventSource com os estados que usa (?topics=obs,relay), em vez
+# de um stream por estado: cada stream aberto ocupa uma thread do servidor.
+EVENT_TOPICS = {
+    'obs': (obs_state, obs_session.start),
+    'relay': (relay_state, relay_state.start),
+    'projection': (projection, None)
+}
+
+@app.route('/api/events', methods=['GET'])
+@login_required
+@limit_streams
+def stream_events():
+    names = [name.strip() for name in request.args.get('topics', ','.join(EVENT_TOPICS)).split(',') if name.strip()]
+    unknown = [name for name in names if name not in EVENT_TOPICS]
+    if not names or unknown:
+        return jsonify({'success': False, 'message': f"Tópicos inválidos: {', '.join(unknown) or '(nenhum)'}. "
+                                                     f"Use: {', '.join(EVENT_TOPICS)}"}), 400
+    states = {}
+    for name in names:
+        state, start = EVENT_TOPICS[name]
+        if start is not None:
+            start()
+        states[name] = state
+    return sse_response(states)
+
 # REMOVIDO: Rota de simulação de luzes
 # @app.route('/api/lights/toggle', methods=['POST'])
 # @login_required
@@ -368,8 +2941,253 @@ def get_initial_relay_status():
 #     logger.info(f"[SIMULAÇÃO] Alterando luz {light_id} para {state}")
 #     return jsonify({'success': True, 'message': f'Luz {light_id} alterada para {state}'})
 
-if __name__ == '__main__':
+# --- Importação e exportação de músicas (linha de comando) ---
+# python app.py import musicas.csv / python app.py export musicas.json
+# A importação lê o arquivo em blocos e grava tudo em uma única transação.
+# As triggers do índice FTS ficam desligadas durante a carga e o índice é
+# reconstruído uma vez no final, junto com categorias e versos.
+SONGS_FILE_FORMATS = ('csv', 'json', 'jsonl')
+SONGS_CSV_HEADER = ('TÍTULO', 'LETRA', 'CATEGORIAS')
+SONGS_JSON_READ_SIZE = 1 << 16 # Caracteres lidos por vez de um arquivo .json: a lista nunca fica inteira na memória
+
+def song_file_format(path, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format not in SONGS_FILE_FORMATS:
+        raise ValueError(f"Formato de arquivo não suportado: '{file_format}' (use {', '.join(SONGS_FILE_FORMATS)})")
+    return file_format
+
+# Identidade de uma música para detectar duplicatas: título e letra normalizados
+# (sem acentos, maiúsculas, pontuação ou diferenças de separador de verso)
+def song_dedupe_key(title, content):
+    lines = ' '.join(line for stanza in parse_song_content(content) for line in stanza)
+    return hashlib.sha1(f'{normalize_text(title)}\0{normalize_text(lines)}'.encode('utf-8')).hexdigest()
+
+# Lê (título, letra, categorias) de um arquivo CSV, JSON (lista de objetos) ou JSON Lines
+def read_song_file(path, file_format):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        if file_format == 'csv':
+            for index, row in enumerate(csv.reader(file)):
+                if index == 0 and row and normalize_text(row[0]) in ('titulo', 'title'):
+                    continue # Cabeçalho
+                if row:
+                    yield (row + ['', '', ''])[:3]
+        elif file_format == 'jsonl':
+            for line in file:
+                if line.strip():
+                    yield song_file_fields(json.loads(line))
+        else:
+            for song in iter_json_list(file):
+                yield song_file_fields(song)
+
+# Itens de uma lista JSON ([{...}, {...}]) decodificados um a um enquanto o arquivo é
+# lido em blocos: a memória usada depende do tamanho de cada música, não do arquivo
+def iter_json_list(file, read_size=SONGS_JSON_READ_SIZE):
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'\s*')
+    buffer, position, eof = '', 0, False
+
+    # Próximo caractere que não é espaço ('' no fim do arquivo), lendo mais se preciso
+    def peek():
+        nonlocal buffer, position, eof
+        while True:
+            position = whitespace.match(buffer, position).end()
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            buffer, position = file.read(read_size), 0
+            eof = not buffer
+
+    if peek() != '[':
+        raise ValueError('O arquivo JSON deve conter uma lista de músicas')
+    position += 1
+    if peek() == ']':
+        position += 1
+    else:
+        while True:
+            peek()
+            while True:
+                # Só aceita o item quando já há algo lido depois dele que não continua um
+                # número: cortado no fim do bloco, "1.5e3" também decodifica, mas como 1.5
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                    following = whitespace.match(buffer, end).end()
+                    if eof or (following < len(buffer) and (following > end or buffer[following] not in '.eE+-0123456789')):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                chunk = file.read(read_size)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+            position = end
+            yield item
+            separator = peek()
+            position += 1
+            if separator == ']':
+                break
+            if separator != ',':
+                raise ValueError('JSON inválido: esperado "," ou "]" entre as músicas')
+    if peek():
+        raise ValueError('JSON inválido: conteúdo depois do fim da lista de músicas')
+
+# Título, letra e categorias de um item JSON; itens que não são objetos (ou com campos
+# que não são texto) voltam vazios e a importação os conta como inválidos
+def song_file_fields(song):
+    if not isinstance(song, dict):
+        return None, None, None
+    fields = (song.get('title'), song.get('content'), song.get('categories'))
+    return tuple(value if isinstance(value, str) else None for value in fields)
+
+def import_songs(path, file_format=None, chunk_size=500):
+    file_format = song_file_format(path, file_format)
+    init_songs_db()
+    started = time.monotonic()
+    stats = {'read': 0, 'imported': 0, 'duplicates': 0, 'invalid': 0}
+    with songs_db.write() as conn:
+        seen = {song_dedupe_key(row['title'], row['content']) for row in conn.execute('SELECT title, content FROM songs')}
+        conn.execute('BEGIN')
+        if songs_fts_available:
+            for trigger_name in SONGS_FTS_TRIGGERS:
+                conn.execute(f'DROP TRIGGER IF EXISTS {trigger_name}')
+        chunk = []
+        for title, content, categories in read_song_file(path, file_format):
+            stats['read'] += 1
+            title, content = (title or '').strip(), (content or '').strip()
+            if not title or not content:
+                stats['invalid'] += 1
+                continue
+            key = song_dedupe_key(title, content)
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            chunk.append((title, content, (categories or '').strip()))
+            if len(chunk) >= chunk_size:
+                conn.executemany('INSERT INTO songs (title, content, categories) VALUES (?, ?, ?)', chunk)
+                stats['imported'] += len(chunk)
+                chunk = []
+        if chunk:
+            conn.executemany('INSERT INTO songs (title, content, categories) VALUES (?, ?, ?)', chunk)
+            stats['imported'] += len(chunk)
+        # Índices derivados: uma única vez, para todas as músicas novas
+        if songs_fts_available:
+            conn.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+            for trigger_sql in SONGS_FTS_TRIGGERS.values():
+                conn.execute(trigger_sql)
+        sync_song_categories(conn)
+        sync_song_lines(conn)
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+def export_songs(path, file_format=None):
+    file_format = song_file_format(path, file_format)
     init_songs_db()
+    count = 0
+    with songs_db.read() as conn, open(path, 'w', encoding='utf-8', newline='') as file:
+        rows = conn.execute('SELECT title, content, categories FROM songs ORDER BY id')
+        if file_format == 'csv':
+            writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+            writer.writerow(SONGS_CSV_HEADER)
+        elif file_format == 'json':
+            file.write('[\n')
+        for row in rows:
+            song = {'title': row['title'], 'content': row['content'], 'categories': row['categories'] or ''}
+            if file_format == 'csv':
+                writer.writerow((song['title'], song['content'], song['categories']))
+            elif file_format == 'jsonl':
+                file.write(json.dumps(song, ensure_ascii=False) + '\n')
+            else:
+                file.write((',\n' if count else '') + json.dumps(song, ensure_ascii=False))
+            count += 1
+        if file_format == 'json':
+            file.write('\n]\n')
+    return count
+
+# --- Servidor web ---
+# Encerra as threads em segundo plano (OBS, relés, índice de músicas) e fecha as
+# conexões, para a aplicação sair sem deixar requisições ou o SQLite pela metade.
+def shutdown_background_workers():
+    logger.info("Encerrando serviços em segundo plano...")
+    relay_state.stop()
+    obs_session.stop()
+    app_loop.stop()
+    song_corpus.stop()
+    relay_executor.shutdown(wait=True)
+    relay_http.close()
+    songs_db.close_all()
+    logger.info("Serviços em segundo plano encerrados.")
+
+# Servidor de produção: waitress com várias threads e conexões keep-alive. Ctrl+C
+# ou SIGTERM (systemd, taskkill) param de aceitar conexões, aguardam as
+# requisições em andamento e depois encerram os serviços em segundo plano.
+def serve_production(host, port, threads, connection_limit, channel_timeout):
+    try:
+        from waitress import create_server
+    except ImportError:
+        print("waitress não instalado. Instale com: pip install waitress", file=sys.stderr)
+        return 1
+    # channel_request_lookahead mantém a conexão sendo lida durante a resposta: o waitress percebe na
+    # hora que o navegador fechou um stream, e a vaga é liberada no próximo keep-alive
+    server = create_server(app, host=host, port=port, threads=threads, connection_limit=connection_limit,
+                           channel_timeout=channel_timeout, channel_request_lookahead=1, ident='automacao-igrejas')
+
+    def stop_server(signum, frame):
+        raise SystemExit(0) # O waitress trata SystemExit encerrando o loop e as threads de trabalho
+
+    signal.signal(signal.SIGTERM, stop_server)
+    stream_limiter.configure(threads)
+    logger.info(f"Servidor de produção (waitress) em http://{host}:{port} com {threads} threads "
+                f"(até {stream_limiter.max_streams} streams, {stream_limiter.max_streams // STREAMS_PER_CLIENT} páginas abertas).")
+    try:
+        server.run()
+    finally:
+        server.close()
+        shutdown_background_workers()
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Automação da igreja: servidor web e ferramentas do hinário.')
+    commands = parser.add_subparsers(dest='command')
+    import_parser = commands.add_parser('import', help='Importa músicas de um arquivo CSV, JSON ou JSON Lines')
+    import_parser.add_argument('path', help='Arquivo de músicas (título, letra, categorias)')
+    import_parser.add_argument('--format', choices=SONGS_FILE_FORMATS, help='Formato do arquivo (padrão: pela extensão)')
+    import_parser.add_argument('--chunk-size', type=int, default=500, help='Músicas gravadas por lote (padrão: 500)')
+    export_parser = commands.add_parser('export', help='Exporta todas as músicas para um arquivo CSV, JSON ou JSON Lines')
+    export_parser.add_argument('path', help='Arquivo de destino')
+    export_parser.add_argument('--format', choices=SONGS_FILE_FORMATS, help='Formato do arquivo (padrão: pela extensão)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--serve', action='store_true', help='Servidor de produção multi-thread (waitress)')
+    mode.add_argument('--debug', action='store_true', help='Servidor de desenvolvimento com debugger e reloader do Flask')
+    parser.add_argument('--host', default=SERVER_HOST, help=f'Endereço do servidor (padrão: {SERVER_HOST})')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help=f'Porta do servidor (padrão: {SERVER_PORT})')
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS, help=f'Threads do waitress (padrão: {SERVER_THREADS}; {SERVER_RESERVED_THREADS} nunca atendem streams)')
+    parser.add_argument('--connection-limit', type=int, default=SERVER_CONNECTION_LIMIT,
+                        help=f'Conexões simultâneas do waitress (padrão: {SERVER_CONNECTION_LIMIT})')
+    parser.add_argument('--channel-timeout', type=int, default=SERVER_CHANNEL_TIMEOUT,
+                        help=f'Segundos até fechar uma conexão keep-alive ociosa (padrão: {SERVER_CHANNEL_TIMEOUT})')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        try:
+            stats = import_songs(args.path, args.format, max(args.chunk_size, 1))
+        except (OSError, ValueError, csv.Error, sqlite3.Error) as e:
+            print(f"Erro na importação: {str(e)}", file=sys.stderr)
+            return 1
+        rate = stats['read'] / stats['seconds'] if stats['seconds'] else stats['read']
+        print(f"{stats['imported']} música(s) importada(s), {stats['duplicates']} duplicada(s), "
+              f"{stats['invalid']} inválida(s) de {stats['read']} lida(s) em {stats['seconds']:.2f} s "
+              f"({rate:.0f} músicas/s).")
+        return 0
+    if args.command == 'export':
+        started = time.monotonic()
+        try:
+            count = export_songs(args.path, args.format)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Erro na exportação: {str(e)}", file=sys.stderr)
+            return 1
+        elapsed = time.monotonic() - started
+        print(f"{count} música(s) exportada(s) para {args.path} em {elapsed:.2f} s ({count / elapsed if elapsed else count:.0f} músicas/s).")
+        return 0
+
+    ensure_songs_db()
     # Adicionar requests à lista de dependências se não estiver
     try:
         import requests
@@ -377,4 +3195,13 @@ if __name__ == '__main__':
         logger.info("Instalando módulo requests...")
         os.system('pip install requests')
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    if args.serve:
+        return serve_production(args.host, args.port, args.threads, args.connection_limit, args.channel_timeout)
+    try:
+        app.run(host=args.host, port=args.port, debug=args.debug)
+    finally:
+        shutdown_background_workers()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,19 @@
 // JavaScript para a página do hinário
 let obsPreviewInterval = null; // Variável para controlar o intervalo de atualização
-const PREVIEW_UPDATE_INTERVAL = 2000; // Intervalo em milissegundos (2 segundos)
+const PREVIEW_UPDATE_INTERVAL = 2000; // Intervalo em milissegundos (2 segundos), usado só no modo de polling
+const PREVIEW_STREAM_URL = "/api/obs/preview/stream"; // Stream MJPEG do preview
+const PREVIEW_IMAGE_URL = "/api/obs/preview.jpg"; // Quadro atual em JPEG, usado no modo de polling
+let obsPreviewStreaming = false; // Indica se o <img> está consumindo o stream
+let obsPreviewEtag = null; // ETag do último quadro exibido no modo de polling
+const EVENTS_URL = "/api/events"; // Estado do OBS e da projeção em um único stream Server-Sent Events
+const EVENTS_RETRY_DELAY = 15000; // Espera (ms) antes de reabrir o stream recusado pelo servidor
+const selectedCategories = new Set(); // Categorias marcadas no filtro
+const SUGGEST_URL = "/api/songs/suggest"; // Autocompletar por prefixo
+const SUGGEST_DEBOUNCE = 120; // Espera (ms) após a última tecla antes de consultar
+const suggestClient = Math.random().toString(36).slice(2); // Identifica esta aba para o servidor
+let suggestSeq = 0; // Número da consulta mais recente
+let suggestTimer = null;
+let suggestController = null; // AbortController da consulta em andamento
 
 document.addEventListener("DOMContentLoaded", function() {
     // Formulário de pesquisa
@@ -13,59 +26,96 @@ document.addEventListener("DOMContentLoaded", function() {
             e.preventDefault();
             const searchTerm = searchInput.value.trim();
             
+            hideSuggestions();
             if (searchTerm.length > 0) {
                 searchSongs(searchTerm);
             }
         });
     }
 
+    // Autocompletar enquanto digita
+    if (searchInput) {
+        searchInput.addEventListener("input", function () {
+            clearTimeout(suggestTimer);
+            suggestTimer = setTimeout(() => fetchSuggestions(searchInput.value.trim()), SUGGEST_DEBOUNCE);
+        });
+        searchInput.addEventListener("keydown", function (e) {
+            if (e.key === "Escape") hideSuggestions();
+        });
+        document.addEventListener("click", function (e) {
+            if (e.target !== searchInput) hideSuggestions();
+        });
+    }
+
+    loadCategories();
+    setupProjectionControls();
+
     // --- INICIAR ATUALIZAÇÃO DO PREVIEW --- 
     checkOBSStatus(); // Verifica status antes de iniciar
     startObsPreviewUpdate();
     // --- FIM --- 
     
-    // Verificar status a cada 30 segundos
-    setInterval(checkOBSStatus, 30000);
+    // Receber mudanças na conexão com o OBS e na projeção sem polling
+    subscribeServerEvents();
 });
 
-// Função para pesquisar músicas
-function searchSongs(searchTerm) {
+// Função para pesquisar músicas (mode: "exact", "fulltext" ou "fuzzy").
+// Sem cursor, começa uma nova lista; com o cursor devolvido pela API, acrescenta a próxima página.
+function searchSongs(searchTerm, mode = "fulltext", cursor = null) {
     const searchResults = document.getElementById("search-results");
-    searchResults.innerHTML = 
-        `<div class="text-center">
-            <div class="spinner-border text-secondary" role="status">
-                <span class="visually-hidden">Carregando...</span>
-            </div>
-        </div>`;
+    if (!cursor) {
+        searchResults.innerHTML = 
+            `<div class="text-center">
+                <div class="spinner-border text-secondary" role="status">
+                    <span class="visually-hidden">Carregando...</span>
+                </div>
+            </div>`;
+    }
+    const params = new URLSearchParams({ search_term: searchTerm, mode: mode });
+    if (cursor) params.append("cursor", cursor);
     
     fetch("/api/search_songs", {
         method: "POST",
         headers: {
             "Content-Type": "application/x-www-form-urlencoded",
         },
-        body: `search_term=${encodeURIComponent(searchTerm)}`
+        body: params.toString()
     })
     .then(response => response.json())
     .then(data => {
-        if (data.length === 0) {
+        if (!data.success) throw new Error(data.message);
+        if (!cursor && data.results.length === 0 && mode === "fulltext") {
+            // Nada exato: tenta a pesquisa aproximada (erros de digitação, título de memória)
+            searchSongs(searchTerm, "fuzzy");
+            return;
+        }
+        if (!cursor && data.results.length === 0) {
             searchResults.innerHTML = 
                 `<div class="text-center text-muted">
                     <p>Nenhuma música encontrada</p>
                 </div>`;
             return;
         }
-        let resultsHtml = "";
-        data.forEach(song => {
-            const formattedContent = song.content.replace(/;\s*/g, "<br>");
-            resultsHtml += 
-                `<div class="song-item mb-4 pb-3 border-bottom">
-                    <div class="fw-bold">TÍTULO: ${song.title}</div>
-                    <div class="text-muted small">CATEGORIAS: ${song.categories}</div>
-                    <div class="mt-2 song-content">${formattedContent}</div> 
-                </div>`;
-        });
-        searchResults.innerHTML = resultsHtml;
-        showNotification(`${data.length} música(s) encontrada(s)`);
+        if (!cursor) searchResults.innerHTML = "";
+        searchResults.querySelector(".load-more-songs")?.remove();
+        data.results.forEach(song => searchResults.appendChild(createSongItem(song, song.snippet)));
+        if (data.nextCursor) {
+            const moreButton = document.createElement("button");
+            moreButton.type = "button";
+            moreButton.className = "btn btn-outline-secondary w-100 load-more-songs";
+            moreButton.textContent = "Carregar mais";
+            moreButton.addEventListener("click", function () {
+                moreButton.disabled = true;
+                searchSongs(searchTerm, mode, data.nextCursor);
+            });
+            searchResults.appendChild(moreButton);
+        }
+        if (cursor) return;
+        if (mode === "fuzzy") {
+            showNotification(`${data.results.length} música(s) com título parecido`);
+        } else {
+            showNotification(`${data.results.length}${data.nextCursor ? "+" : ""} música(s) encontrada(s)`);
+        }
     })
     .catch(error => {
         console.error("Erro na pesquisa:", error);
@@ -77,28 +127,317 @@ function searchSongs(searchTerm) {
     });
 }
 
+// Consulta as sugestões; uma consulta nova cancela a anterior no navegador e,
+// pelo número de sequência, também no servidor
+function fetchSuggestions(query) {
+    if (suggestController) suggestController.abort();
+    if (query.length === 0) {
+        hideSuggestions();
+        return;
+    }
+    suggestController = new AbortController();
+    const seq = ++suggestSeq;
+    const params = new URLSearchParams({ q: query, client: suggestClient, seq: seq });
+    fetch(`${SUGGEST_URL}?${params}`, { signal: suggestController.signal })
+        .then(response => (response.status === 204 ? null : response.json()))
+        .then(data => {
+            if (!data || !data.success || seq !== suggestSeq) return; // Consulta já substituída
+            renderSuggestions(data.suggestions);
+        })
+        .catch(error => {
+            if (error.name !== "AbortError") console.error("Erro no autocompletar:", error);
+        });
+}
+
+function renderSuggestions(suggestions) {
+    const container = document.getElementById("search-suggestions");
+    if (!container) return;
+    if (suggestions.length === 0) {
+        hideSuggestions();
+        return;
+    }
+    container.innerHTML = "";
+    suggestions.forEach(suggestion => {
+        const item = document.createElement("button");
+        item.type = "button";
+        item.className = "list-group-item list-group-item-action";
+        // Título e verso entram como texto: vêm direto do hinário, sem escape
+        const title = document.createElement("span");
+        title.className = "fw-bold";
+        title.textContent = suggestion.title;
+        item.appendChild(title);
+        if (suggestion.match !== "title") {
+            const verse = document.createElement("span");
+            verse.className = "small text-muted";
+            verse.textContent = suggestion.text;
+            item.append(document.createElement("br"), verse);
+        }
+        item.addEventListener("click", function () {
+            hideSuggestions();
+            showSingleSong(suggestion);
+        });
+        container.appendChild(item);
+    });
+    container.classList.remove("d-none");
+}
+
+function hideSuggestions() {
+    clearTimeout(suggestTimer);
+    const container = document.getElementById("search-suggestions");
+    if (container) container.classList.add("d-none");
+}
+
+// Abre direto a música escolhida no autocompletar
+function showSingleSong(song) {
+    const searchResults = document.getElementById("search-results");
+    searchResults.innerHTML = "";
+    const item = createSongItem({ id: song.id, title: song.title, categories: "" });
+    item.querySelector(".text-muted.small").remove();
+    searchResults.appendChild(item);
+    toggleSongContent(song.id, item);
+}
+
+// Item da lista de músicas: só o título; a letra é carregada ao clicar.
+// Título e categorias entram como texto; titleHighlight e snippetHtml chegam do
+// servidor já escapados, apenas com <mark> nos termos encontrados.
+function createSongItem(song, snippetHtml = null) {
+    const item = document.createElement("div");
+    item.className = "song-item mb-2 pb-2 border-bottom";
+    const titleElement = document.createElement("div");
+    titleElement.className = "fw-bold song-title";
+    titleElement.setAttribute("role", "button");
+    if (song.titleHighlight) {
+        titleElement.innerHTML = song.titleHighlight;
+    } else {
+        titleElement.textContent = song.title;
+    }
+    titleElement.addEventListener("click", function () {
+        toggleSongContent(song.id, item);
+    });
+    const categoriesElement = document.createElement("div");
+    categoriesElement.className = "text-muted small";
+    categoriesElement.textContent = `CATEGORIAS: ${song.categories}`;
+    item.append(titleElement, categoriesElement);
+    if (snippetHtml) {
+        const snippetElement = document.createElement("div");
+        snippetElement.className = "small song-snippet";
+        snippetElement.innerHTML = snippetHtml;
+        item.appendChild(snippetElement);
+    }
+    const contentElement = document.createElement("div");
+    contentElement.className = "mt-2 song-content d-none";
+    item.appendChild(contentElement);
+    const actions = document.createElement("div");
+    actions.className = "mt-1";
+    actions.innerHTML =
+        `<button type="button" class="btn btn-sm btn-secondary me-1 project-now">Projetar</button>
+        <button type="button" class="btn btn-sm btn-outline-secondary project-add">Adicionar</button>`;
+    actions.querySelector(".project-now").addEventListener("click", () => projectSong(song.id));
+    actions.querySelector(".project-add").addEventListener("click", () => addSongToProjection(song.id));
+    item.appendChild(actions);
+    return item;
+}
+
+// Mostra ou esconde a letra. O navegador guarda a resposta (ETag), então reabrir é instantâneo.
+function toggleSongContent(songId, item) {
+    const contentElement = item.querySelector(".song-content");
+    if (!contentElement.classList.contains("d-none")) {
+        contentElement.classList.add("d-none");
+        return;
+    }
+    if (contentElement.dataset.loaded) {
+        contentElement.classList.remove("d-none");
+        return;
+    }
+    contentElement.textContent = "Carregando...";
+    contentElement.classList.remove("d-none");
+    fetch(`/api/songs/${songId}`)
+        .then(response => response.json())
+        .then(song => {
+            if (!song.success) throw new Error(song.message);
+            // A API já entrega a letra dividida em estrofes e versos; cada verso entra como texto
+            contentElement.textContent = "";
+            song.stanzas.forEach(verses => {
+                const paragraph = document.createElement("p");
+                paragraph.className = "mb-2";
+                verses.forEach((verse, index) => {
+                    if (index > 0) paragraph.appendChild(document.createElement("br"));
+                    paragraph.appendChild(document.createTextNode(verse));
+                });
+                contentElement.appendChild(paragraph);
+            });
+            contentElement.dataset.loaded = "1";
+        })
+        .catch(error => {
+            console.error("Erro ao carregar música:", error);
+            contentElement.textContent = "Erro ao carregar a letra.";
+        });
+}
+
+// --- PROJEÇÃO DA LETRA NO OBS ---
+function setupProjectionControls() {
+    const prevButton = document.getElementById("projection-prev");
+    if (!prevButton) return;
+    prevButton.addEventListener("click", () => projectionAction("prev"));
+    document.getElementById("projection-next").addEventListener("click", () => projectionAction("next"));
+    document.getElementById("projection-clear").addEventListener("click", () => projectionAction("clear"));
+    // Setas do teclado avançam e voltam os versos (fora dos campos de texto)
+    document.addEventListener("keydown", function (e) {
+        if (e.target.tagName === "INPUT" || e.target.tagName === "TEXTAREA") return;
+        if (e.key === "ArrowRight" || e.key === "PageDown") {
+            e.preventDefault();
+            projectionAction("next");
+        } else if (e.key === "ArrowLeft" || e.key === "PageUp") {
+            e.preventDefault();
+            projectionAction("prev");
+        }
+    });
+
+    fetch("/api/projection/state")
+        .then(response => response.json())
+        .then(data => { if (data.success) renderProjection(data.projection); })
+        .catch(error => console.error("Erro ao obter estado da projeção:", error));
+    // As mudanças seguintes chegam pelo stream de eventos (subscribeServerEvents)
+}
+
+function postProjection(url, params) {
+    return fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/x-www-form-urlencoded" },
+        body: params ? params.toString() : ""
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.projection) renderProjection(data.projection);
+            if (!data.success) throw new Error(data.message);
+            return data;
+        });
+}
+
+function projectionAction(action, params = null) {
+    return postProjection(`/api/projection/${action}`, params)
+        .catch(error => {
+            console.error("Erro na projeção:", error);
+            showNotification(error.message || "Erro ao projetar a letra", "error");
+        });
+}
+
+function loadProjection(songIds) {
+    const params = new URLSearchParams();
+    songIds.forEach(id => params.append("song_id", id));
+    return postProjection("/api/projection/load", params);
+}
+
+// Carrega só esta música e já mostra o primeiro verso
+function projectSong(songId) {
+    loadProjection([songId])
+        .then(() => projectionAction("next"))
+        .catch(error => showNotification(error.message || "Erro ao carregar a música", "error"));
+}
+
+// Acrescenta a música ao final do deck sem mudar o que está na tela
+function addSongToProjection(songId) {
+    postProjection("/api/projection/append", new URLSearchParams({ song_id: songId }))
+        .then(data => showNotification(data.message))
+        .catch(error => showNotification(error.message || "Erro ao carregar a música", "error"));
+}
+
+function renderProjection(state) {
+    const songsContainer = document.getElementById("projection-songs");
+    const textElement = document.getElementById("projection-text");
+    const positionElement = document.getElementById("projection-position");
+    if (!songsContainer) return;
+
+    if (state.songs.length > 0) {
+        songsContainer.innerHTML = "";
+        state.songs.forEach((song, index) => {
+            const button = document.createElement("button");
+            button.type = "button";
+            button.className = `btn btn-sm ${index === state.songIndex ? "btn-secondary" : "btn-outline-secondary"}`;
+            button.textContent = song.title;
+            button.addEventListener("click", function () {
+                projectionAction("goto", new URLSearchParams({ slide: song.firstSlide }));
+            });
+            songsContainer.appendChild(button);
+        });
+    }
+    textElement.textContent = state.blank ? "(tela limpa)" : state.text;
+    textElement.classList.toggle("projection-blank", state.blank);
+    positionElement.textContent = state.slideCount > 0 && state.position >= 0
+        ? `Slide ${state.position + 1} de ${state.slideCount}`
+        : "";
+}
+// --- FIM DA PROJEÇÃO ---
+
+// Carrega os botões de categoria (com a quantidade de músicas de cada uma)
+function loadCategories() {
+    const container = document.getElementById("category-filters");
+    if (!container) return;
+    fetch("/api/categories")
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.message);
+            container.innerHTML = "";
+            data.categories.forEach(category => {
+                const button = document.createElement("button");
+                button.type = "button";
+                button.className = "btn btn-sm btn-outline-secondary";
+                button.textContent = `${category.name} (${category.count})`;
+                button.addEventListener("click", function () {
+                    if (selectedCategories.has(category.name)) {
+                        selectedCategories.delete(category.name);
+                        button.classList.replace("btn-secondary", "btn-outline-secondary");
+                    } else {
+                        selectedCategories.add(category.name);
+                        button.classList.replace("btn-outline-secondary", "btn-secondary");
+                    }
+                    filterSongsByCategory();
+                });
+                container.appendChild(button);
+            });
+        })
+        .catch(error => {
+            console.error("Erro ao carregar categorias:", error);
+            container.innerHTML = `<span class="text-danger">Erro ao carregar categorias.</span>`;
+        });
+}
+
+// Lista as músicas que estão em todas as categorias marcadas
+function filterSongsByCategory() {
+    const searchResults = document.getElementById("search-results");
+    if (selectedCategories.size === 0) {
+        searchResults.innerHTML = `<p class="text-muted">Digite um termo e clique em buscar para ver os resultados.</p>`;
+        return;
+    }
+    const params = new URLSearchParams();
+    selectedCategories.forEach(name => params.append("category", name));
+    fetch(`/api/songs?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.message);
+            if (data.songs.length === 0) {
+                searchResults.innerHTML =
+                    `<div class="text-center text-muted">
+                        <p>Nenhuma música com todas as categorias selecionadas</p>
+                    </div>`;
+                return;
+            }
+            searchResults.innerHTML = "";
+            data.songs.forEach(song => searchResults.appendChild(createSongItem(song)));
+            showNotification(`${data.count} música(s) na seleção`);
+        })
+        .catch(error => {
+            console.error("Erro ao filtrar por categoria:", error);
+            showNotification("Erro ao filtrar por categoria", "error");
+        });
+}
+
 // --- FUNÇÕES PARA O PREVIEW DO OBS (COPIADAS DE main.js) --- 
 function checkOBSStatus() {
     fetch("/api/obs/status")
         .then(response => response.json())
         .then(data => {
-            const statusAlert = document.getElementById("obs-status-alert");
-            const statusMessage = document.getElementById("obs-status-message");
-            
-            if (!statusAlert || !statusMessage) return;
-
-            if (data.status === "connected") {
-                statusAlert.className = "alert alert-success";
-                statusMessage.textContent = "Conectado ao OBS Studio";
-                if (!obsPreviewInterval) {
-                    startObsPreviewUpdate();
-                }
-            } else {
-                statusAlert.className = "alert alert-danger";
-                statusMessage.textContent = data.message || "Erro desconhecido ao conectar ao OBS";
-                stopObsPreviewUpdate();
-                showPreviewError("OBS desconectado");
-            }
+            applyObsConnection(data.status === "connected", data.message);
         })
         .catch(error => {
             console.error("Erro ao verificar status:", error);
@@ -113,16 +452,93 @@ function checkOBSStatus() {
         });
 }
 
+function applyObsConnection(connected, message) {
+    const statusAlert = document.getElementById("obs-status-alert");
+    const statusMessage = document.getElementById("obs-status-message");
+
+    if (connected) {
+        if (statusAlert && statusMessage) {
+            statusAlert.className = "alert alert-success";
+            statusMessage.textContent = "Conectado ao OBS Studio";
+        }
+        if (!obsPreviewStreaming && !obsPreviewInterval) {
+            startObsPreviewUpdate();
+        }
+    } else {
+        if (statusAlert && statusMessage) {
+            statusAlert.className = "alert alert-danger";
+            statusMessage.textContent = message || "Erro desconhecido ao conectar ao OBS";
+        }
+        stopObsPreviewUpdate();
+        showPreviewError("OBS desconectado");
+    }
+}
+
+// Assina o stream de eventos da página (OBS e, se houver controles, a projeção);
+// sem suporte a EventSource, volta ao polling de status do OBS
+function subscribeServerEvents() {
+    if (!window.EventSource) {
+        setInterval(checkOBSStatus, 30000);
+        return;
+    }
+    const withProjection = Boolean(document.getElementById("projection-prev"));
+    const source = new EventSource(`${EVENTS_URL}?topics=${withProjection ? "obs,projection" : "obs"}`);
+    source.addEventListener("obs", function (event) {
+        const state = JSON.parse(event.data);
+        applyObsConnection(state.connected, "OBS desconectado");
+    });
+    source.addEventListener("projection", function (event) {
+        renderProjection(JSON.parse(event.data));
+    });
+    source.onerror = function () {
+        // Quedas de rede reconectam sozinhas; resposta de erro (limite de streams, 503) fecha o EventSource
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(subscribeServerEvents, EVENTS_RETRY_DELAY);
+        }
+    };
+}
+
 function startObsPreviewUpdate() {
+    const imgElement = document.getElementById("obs-preview-image");
+    const loadingElement = document.getElementById("obs-preview-loading");
+    if (!imgElement) return;
+    if (obsPreviewStreaming || obsPreviewInterval) return; // Já em andamento
+
+    console.log("Iniciando stream do preview do OBS (Hinário)...");
+    obsPreviewStreaming = true;
+    imgElement.onload = function () {
+        if (loadingElement) loadingElement.classList.add("d-none");
+        document.getElementById("obs-preview-error")?.classList.add("d-none");
+        imgElement.classList.remove("d-none");
+    };
+    imgElement.onerror = function () {
+        // Navegador sem suporte a MJPEG ou stream interrompido: volta para o polling
+        if (!obsPreviewStreaming) return;
+        console.warn("Stream do preview indisponível, usando atualização periódica.");
+        obsPreviewStreaming = false;
+        imgElement.onerror = null;
+        startObsPreviewPolling();
+    };
+    // O servidor envia um novo quadro somente quando o OBS produz um
+    imgElement.src = `${PREVIEW_STREAM_URL}?t=${Date.now()}`;
+}
+
+function startObsPreviewPolling() {
     if (obsPreviewInterval) {
-        clearInterval(obsPreviewInterval);
+        clearInterval(obsPreviewInterval); // Limpa intervalo anterior se existir
     }
-    console.log("Iniciando atualização do preview do OBS (Hinário)...");
-    updateObsPreview();
+    updateObsPreview(); // Chama imediatamente a primeira vez
     obsPreviewInterval = setInterval(updateObsPreview, PREVIEW_UPDATE_INTERVAL);
 }
 
 function stopObsPreviewUpdate() {
+    const imgElement = document.getElementById("obs-preview-image");
+    if (obsPreviewStreaming && imgElement) {
+        console.log("Parando stream do preview do OBS (Hinário)...");
+        obsPreviewStreaming = false;
+        imgElement.onerror = null;
+        imgElement.removeAttribute("src"); // Fecha a conexão do stream
+    }
     if (obsPreviewInterval) {
         console.log("Parando atualização do preview do OBS (Hinário)...");
         clearInterval(obsPreviewInterval);
@@ -135,26 +551,38 @@ function updateObsPreview() {
     const loadingElement = document.getElementById("obs-preview-loading");
     const errorElement = document.getElementById("obs-preview-error");
 
-    if (!imgElement || !loadingElement || !errorElement) return;
+    if (!imgElement || !loadingElement || !errorElement) return; // Elementos não encontrados
 
-    errorElement.classList.add("d-none");
-
-    fetch("/api/obs/preview")
-        .then(response => response.json())
-        .then(data => {
-            loadingElement.classList.add("d-none");
-            if (data.success && data.imageData) {
-                imgElement.src = data.imageData;
-                imgElement.classList.remove("d-none");
-            } else {
-                console.error("Erro ao obter preview:", data.message);
-                showPreviewError(data.message || "Falha ao obter imagem");
+    // JPEG binário com ETag: se o quadro não mudou, o servidor responde 304 e nada é baixado
+    fetch(PREVIEW_IMAGE_URL, { cache: "no-cache" })
+        .then(response => {
+            if (!response.ok) {
+                return response.json().then(data => { throw new Error(data.message || "Falha ao obter imagem"); });
+            }
+            const etag = response.headers.get("ETag");
+            if (etag && etag === obsPreviewEtag) return null; // Mesmo quadro já exibido
+            obsPreviewEtag = etag;
+            return response.blob();
+        })
+        .then(blob => {
+            loadingElement.classList.add("d-none"); // Esconde loading
+            errorElement.classList.add("d-none");
+            if (blob) {
+                const previousUrl = imgElement.src;
+                imgElement.src = URL.createObjectURL(blob); // Atualiza a imagem
+                if (previousUrl.startsWith("blob:")) URL.revokeObjectURL(previousUrl);
             }
+            imgElement.classList.remove("d-none");
         })
         .catch(error => {
-            console.error("Erro de rede ao obter preview:", error);
-            stopObsPreviewUpdate();
-            showPreviewError("Erro de rede");
+            if (error instanceof TypeError) {
+                console.error("Erro de rede ao obter preview:", error);
+                stopObsPreviewUpdate(); // Para de tentar se der erro de rede
+                showPreviewError("Erro de rede");
+                return;
+            }
+            console.error("Erro ao obter preview:", error.message);
+            showPreviewError(error.message || "Falha ao obter imagem");
         });
 }
 
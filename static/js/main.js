@@ -1,7 +1,21 @@
 
 // JavaScript para a página principal (automação)
 let obsPreviewInterval = null; // Variável para controlar o intervalo de atualização
-const PREVIEW_UPDATE_INTERVAL = 2000; // Intervalo em milissegundos (2 segundos)
+const PREVIEW_UPDATE_INTERVAL = 2000; // Intervalo em milissegundos (2 segundos), usado só no modo de polling
+const PREVIEW_STREAM_URL = "/api/obs/preview/stream"; // Stream MJPEG do preview
+const PREVIEW_IMAGE_URL = "/api/obs/preview.jpg"; // Quadro atual em JPEG, usado no modo de polling
+let obsPreviewStreaming = false; // Indica se o <img> está consumindo o stream
+let obsPreviewEtag = null; // ETag do último quadro exibido no modo de polling
+const EVENTS_URL = "/api/events?topics=obs,relay"; // Estado do OBS e dos disjuntores em um único stream Server-Sent Events
+const EVENTS_RETRY_DELAY = 15000; // Espera (ms) antes de reabrir o stream recusado pelo servidor
+let obsSceneListKey = null; // Lista de cenas renderizada (para detectar mudanças)
+// Disjuntores de cada grupo (mesmo mapeamento de RELAY_GROUPS no app.py)
+const RELAY_GROUP_MAP = {
+    "frente": [1, 2],
+    "meio": [3, 4],
+    "fundo": [5, 6],
+    "todos": [1, 2, 3, 4, 5, 6]
+};
 
 document.addEventListener("DOMContentLoaded", function () {
     // Verificar status do OBS e carregar botões de cena
@@ -16,8 +30,9 @@ document.addEventListener("DOMContentLoaded", function () {
     startObsPreviewUpdate();
     // --- FIM --- 
 
-    // Verificar status a cada 30 segundos
-    setInterval(checkOBSStatus, 30000);
+    // Receber mudanças de estado do OBS (conexão, cenas, cena ao vivo) e dos disjuntores
+    // (feitas em outros painéis ou no próprio quadro) sem polling
+    subscribeServerEvents();
 });
 
 // Função para verificar status do OBS
@@ -25,41 +40,63 @@ function checkOBSStatus() {
     fetch("/api/obs/status")
         .then(response => response.json())
         .then(data => {
-            // REMOVIDO: Código que referenciava status-alert/message que não existe mais
-            // const statusAlert = document.getElementById("obs-status-alert");
-            // const statusMessage = document.getElementById("obs-status-message");
-            // if (!statusAlert || !statusMessage) return;
-
-            if (data.status === "connected") {
-                // statusAlert.className = "alert alert-success";
-                // statusMessage.textContent = "Conectado ao OBS Studio";
-                console.log("OBS Status: Conectado");
-                // Se estava desconectado e conectou, iniciar preview
-                if (!obsPreviewInterval) {
-                    startObsPreviewUpdate();
-                }
-            } else {
-                // statusAlert.className = "alert alert-danger";
-                // statusMessage.textContent = data.message || "Erro desconhecido ao conectar ao OBS";
-                console.error("OBS Status: Desconectado ou Erro -", data.message);
-                // Se desconectou, parar preview
-                stopObsPreviewUpdate();
-                showPreviewError("OBS desconectado");
-            }
+            applyObsConnection(data.status === "connected", data.message);
         })
         .catch(error => {
             console.error("Erro ao verificar status:", error);
-            // const statusAlert = document.getElementById("obs-status-alert");
-            // const statusMessage = document.getElementById("obs-status-message");
-            // if (statusAlert && statusMessage) {
-            //     statusAlert.className = "alert alert-danger";
-            //     statusMessage.textContent = "Erro de rede ao verificar status do OBS.";
-            // }
             stopObsPreviewUpdate();
             showPreviewError("Erro de rede");
         });
 }
 
+// Atualiza o preview conforme o estado da conexão com o OBS
+function applyObsConnection(connected, message) {
+    if (connected) {
+        console.log("OBS Status: Conectado");
+        // Se estava desconectado e conectou, iniciar preview
+        if (!obsPreviewStreaming && !obsPreviewInterval) {
+            startObsPreviewUpdate();
+        }
+    } else {
+        console.error("OBS Status: Desconectado ou Erro -", message);
+        // Se desconectou, parar preview
+        stopObsPreviewUpdate();
+        showPreviewError("OBS desconectado");
+    }
+}
+
+// Assina o stream de eventos da página (OBS e relés); sem suporte a EventSource,
+// volta ao polling do status do OBS e fica com o status dos relés lido ao carregar
+function subscribeServerEvents() {
+    if (!window.EventSource) {
+        setInterval(checkOBSStatus, 30000);
+        return;
+    }
+    const source = new EventSource(EVENTS_URL);
+    source.addEventListener("obs", function (event) {
+        const state = JSON.parse(event.data);
+        applyObsConnection(state.connected, "OBS desconectado");
+        if (state.synced) {
+            if (JSON.stringify(state.scenes) !== obsSceneListKey) {
+                renderSceneButtons(state.scenes);
+            }
+            highlightLiveScene(state.currentProgramScene);
+        }
+    });
+    source.addEventListener("relay", function (event) {
+        const state = JSON.parse(event.data);
+        if (state.synced) {
+            applyRelayStatus(state.status);
+        }
+    });
+    source.onerror = function () {
+        // Quedas de rede reconectam sozinhas; resposta de erro (limite de streams, 503) fecha o EventSource
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(subscribeServerEvents, EVENTS_RETRY_DELAY);
+        }
+    };
+}
+
 // Função para carregar botões de cena dinamicamente
 function loadSceneButtons() {
     const container = document.getElementById("scene-buttons-container");
@@ -75,26 +112,9 @@ function loadSceneButtons() {
     fetch("/api/obs/scenes")
         .then(response => response.json())
         .then(data => {
-            container.innerHTML = "";
-
-            if (data.success && data.scenes && data.scenes.length > 0) {
-                data.scenes.forEach(sceneName => {
-                    const col = document.createElement("div");
-                    col.className = "col-6 col-md-4 col-lg-3 mb-2";
-                    const button = document.createElement("button");
-                    // Usando btn-secondary para manter o padrão visual anterior
-                    button.className = "btn btn-secondary w-100 scene-btn";
-                    button.setAttribute("data-scene", sceneName);
-                    button.textContent = sceneName;
-                    button.addEventListener("click", function () {
-                        switchScene(sceneName);
-                    });
-                    col.appendChild(button);
-                    container.appendChild(col);
-                });
-            } else if (data.success && data.scenes.length === 0) {
-                container.innerHTML =
-                    `<div class="col-12 text-center text-muted">Nenhuma cena encontrada no OBS.</div>`;
+            if (data.success && data.scenes) {
+                renderSceneButtons(data.scenes);
+                highlightLiveScene(data.currentProgramScene);
             } else {
                 container.innerHTML =
                     `<div class="col-12 text-center text-danger">Erro ao carregar cenas: 
@@ -109,17 +129,53 @@ function loadSceneButtons() {
         });
 }
 
+function renderSceneButtons(scenes) {
+    const container = document.getElementById("scene-buttons-container");
+    if (!container) return;
+
+    obsSceneListKey = JSON.stringify(scenes);
+    container.innerHTML = "";
+
+    if (scenes.length === 0) {
+        container.innerHTML =
+            `<div class="col-12 text-center text-muted">Nenhuma cena encontrada no OBS.</div>`;
+        return;
+    }
+    scenes.forEach(sceneName => {
+        const col = document.createElement("div");
+        col.className = "col-6 col-md-4 col-lg-3 mb-2";
+        const button = document.createElement("button");
+        // Usando btn-secondary para manter o padrão visual anterior
+        button.className = "btn btn-secondary w-100 scene-btn";
+        button.setAttribute("data-scene", sceneName);
+        button.textContent = sceneName;
+        button.addEventListener("click", function () {
+            switchScene(sceneName);
+        });
+        col.appendChild(button);
+        container.appendChild(col);
+    });
+}
+
+// Destaca o botão da cena que está no ar (programa)
+function highlightLiveScene(sceneName) {
+    document.querySelectorAll(".scene-btn").forEach(button => {
+        button.classList.toggle("scene-live", button.getAttribute("data-scene") === sceneName);
+    });
+}
+
 // Função para alternar cenas do OBS
 function switchScene(sceneName) {
     const button = document.querySelector(`.scene-btn[data-scene="${sceneName}"]`);
+    const restoreButton = () => {
+        if (button) {
+            button.textContent = sceneName;
+            button.disabled = false;
+        }
+    };
     if (button) {
-        const originalText = button.textContent;
         button.textContent = "Enviando...";
         button.disabled = true;
-        setTimeout(() => {
-            button.textContent = originalText;
-            button.disabled = false;
-        }, 1000);
     }
 
     fetch("/api/obs/switch_scene", {
@@ -132,8 +188,8 @@ function switchScene(sceneName) {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                console.log(`Comando enviado para: ${sceneName}`);
-                showNotification(`Comando enviado para: ${sceneName}`);
+                console.log(`Comando enviado para: ${sceneName} (${data.commandId})`);
+                return waitSceneCommand(data.commandId);
             } else {
                 console.error("Erro ao alterar cena:", data.message);
                 showNotification(`Erro: ${data.message || "Erro desconhecido"}`, "error");
@@ -142,6 +198,26 @@ function switchScene(sceneName) {
         .catch(error => {
             console.error("Erro na requisição:", error);
             showNotification("Erro de conexão ao tentar alterar cena", "error");
+        })
+        .finally(restoreButton);
+}
+
+// Aguarda (long-poll) a confirmação do OBS para um comando de troca de cena
+function waitSceneCommand(commandId) {
+    return fetch(`/api/obs/commands/${encodeURIComponent(commandId)}?wait=5`)
+        .then(response => response.json())
+        .then(command => {
+            if (command.status === "confirmed") {
+                showNotification(`Cena no ar: ${command.sceneName} (${Math.round(command.latencyMs)} ms)`);
+            } else if (command.status === "accepted") {
+                showNotification(`Comando enviado para: ${command.sceneName}`);
+            } else if (command.status === "failed") {
+                showNotification(`Erro: ${command.message || "Falha ao alterar cena"}`, "error");
+            } else if (command.status === "superseded") {
+                console.log(`Troca para ${command.sceneName} substituída por um clique mais recente`);
+            } else {
+                showNotification(`Aguardando OBS confirmar a cena ${command.sceneName}...`);
+            }
         });
 }
 
@@ -170,7 +246,7 @@ function initializeRelayControls() {
         });
     });
 
-    // Buscar estado inicial dos relés para sincronizar a UI
+    // Buscar estado inicial dos relés para sincronizar a UI; as mudanças chegam pelo stream de eventos
     fetchInitialRelayStatus();
 }
 
@@ -190,7 +266,7 @@ function controlRelay(relayId, state) {
         .then(data => {
             if (data.success) {
                 // Personalizar mensagem de log com base no tipo
-                if (["frente", "meio", "fundo"].includes(relayId)) {
+                if (RELAY_GROUP_MAP.hasOwnProperty(relayId)) {
                     console.log(`Comando enviado para Teto ${relayId.toUpperCase()}: ${state}`);
                 } else {
                     console.log(`Comando enviado para Fileira ${relayId}: ${state}`);
@@ -198,7 +274,7 @@ function controlRelay(relayId, state) {
 
                 showNotification(data.message);
                 // Se for grupo, atualiza estado dos individuais após sucesso
-                if (["frente", "meio", "fundo"].includes(relayId)) {
+                if (RELAY_GROUP_MAP.hasOwnProperty(relayId)) {
                     updateIndividualSwitchesForGroup(relayId, state === "on");
                 }
                 // Atualiza estado dos grupos após qualquer mudança individual ou de grupo
@@ -235,14 +311,7 @@ function fetchInitialRelayStatus() {
         .then(data => {
             if (data.success && data.status) {
                 console.log("Status inicial dos relés:", data.status);
-                for (const relayNum in data.status) {
-                    const switchElement = document.getElementById(`disjuntor-switch-${relayNum}`);
-                    if (switchElement) {
-                        switchElement.checked = (data.status[relayNum] === "on");
-                    }
-                }
-                // Atualizar estado dos botões de grupo com base nos individuais
-                updateGroupSwitchesState();
+                applyRelayStatus(data.status);
                 showNotification("Status dos disjuntores sincronizado.");
             } else {
                 console.error("Erro ao buscar status inicial dos relés:", data.message);
@@ -255,14 +324,21 @@ function fetchInitialRelayStatus() {
         });
 }
 
+// Marca os switches individuais conforme o status ("on"/"off") e recalcula os grupos
+function applyRelayStatus(status) {
+    for (const relayNum in status) {
+        const switchElement = document.getElementById(`disjuntor-switch-${relayNum}`);
+        if (switchElement && !switchElement.disabled) { // Não mexe em switch com comando em andamento
+            switchElement.checked = (status[relayNum] === "on");
+        }
+    }
+    // Atualizar estado dos botões de grupo com base nos individuais
+    updateGroupSwitchesState();
+}
+
 // Atualiza os switches individuais quando um grupo é alterado
 function updateIndividualSwitchesForGroup(groupId, isChecked) {
-    const groupMap = {
-        "frente": [1, 2],
-        "meio": [3, 4],
-        "fundo": [5, 6]
-    };
-    const relaysInGroup = groupMap[groupId];
+    const relaysInGroup = RELAY_GROUP_MAP[groupId];
     if (relaysInGroup) {
         relaysInGroup.forEach(relayNum => {
             const individualSwitch = document.getElementById(`disjuntor-switch-${relayNum}`);
@@ -275,14 +351,9 @@ function updateIndividualSwitchesForGroup(groupId, isChecked) {
 
 // Atualiza o estado dos botões de grupo com base nos individuais
 function updateGroupSwitchesState() {
-    const groupMap = {
-        "frente": [1, 2],
-        "meio": [3, 4],
-        "fundo": [5, 6]
-    };
-    for (const groupId in groupMap) {
+    for (const groupId in RELAY_GROUP_MAP) {
         const groupSwitch = document.getElementById(`grupo-switch-${groupId}`);
-        const relaysInGroup = groupMap[groupId];
+        const relaysInGroup = RELAY_GROUP_MAP[groupId];
         if (groupSwitch && relaysInGroup) {
             // Verifica se TODOS os individuais do grupo estão ligados
             const allOn = relaysInGroup.every(relayNum => {
@@ -314,15 +385,46 @@ function updateGroupSwitchesState() {
 
 // --- FUNÇÕES PARA O PREVIEW DO OBS --- 
 function startObsPreviewUpdate() {
+    const imgElement = document.getElementById("obs-preview-image");
+    const loadingElement = document.getElementById("obs-preview-loading");
+    if (!imgElement) return;
+    if (obsPreviewStreaming || obsPreviewInterval) return; // Já em andamento
+
+    console.log("Iniciando stream do preview do OBS...");
+    obsPreviewStreaming = true;
+    imgElement.onload = function () {
+        if (loadingElement) loadingElement.classList.add("d-none");
+        document.getElementById("obs-preview-error")?.classList.add("d-none");
+        imgElement.classList.remove("d-none");
+    };
+    imgElement.onerror = function () {
+        // Navegador sem suporte a MJPEG ou stream interrompido: volta para o polling
+        if (!obsPreviewStreaming) return;
+        console.warn("Stream do preview indisponível, usando atualização periódica.");
+        obsPreviewStreaming = false;
+        imgElement.onerror = null;
+        startObsPreviewPolling();
+    };
+    // O servidor envia um novo quadro somente quando o OBS produz um
+    imgElement.src = `${PREVIEW_STREAM_URL}?t=${Date.now()}`;
+}
+
+function startObsPreviewPolling() {
     if (obsPreviewInterval) {
         clearInterval(obsPreviewInterval); // Limpa intervalo anterior se existir
     }
-    console.log("Iniciando atualização do preview do OBS...");
     updateObsPreview(); // Chama imediatamente a primeira vez
     obsPreviewInterval = setInterval(updateObsPreview, PREVIEW_UPDATE_INTERVAL);
 }
 
 function stopObsPreviewUpdate() {
+    const imgElement = document.getElementById("obs-preview-image");
+    if (obsPreviewStreaming && imgElement) {
+        console.log("Parando stream do preview do OBS...");
+        obsPreviewStreaming = false;
+        imgElement.onerror = null;
+        imgElement.removeAttribute("src"); // Fecha a conexão do stream
+    }
     if (obsPreviewInterval) {
         console.log("Parando atualização do preview do OBS...");
         clearInterval(obsPreviewInterval);
@@ -337,24 +439,36 @@ function updateObsPreview() {
 
     if (!imgElement || !loadingElement || !errorElement) return; // Elementos não encontrados
 
-    errorElement.classList.add("d-none");
-
-    fetch("/api/obs/preview")
-        .then(response => response.json())
-        .then(data => {
+    // JPEG binário com ETag: se o quadro não mudou, o servidor responde 304 e nada é baixado
+    fetch(PREVIEW_IMAGE_URL, { cache: "no-cache" })
+        .then(response => {
+            if (!response.ok) {
+                return response.json().then(data => { throw new Error(data.message || "Falha ao obter imagem"); });
+            }
+            const etag = response.headers.get("ETag");
+            if (etag && etag === obsPreviewEtag) return null; // Mesmo quadro já exibido
+            obsPreviewEtag = etag;
+            return response.blob();
+        })
+        .then(blob => {
             loadingElement.classList.add("d-none"); // Esconde loading
-            if (data.success && data.imageData) {
-                imgElement.src = data.imageData; // Atualiza a imagem
-                imgElement.classList.remove("d-none");
-            } else {
-                console.error("Erro ao obter preview:", data.message);
-                showPreviewError(data.message || "Falha ao obter imagem");
+            errorElement.classList.add("d-none");
+            if (blob) {
+                const previousUrl = imgElement.src;
+                imgElement.src = URL.createObjectURL(blob); // Atualiza a imagem
+                if (previousUrl.startsWith("blob:")) URL.revokeObjectURL(previousUrl);
             }
+            imgElement.classList.remove("d-none");
         })
         .catch(error => {
-            console.error("Erro de rede ao obter preview:", error);
-            stopObsPreviewUpdate(); // Para de tentar se der erro de rede
-            showPreviewError("Erro de rede");
+            if (error instanceof TypeError) {
+                console.error("Erro de rede ao obter preview:", error);
+                stopObsPreviewUpdate(); // Para de tentar se der erro de rede
+                showPreviewError("Erro de rede");
+                return;
+            }
+            console.error("Erro ao obter preview:", error.message);
+            showPreviewError(error.message || "Falha ao obter imagem");
         });
 }
 
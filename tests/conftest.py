@@ -0,0 +1,66 @@
+# Configuração comum dos testes: importa app.py e relay_api.py da raiz do projeto
+# e cria bancos de músicas temporários, sem tocar no songs.db real.
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as automacao
+
+# Schema do songs.db original (sem chave primária em id)
+BASELINE_SCHEMA = 'CREATE TABLE "songs" ("id" INTEGER, "title" TEXT, "content" TEXT, "categories" TEXT)'
+
+BASELINE_SONGS = [
+    (1, 'TUDO O QUE JESUS CONQUISTOU NA CRUZ', 'É DIREITO NOSSO E NOSSA HERANÇAnTODAS AS BENÇÃOS DE DEUS PRA NÓS', 'SEXTA, domingo'),
+    (2, 'O REI E O LADRÃO', 'MEUS OLHOS TÃO CANSADOSnE MARCADOS PELA DOR', 'DOMINGO, Domingo'),
+    (2, 'ID DUPLICADO', 'VERSO UM;VERSO DOIS', None),
+    (None, 'SEM ID', 'Linha um\nLinha dois\n\nLinha três', 'QUARTA'),
+]
+
+def create_baseline_db(path, songs=BASELINE_SONGS):
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO songs (id, title, content, categories) VALUES (?, ?, ?, ?)', songs)
+    conn.commit()
+    conn.close()
+
+# Banco no formato original, usado no lugar de songs_db durante o teste
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'songs.db')
+    create_baseline_db(path)
+    db = automacao.SongsDatabase(path, automacao.SQLITE_PRAGMAS, 2)
+    monkeypatch.setattr(automacao, 'SONGS_DB_PATH', path)
+    monkeypatch.setattr(automacao, 'songs_db', db)
+    monkeypatch.setattr(automacao, 'songs_fts_available', False)
+    yield db
+    db.close_all()
+
+# OBS falso em uma porta livre
+@pytest.fixture
+def fake_obs():
+    from fake_obs import FakeOBS
+    server = FakeOBS().start()
+    yield server
+    server.stop()
+
+# Sessão própria com o OBS falso, no lugar de obs_session/obs_breaker, com o circuito
+# ligado como no app.py. A sessão só conecta quando o teste a usa (ou chama start),
+# depois de registrados os handlers de espelhos e workers criados no teste.
+@pytest.fixture
+def obs_session(fake_obs, monkeypatch):
+    loop = automacao.BackgroundLoop('teste-loop', 8, 0.2)
+    session = automacao.OBSSession(loop, '127.0.0.1', fake_obs.port, None)
+    breaker = automacao.CircuitBreaker('OBS', automacao.OBS_BREAKER_FAILURES, 60)
+    monkeypatch.setattr(automacao, 'obs_session', session)
+    monkeypatch.setattr(automacao, 'obs_breaker', breaker)
+    monkeypatch.setattr(automacao, 'OBS_RECONNECT_MIN_DELAY', 0.05)
+    session.add_connect_handler(automacao._close_obs_breaker)
+    session.add_disconnect_handler(automacao._trip_obs_breaker)
+    session.add_connect_failure_handler(automacao._trip_obs_breaker)
+    yield session
+    session.stop()
+    loop.stop()
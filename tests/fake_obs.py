@@ -0,0 +1,152 @@
+# OBS WebSocket v5 falso para os testes: responde às requisições usadas pelo app.py
+# (msgpack, sem autenticação) e envia os eventos de troca de cena. Roda em um loop
+# próprio, em outra thread, como o OBS de verdade.
+import asyncio
+import base64
+import threading
+import time
+
+import msgpack
+import websockets
+
+class FakeOBS:
+    def __init__(self):
+        self.scenes = ['Câmera', 'Slides', 'Final']
+        self.program = 'Câmera'
+        self.inputs = {}
+        self.requests = [] # Tipos de requisição recebidos, em ordem
+        self.delays = {} # Atraso (s) por tipo de requisição
+        self.connections = 0
+        self.screenshots = 0
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        self._clients = set()
+        self._server = None
+        self._thread = threading.Thread(target=self.loop.run_forever, name='fake-obs', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._server = self._call(self._serve())
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+        return self
+
+    async def _serve(self):
+        return await websockets.serve(self._handler, '127.0.0.1', 0, subprotocols=['obswebsocket.msgpack'])
+
+    def stop(self):
+        self._server.close()
+        self._call(self._server.wait_closed())
+        self._call(self._cancel_pending()) # Requisições ainda em atraso
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self.loop.close()
+
+    async def _cancel_pending(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Derruba as conexões abertas (OBS fechado ou rede caiu); o cliente pode reconectar
+    def drop_connections(self):
+        async def close_all():
+            for ws in list(self._clients):
+                await ws.close()
+        self._call(close_all())
+
+    # Envia um evento a todos os clientes identificados (mudança feita no próprio OBS)
+    def emit(self, event_type, data):
+        self._call(self._emit(event_type, data))
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(5)
+
+    async def _emit(self, event_type, data):
+        message = msgpack.packb({'op': 5, 'd': {'eventType': event_type, 'eventIntent': 4, 'eventData': data}})
+        for ws in list(self._clients):
+            try:
+                await ws.send(message)
+            except websockets.ConnectionClosed:
+                pass
+
+    async def _request(self, request, variables=None):
+        request_type = request['requestType']
+        data = dict(request.get('requestData') or {})
+        for key, name in (request.get('inputVariables') or {}).items():
+            data[key] = variables.get(name)
+        self.requests.append(request_type)
+        await asyncio.sleep(self.delays.get(request_type, 0))
+        ok, response = True, {}
+        if request_type == 'GetVersion':
+            response = {'obsVersion': 'falso'}
+        elif request_type == 'GetSceneList':
+            response = {'currentProgramSceneName': self.program, 'currentPreviewSceneName': None,
+                        'scenes': [{'sceneName': name, 'sceneIndex': index}
+                                   for index, name in enumerate(reversed(self.scenes))]}
+        elif request_type == 'GetCurrentProgramScene':
+            response = {'currentProgramSceneName': self.program, 'sceneName': self.program}
+        elif request_type == 'SetCurrentProgramScene':
+            ok = data.get('sceneName') in self.scenes
+            if ok and data['sceneName'] != self.program:
+                self.program = data['sceneName']
+                self.loop.call_later(0.01, lambda: asyncio.ensure_future(
+                    self._emit('CurrentProgramSceneChanged', {'sceneName': self.program})))
+        elif request_type == 'GetSourceScreenshot':
+            self.screenshots += 1
+            jpeg = b'\xff\xd8' + str(data.get('sourceName')).encode() + b'\xff\xd9' # Mesma cena, mesma imagem
+            response = {'imageData': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()}
+        elif request_type in ('GetStreamStatus', 'GetRecordStatus'):
+            response = {'outputActive': False, 'outputPaused': False}
+        elif request_type == 'GetStudioModeEnabled':
+            response = {'studioModeEnabled': False}
+        elif request_type == 'SetInputSettings':
+            self.inputs[data.get('inputName')] = data.get('inputSettings')
+        else:
+            ok = False
+        status = {'result': ok, 'code': 100 if ok else 600, 'comment': None if ok else 'Requisição desconhecida'}
+        for key, name in (request.get('outputVariables') or {}).items():
+            variables[key] = response.get(name)
+        return {'requestType': request_type, 'requestStatus': status, 'responseData': response}
+
+    async def _reply(self, ws, op, payload):
+        try:
+            await ws.send(msgpack.packb({'op': op, 'd': payload}))
+        except websockets.ConnectionClosed:
+            pass # Conexão derrubada enquanto a requisição era atendida
+
+    async def _handle_request(self, ws, payload):
+        result = await self._request(payload)
+        await self._reply(ws, 7, {**result, 'requestId': payload['requestId']})
+
+    async def _handle_batch(self, ws, payload):
+        variables = dict(payload.get('variables') or {})
+        results = [await self._request(request, variables) for request in payload['requests']]
+        await self._reply(ws, 9, {'requestId': payload['requestId'], 'results': results})
+
+    async def _handler(self, ws):
+        self.connections += 1
+        await ws.send(msgpack.packb({'op': 0, 'd': {'obsWebSocketVersion': '5.0.0', 'rpcVersion': 1}}))
+        try:
+            async for message in ws:
+                packet = msgpack.unpackb(message)
+                op, payload = packet['op'], packet['d']
+                if op == 1: # Identify
+                    self._clients.add(ws)
+                    await ws.send(msgpack.packb({'op': 2, 'd': {'negotiatedRpcVersion': 1}}))
+                elif op == 6: # Request: atendida em paralelo, como no OBS
+                    asyncio.ensure_future(self._handle_request(ws, payload))
+                elif op == 8: # RequestBatch
+                    asyncio.ensure_future(self._handle_batch(ws, payload))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._clients.discard(ws)
+
+# Aguarda uma condição verdadeira (estado que muda em outra thread)
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+import app as automacao
+from fake_obs import wait_until
+
+@pytest.fixture
+def loop():
+    background = automacao.BackgroundLoop('teste-loop', 2, 0.05)
+    yield background
+    background.stop()
+
+def test_runs_coroutines_on_one_long_lived_loop(loop):
+    async def current_loop():
+        return asyncio.get_running_loop()
+    first = loop.run(current_loop(), 1)
+    assert loop.run(current_loop(), 1) is first
+    assert loop.snapshot() == {'running': True, 'pending': 0, 'maxPending': 2, 'rejected': 0}
+
+def test_rejects_calls_above_the_limit(loop):
+    release = threading.Event()
+
+    async def blocked():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    callers = [threading.Thread(target=loop.run, args=(blocked(), 5)) for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    assert wait_until(lambda: loop.pending == 2)
+    with pytest.raises(automacao.BackgroundLoopBusy):
+        loop.run(blocked(), 5)
+    release.set()
+    for caller in callers:
+        caller.join()
+    assert loop.snapshot()['pending'] == 0 and loop.snapshot()['rejected'] == 1
+    assert automacao.backend_error_status(automacao.BackgroundLoopBusy()) == 503
+
+def test_timeout_cancels_the_coroutine_and_frees_the_slot(loop):
+    cancelled = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(TimeoutError):
+        loop.run(slow(), 0.05)
+    assert cancelled.wait(1)
+    assert loop.pending == 0
@@ -0,0 +1,135 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import app as automacao
+from app import CircuitBreaker, CircuitOpenError
+
+def fail():
+    raise ConnectionError('recusado')
+
+def fail_times(breaker, count):
+    for _ in range(count):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+def test_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker('Teste', 2, 60)
+    fail_times(breaker, 1)
+    assert breaker.state == 'closed'
+    fail_times(breaker, 1)
+    assert breaker.state == 'open'
+    called = []
+    with pytest.raises(CircuitOpenError, match='Teste indisponível: recusado'):
+        breaker.call(called.append, 1)
+    assert called == []
+    assert breaker.snapshot()['rejected'] == 1
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker('Teste', 2, 60)
+    fail_times(breaker, 1)
+    assert breaker.call(lambda: 'ok') == 'ok'
+    fail_times(breaker, 1)
+    assert breaker.state == 'closed'
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker('Teste', 1, 0.01)
+    fail_times(breaker, 1)
+    time.sleep(0.02)
+    breaker.before_call() # Tentativa de teste liberada
+    assert breaker.state == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call() # Outras chamadas esperam o resultado do teste
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker('Teste', 1, 0.01)
+    fail_times(breaker, 1)
+    time.sleep(0.02)
+    fail_times(breaker, 1)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+
+def test_trip_opens_immediately():
+    breaker = CircuitBreaker('Teste', 5, 60)
+    breaker.trip('Conexão perdida')
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError, match='Conexão perdida'):
+        breaker.check()
+
+def test_probe_recovers_in_background():
+    attempts = []
+    recovered = threading.Event()
+
+    def probe():
+        attempts.append(time.monotonic())
+        if len(attempts) < 2:
+            raise ConnectionError('ainda fora')
+
+    breaker = CircuitBreaker('Teste', 1, 0.01, probe=probe)
+    breaker.add_close_handler(recovered.set)
+    fail_times(breaker, 1)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok') # Com probe, só a sondagem testa a volta
+    assert recovered.wait(2)
+    assert breaker.state == 'closed'
+    assert len(attempts) == 2
+    assert breaker.call(lambda: 'ok') == 'ok'
+
+def test_guard_counts_coroutine_failures_and_closes_unstarted_coroutines():
+    breaker = CircuitBreaker('Teste', 1, 60)
+
+    async def failing():
+        raise asyncio.TimeoutError()
+
+    async def ok():
+        return 'ok'
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(breaker.guard(ok())) == 'ok'
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(breaker.guard(failing()))
+        assert breaker.state == 'open'
+        coro = ok()
+        with pytest.raises(CircuitOpenError):
+            loop.run_until_complete(breaker.guard(coro))
+        assert coro.cr_frame is None # Fechada sem executar (sem aviso de corrotina não aguardada)
+    finally:
+        loop.close()
+
+def test_backend_error_status():
+    assert automacao.backend_error_status(CircuitOpenError('x')) == 503
+    assert automacao.backend_error_status(automacao.BackgroundLoopBusy('x')) == 503
+    assert automacao.backend_error_status(Exception('x')) == 500
+
+def test_obs_breaker_opens_when_obs_was_never_reachable(monkeypatch):
+    # Porta sem ninguém escutando: a conexão é recusada desde a primeira tentativa
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    loop = automacao.BackgroundLoop('teste-loop', 4, 1)
+    session = automacao.OBSSession(loop, '127.0.0.1', port, None)
+    breaker = CircuitBreaker('OBS', automacao.OBS_BREAKER_FAILURES, 60)
+    monkeypatch.setattr(automacao, 'obs_session', session)
+    monkeypatch.setattr(automacao, 'obs_breaker', breaker)
+    session.add_connect_failure_handler(automacao._trip_obs_breaker)
+    try:
+        session.start()
+        deadline = time.monotonic() + 5
+        while not breaker.is_open() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert breaker.is_open()
+        assert session.state != 'connected'
+        started = time.monotonic()
+        with pytest.raises(CircuitOpenError, match='OBS indisponível'):
+            automacao.obs_request_sync('GetVersion')
+        assert time.monotonic() - started < automacao.OBS_CONNECTED_WAIT # Sem esperar a sessão conectar
+    finally:
+        session.stop()
+        loop.stop()
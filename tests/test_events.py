@@ -0,0 +1,64 @@
+import json
+import threading
+
+import pytest
+
+import app as automacao
+from app import VersionedState
+
+def read_event(chunks):
+    chunk = next(chunks)
+    if chunk.startswith(':'):
+        return None
+    lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+def test_one_stream_carries_every_state(monkeypatch):
+    monkeypatch.setattr(automacao, 'SSE_KEEPALIVE_INTERVAL', 0.05)
+    obs = VersionedState({'connected': False})
+    relay = VersionedState({'status': {}})
+    with automacao.app.test_request_context():
+        chunks = automacao.sse_response({'obs': obs, 'relay': relay}).response
+        # Estado inicial de cada tópico
+        assert read_event(chunks) == ('obs', {'connected': False})
+        assert read_event(chunks) == ('relay', {'status': {}})
+        # Sem mudanças: só keep-alive
+        assert read_event(chunks) is None
+        threading.Timer(0.01, relay.update, kwargs={'status': {'1': 'on'}}).start()
+        event, data = read_event(chunks)
+        assert (event, data['status']) == ('relay', {'1': 'on'})
+        obs.update(connected=True)
+        event, data = read_event(chunks)
+        assert (event, data['connected']) == ('obs', True)
+
+@pytest.mark.parametrize('query', ['?topics=obs,luzes', '?topics=,'])
+def test_events_route_rejects_unknown_topics(monkeypatch, query):
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    response = automacao.app.test_client().get(f'/api/events{query}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+def test_streams_above_the_limit_get_503_with_retry_after(monkeypatch):
+    limiter = automacao.StreamLimiter(1)
+    monkeypatch.setattr(automacao, 'stream_limiter', limiter)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    client = automacao.app.test_client()
+    first = client.get('/api/events?topics=projection', buffered=False)
+    assert first.status_code == 200
+    refused = client.get('/api/events?topics=projection', buffered=False)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(automacao.STREAM_RETRY_AFTER)
+    first.close()
+    assert client.get('/api/events?topics=luzes').status_code == 400 # Requisição inválida não ocupa a vaga
+    assert limiter.active == 0
+    second = client.get('/api/events?topics=projection', buffered=False)
+    assert second.status_code == 200
+    second.close()
+    assert limiter.snapshot() == {'active': 0, 'max': 1, 'rejected': 1, 'clients': 0}
+
+def test_stream_limit_follows_the_thread_count():
+    limiter = automacao.StreamLimiter(1)
+    limiter.configure(32)
+    assert limiter.max_streams == 32 - automacao.SERVER_RESERVED_THREADS
+    limiter.configure(4)
+    assert limiter.max_streams == 1
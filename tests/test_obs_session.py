@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import app as automacao
+from fake_obs import wait_until
+
+def connected(session):
+    return lambda: session.state == 'connected'
+
+def test_requests_share_one_connection(obs_session, fake_obs):
+    for _ in range(3):
+        assert automacao.obs_request_sync('GetVersion') == {'obsVersion': 'falso'}
+    assert fake_obs.connections == 1
+    status = obs_session.snapshot()
+    assert status['connected'] and status['lastError'] is None
+
+def test_failed_request_raises_with_obs_message(obs_session):
+    with pytest.raises(Exception, match='Requisição desconhecida'):
+        automacao.obs_request_sync('Inexistente')
+
+def test_reconnects_after_the_connection_drops(obs_session, fake_obs):
+    automacao.obs_request_sync('GetVersion')
+    fake_obs.drop_connections()
+    assert wait_until(lambda: fake_obs.connections == 2 and obs_session.state == 'connected')
+    assert automacao.obs_request_sync('GetVersion') == {'obsVersion': 'falso'}
+    assert not automacao.obs_breaker.is_open() # Fechado de novo ao reconectar
+
+def test_drop_fails_the_pending_request_without_cancelling_the_caller(obs_session, fake_obs):
+    fake_obs.delays['GetVersion'] = 5
+    obs_session.start()
+    assert wait_until(connected(obs_session))
+    outcome = {}
+
+    async def caller():
+        try:
+            await obs_session.call('GetVersion')
+        except automacao.OBSConnectionLost as e:
+            outcome['error'] = str(e)
+        outcome['continued'] = True # A tarefa de quem chamou segue viva
+        return 'ok'
+
+    future = obs_session.submit(caller())
+    assert wait_until(lambda: 'GetVersion' in fake_obs.requests)
+    fake_obs.drop_connections()
+    assert future.result(2) == 'ok'
+    assert outcome == {'error': 'Conexão com o OBS perdida durante a requisição', 'continued': True}
+    assert wait_until(connected(obs_session)) # E a sessão volta sozinha
+
+def test_batch_passes_variables_between_requests(obs_session):
+    results = obs_session.run(automacao.obs_request_batch([
+        automacao.simpleobsws.Request('GetCurrentProgramScene', outputVariables={'sceneName': 'currentProgramSceneName'}),
+        automacao.simpleobsws.Request('GetSourceScreenshot', {'imageFormat': 'jpeg'}, inputVariables={'sourceName': 'sceneName'})
+    ], halt_on_failure=True))
+    assert [response.ok() for response in results] == [True, True]
+    assert results[1].responseData['imageData'].startswith('data:image/jpeg;base64,')
+
+def test_batch_route_returns_results_in_order(obs_session, monkeypatch):
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    response = automacao.app.test_client().post('/api/obs/batch', json={'requests': [
+        {'requestType': 'GetVersion'},
+        {'requestType': 'Inexistente'}
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [True, False]
+    assert automacao.app.test_client().post('/api/obs/batch', json={'requests': []}).status_code == 400
@@ -0,0 +1,45 @@
+import pytest
+
+import app as automacao
+from fake_obs import wait_until
+
+@pytest.fixture
+def mirror(obs_session, monkeypatch):
+    state = automacao.OBSStateMirror(obs_session)
+    monkeypatch.setattr(automacao, 'obs_state', state)
+    obs_session.start()
+    assert wait_until(lambda: state.snapshot()[1]['synced'])
+    return state
+
+def test_mirror_syncs_once_on_connect(mirror, fake_obs):
+    _, state = mirror.snapshot()
+    assert state['connected'] and state['currentProgramScene'] == 'Câmera'
+    assert state['scenes'] == ['Final', 'Slides', 'Câmera'] # Ordem do GetSceneList
+    assert fake_obs.requests == ['GetSceneList', 'GetStreamStatus', 'GetRecordStatus']
+
+def test_mirror_follows_obs_events(mirror, fake_obs):
+    version, _ = mirror.snapshot()
+    fake_obs.emit('CurrentProgramSceneChanged', {'sceneName': 'Slides'})
+    fake_obs.emit('SceneNameChanged', {'oldSceneName': 'Slides', 'sceneName': 'Letras'})
+    fake_obs.emit('StreamStateChanged', {'outputActive': True})
+    assert wait_until(lambda: mirror.snapshot()[1]['streaming'])
+    new_version, state = mirror.snapshot()
+    assert new_version > version
+    assert state['currentProgramScene'] == 'Letras'
+    assert 'Letras' in state['scenes'] and 'Slides' not in state['scenes']
+    assert len(fake_obs.requests) == 3 # Nenhuma consulta extra ao OBS
+
+def test_mirror_resyncs_after_reconnect(mirror, obs_session, fake_obs):
+    fake_obs.program = 'Final' # Mudou sem evento (ex.: OBS reiniciado)
+    fake_obs.drop_connections()
+    assert wait_until(lambda: mirror.snapshot()[1]['currentProgramScene'] == 'Final')
+    assert mirror.snapshot()[1]['synced'] and fake_obs.connections == 2
+
+def test_scenes_route_answers_from_the_mirror(mirror, fake_obs, monkeypatch):
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    client = automacao.app.test_client()
+    data = client.get('/api/obs/scenes').get_json()
+    assert data['currentProgramScene'] == 'Câmera'
+    state = client.get('/api/obs/state').get_json()
+    assert state['state']['synced'] and state['version'] == mirror.snapshot()[0]
+    assert 'GetSceneList' not in fake_obs.requests[3:]
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import app as automacao
+from fake_obs import wait_until
+
+@pytest.fixture
+def preview(obs_session, monkeypatch):
+    producer = automacao.OBSPreviewProducer(obs_session, 1, 30)
+    monkeypatch.setattr(automacao, 'obs_preview', producer)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    return producer
+
+def test_all_viewers_share_one_capture(preview, fake_obs):
+    client = automacao.app.test_client()
+    seqs = []
+
+    def viewer():
+        seqs.append(client.get('/api/obs/preview').get_json()['seq'])
+
+    threads = [threading.Thread(target=viewer) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seqs == [1] * 10
+    assert fake_obs.screenshots == 1 # Um único produtor, não uma captura por tela
+
+def test_producer_pauses_without_viewers(obs_session, fake_obs):
+    producer = automacao.OBSPreviewProducer(obs_session, 0.02, 0.1)
+    assert producer.wait_for_frame(0, 3).scene_name == 'Câmera'
+    assert wait_until(lambda: producer._future.done())
+    captured = fake_obs.screenshots
+    producer.latest() # Nova tela: volta a capturar
+    assert wait_until(lambda: fake_obs.screenshots > captured)
+
+def test_mjpeg_stream_pushes_new_frames(preview, fake_obs):
+    preview.interval = 0.05
+    response = automacao.app.test_client().get('/api/obs/preview/stream', buffered=False)
+    assert response.mimetype == 'multipart/x-mixed-replace'
+    chunks = iter(response.response)
+    first = next(chunks)
+    assert first.startswith(b'--frame\r\nContent-Type: image/jpeg\r\n')
+    assert first.endswith(b'\xff\xd8C\xc3\xa2mera\xff\xd9\r\n')
+    fake_obs.program = 'Slides' # Novo quadro só quando a imagem muda
+    assert b'Slides' in next(chunks)
+    response.close()
+
+def test_jpeg_preview_supports_conditional_get(preview):
+    client = automacao.app.test_client()
+    response = client.get('/api/obs/preview.jpg')
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    assert response.data == b'\xff\xd8C\xc3\xa2mera\xff\xd9'
+    etag = response.headers['ETag']
+    cached = client.get('/api/obs/preview.jpg', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
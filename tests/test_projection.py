@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import app as automacao
+
+# Sessão falsa: executa as corrotinas em um loop próprio, sem OBS
+class FakeSession:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.connect_handlers = []
+
+    def add_connect_handler(self, callback):
+        self.connect_handlers.append(callback)
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+SONGS = [
+    (10, 'Primeira', [['Verso 1', 'Verso 2', 'Verso 3'], ['Refrão']]),
+    (20, 'Segunda', [['Outra letra']]),
+]
+
+@pytest.fixture
+def obs_texts(monkeypatch):
+    texts = []
+
+    async def fake_obs_request(request_type, request_data=None):
+        assert request_type == 'SetInputSettings'
+        texts.append(request_data['inputSettings']['text'])
+        return {}
+
+    monkeypatch.setattr(automacao, 'obs_request', fake_obs_request)
+    return texts
+
+@pytest.fixture
+def projector(monkeypatch):
+    monkeypatch.setattr(automacao, 'PROJECTION_LINES_PER_SLIDE', 2)
+    session = FakeSession()
+    yield automacao.LyricsProjector(session, 'Letra')
+    session.loop.close()
+
+def test_load_builds_slides_without_touching_the_screen(projector, obs_texts):
+    assert projector.load(SONGS) == 4
+    _, state = projector.snapshot()
+    assert state['position'] == -1
+    assert [song['firstSlide'] for song in state['songs']] == [0, 3]
+    assert obs_texts == []
+
+def test_next_prev_and_bounds(projector, obs_texts):
+    projector.load(SONGS)
+    assert projector.next()['text'] == 'Verso 1\nVerso 2'
+    assert projector.next()['text'] == 'Verso 3'
+    state = projector.next()
+    assert (state['text'], state['stanza']) == ('Refrão', 1)
+    assert projector.next()['songIndex'] == 1
+    assert projector.next()['position'] == 3 # Para no último slide
+    assert projector.prev()['position'] == 2
+    # Slide repetido não é reenviado ao OBS
+    assert obs_texts == ['Verso 1\nVerso 2', 'Verso 3', 'Refrão', 'Outra letra', 'Refrão']
+
+def test_goto_stanza_and_clear(projector, obs_texts):
+    projector.load(SONGS)
+    assert projector.goto_stanza(1)['text'] == 'Refrão'
+    assert projector.goto_stanza(0, 1)['text'] == 'Outra letra'
+    with pytest.raises(ValueError):
+        projector.goto_stanza(5)
+    state = projector.clear()
+    assert state['blank'] and state['text'] == ''
+    assert obs_texts[-1] == ''
+
+def test_navigation_without_songs(projector, obs_texts):
+    with pytest.raises(ValueError):
+        projector.next()
+    assert obs_texts == []
+
+def test_obs_error_is_recorded(projector, monkeypatch):
+    async def failing(request_type, request_data=None):
+        raise Exception('OBS desconectado')
+
+    monkeypatch.setattr(automacao, 'obs_request', failing)
+    projector.load(SONGS)
+    with pytest.raises(Exception, match='OBS desconectado'):
+        projector.next()
+    assert projector.data['lastError'] == 'OBS desconectado'
+    assert projector.data['position'] == 0 # A posição muda mesmo assim; o próximo envio reaplica
+
+def test_append_while_projecting_keeps_the_current_slide(projector, obs_texts):
+    projector.load(SONGS[:1])
+    projector.next()
+    projector.next()
+    assert projector.append(SONGS[1:]) == 1
+    _, state = projector.snapshot()
+    assert (state['position'], state['songIndex'], state['text']) == (1, 0, 'Verso 3')
+    assert state['songs'][1] == {'id': 20, 'title': 'Segunda', 'firstSlide': 3, 'slideCount': 1}
+    assert state['slideCount'] == 4
+    assert projector.next()['text'] == 'Refrão' # Continua a música atual
+    assert projector.next()['text'] == 'Outra letra'
+    assert obs_texts == ['Verso 1\nVerso 2', 'Verso 3', 'Refrão', 'Outra letra']
+
+def test_append_route(projector, obs_texts, baseline_db, monkeypatch):
+    monkeypatch.setattr(automacao, 'projection', projector)
+    monkeypatch.setattr(automacao, 'SONGS_IN_MEMORY', False)
+    monkeypatch.setattr(automacao, '_songs_db_ready', False)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    client = automacao.app.test_client()
+    assert client.post('/api/projection/load', data={'song_id': '1'}).status_code == 200
+    client.post('/api/projection/next')
+    response = client.post('/api/projection/append', data={'song_id': ['4', '2']})
+    assert response.status_code == 200
+    state = response.get_json()['projection']
+    assert [song['id'] for song in state['songs']] == [1, 4, 2]
+    assert state['position'] == 0
+    assert client.post('/api/projection/append', data={'song_id': '999'}).status_code == 404
+    assert client.post('/api/projection/append').status_code == 400
+    assert obs_texts == ['É DIREITO NOSSO E NOSSA HERANÇA\nTODAS AS BENÇÃOS DE DEUS PRA NÓS']
+
+def test_goto_route_validates_numbers(projector, obs_texts, monkeypatch):
+    monkeypatch.setattr(automacao, 'projection', projector)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    projector.load(SONGS)
+    client = automacao.app.test_client()
+    assert client.post('/api/projection/goto', data={'stanza': '0', 'song': '1'}).get_json()['projection']['text'] == 'Outra letra'
+    for data in ({'slide': 'dois'}, {'stanza': '1', 'song': 'x'}):
+        response = client.post('/api/projection/goto', data=data)
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Parâmetros slide/stanza/song inválidos'
+    response = client.post('/api/projection/goto', data={'stanza': '5'})
+    assert (response.status_code, response.get_json()['message']) == (400, 'Estrofe 6 não encontrada na música 2 do deck') # Música atual
@@ -0,0 +1,56 @@
+import pytest
+
+import relay_api
+
+@pytest.fixture
+def client(monkeypatch):
+    backend = relay_api.MockBackend(relay_api.RELAY_PINS.values(), relay_api.RELAY_ACTIVE_LOW)
+    board = relay_api.RelayBoard(backend, relay_api.RELAY_PINS)
+    board.set_many({relay: True for relay in relay_api.RELAY_PINS})
+    monkeypatch.setattr(relay_api, 'board', board)
+    client = relay_api.app.test_client()
+    client.backend = backend
+    return client
+
+def status(client):
+    return client.get('/relay/status').get_json()['status']
+
+def test_bulk_with_states_per_relay(client):
+    response = client.post('/relay/bulk', json={'relays': {'1': 'off', '2': 'OFF', '3': 'on'}})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == {'1': 'off', '2': 'off', '3': 'on', '4': 'on', '5': 'on', '6': 'on'}
+    assert client.backend.writes == 2 # Inicialização + uma única passada para o lote
+
+def test_bulk_with_list_and_state(client):
+    response = client.post('/relay/bulk', json={'relays': [4, 5, 6], 'state': 'off'})
+    assert response.status_code == 200
+    assert status(client) == {'1': 'on', '2': 'on', '3': 'on', '4': 'off', '5': 'off', '6': 'off'}
+    # Relé ativo em nível baixo: desligado = pino em nível alto
+    assert client.backend.levels[relay_api.RELAY_PINS[4]] == 1
+
+@pytest.mark.parametrize('payload', [
+    {'relays': {'1': 'off', '9': 'off'}}, # Relé inexistente
+    {'relays': {'1': 'off', '2': 'talvez'}}, # Estado inválido
+    {'relays': {'x': 'off'}}, # ID não numérico
+    {'relays': [1, 2]}, # Lista sem state
+    {'relays': []},
+    {'relays': {}},
+    {'relays': 'todos'},
+    {},
+])
+def test_bulk_rejects_invalid_requests_without_changes(client, payload):
+    response = client.post('/relay/bulk', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert set(status(client).values()) == {'on'}
+    assert client.backend.writes == 1
+
+def test_bulk_rejects_non_json_body(client):
+    response = client.post('/relay/bulk', data='relays=1', content_type='application/x-www-form-urlencoded')
+    assert response.status_code == 400
+
+def test_single_relay_route(client):
+    assert client.post('/relay/2/off').status_code == 200
+    assert status(client)['2'] == 'off'
+    assert client.post('/relay/7/off').status_code == 400
+    assert client.post('/relay/2/meio').status_code == 400
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import app as automacao
+import relay_api
+
+# relay_http falso: encaminha as chamadas do app.py para o relay_api.py com o
+# backend simulado, sem rede. Com bulk=False imita a API antiga, sem /relay/bulk.
+class RelayAPIStub:
+    def __init__(self, bulk=True):
+        backend = relay_api.MockBackend(relay_api.RELAY_PINS.values(), relay_api.RELAY_ACTIVE_LOW)
+        self.board = relay_api.RelayBoard(backend, relay_api.RELAY_PINS)
+        self.client = relay_api.app.test_client()
+        self.bulk = bulk
+        self.error = None # Exceção levantada em todas as chamadas (Pi fora do ar)
+        self.delay = 0 # Latência (s) de cada chamada
+        self.calls = []
+
+    def _send(self, method, url, **kwargs):
+        path = url[len(automacao.RELAY_API_BASE_URL):]
+        self.calls.append((method, path))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        response = requests.Response()
+        if path == '/relay/bulk' and not self.bulk:
+            response.status_code, response._content = 404, b'{}'
+        else:
+            result = self.client.open(path, method=method, json=kwargs.get('json'))
+            response.status_code, response._content = result.status_code, result.data
+        return response
+
+    def get(self, url, **kwargs):
+        return self._send('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._send('POST', url, **kwargs)
+
+@pytest.fixture
+def relay_api_stub(monkeypatch):
+    stub = RelayAPIStub()
+    monkeypatch.setattr(relay_api, 'board', stub.board)
+    monkeypatch.setattr(automacao, 'relay_http', stub)
+    monkeypatch.setattr(automacao, 'relay_breaker', automacao.CircuitBreaker('API de relés', automacao.RELAY_BREAKER_FAILURES, 60))
+    mirror = automacao.RelayStateMirror(60)
+    monkeypatch.setattr(automacao, 'relay_state', mirror)
+    monkeypatch.setattr(automacao, 'relay_bulk_supported', True)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    yield stub
+    mirror.stop()
+
+def control(relay_id, state):
+    return automacao.app.test_client().post('/api/relay/control', data={'relay_id': relay_id, 'state': state})
+
+def test_group_uses_one_bulk_request(relay_api_stub):
+    response = control('meio', 'on')
+    assert response.status_code == 200
+    assert [result['relay'] for result in response.get_json()['results']] == [3, 4]
+    assert relay_api_stub.calls == [('POST', '/relay/bulk')]
+    assert relay_api_stub.board.state[3] and relay_api_stub.board.state[4]
+
+def test_bulk_failure_is_reported_once(relay_api_stub):
+    relay_api_stub.error = requests.exceptions.ConnectionError('conexão recusada')
+    response = control('todos', 'off')
+    assert response.status_code == 500
+    data = response.get_json()
+    assert [result['success'] for result in data['results']] == [False] * 6
+    assert data['message'].count('conexão recusada') == 1
+    # Circuito aberto: a mesma mensagem de indisponibilidade também aparece uma vez
+    control('todos', 'off')
+    data = control('todos', 'off').get_json()
+    assert data['message'].count('indisponível') == 1
+
+def test_old_api_gets_one_parallel_command_per_relay(relay_api_stub):
+    relay_api_stub.bulk = False
+    relay_api_stub.delay = 0.2
+    started = time.monotonic()
+    response = control('todos', 'on')
+    assert time.monotonic() - started < 0.2 * 3 # Seis comandos ao mesmo tempo, não em sequência
+    assert [result['relay'] for result in response.get_json()['results']] == [1, 2, 3, 4, 5, 6]
+    assert relay_api_stub.calls[0] == ('POST', '/relay/bulk')
+    assert sorted(path for _, path in relay_api_stub.calls[1:]) == [f'/relay/{relay}/on' for relay in range(1, 7)]
+    assert set(relay_api_stub.board.status().values()) == {'on'}
+    # A falta de /relay/bulk é lembrada: o próximo grupo vai direto aos comandos individuais
+    relay_api_stub.calls.clear()
+    control('frente', 'off')
+    assert sorted(relay_api_stub.calls) == [('POST', '/relay/1/off'), ('POST', '/relay/2/off')]
+
+def test_single_relay_skips_bulk(relay_api_stub):
+    assert control('5', 'on').status_code == 200
+    assert relay_api_stub.calls == [('POST', '/relay/5/on')]
+    assert control('7', 'on').status_code == 400
+
+def initial_status():
+    return automacao.app.test_client().get('/api/relay/initial_status')
+
+def test_commands_update_the_shared_state(relay_api_stub):
+    control('fundo', 'on')
+    _, state = automacao.relay_state.snapshot()
+    assert state['status'] == {'5': 'on', '6': 'on'}
+    assert relay_api_stub.calls == [('POST', '/relay/bulk')] # Sem leitura de /relay/status
+
+def test_initial_status_waits_for_the_requested_read(relay_api_stub):
+    relay_api_stub.delay = 0.2
+    # Comando de outro painel durante a leitura: muda a versão, mas não é a resposta esperada
+    threading.Timer(0.05, automacao.relay_state.record_results, ([{'relay': 1, 'success': True}], 'off')).start()
+    response = initial_status()
+    assert response.status_code == 200
+    assert response.get_json()['status'] == relay_api_stub.board.status()
+    assert initial_status().status_code == 200 # Depois disso, direto da memória
+    assert relay_api_stub.calls.count(('GET', '/relay/status')) == 2 # A leitura interrompida pelo comando é refeita
+
+def test_initial_status_reports_a_failed_read(relay_api_stub):
+    relay_api_stub.error = requests.exceptions.ConnectionError('sem rota')
+    response = initial_status()
+    assert response.status_code == 503
+    assert 'sem rota' in response.get_json()['message']
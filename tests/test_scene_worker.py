@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import app as automacao
+from fake_obs import wait_until
+
+@pytest.fixture
+def worker(obs_session):
+    state = automacao.OBSStateMirror(obs_session)
+    worker = automacao.SceneSwitchWorker(obs_session, state)
+    obs_session.start()
+    assert wait_until(lambda: state.snapshot()[1]['synced'])
+    return worker
+
+def test_switch_is_confirmed_by_the_obs_event(worker, fake_obs):
+    command = worker.enqueue('Slides')
+    result = worker.wait(command, 3)
+    assert result['status'] == 'confirmed'
+    assert result['latencyMs'] is not None
+    assert fake_obs.program == 'Slides'
+
+def test_clicks_during_a_switch_are_coalesced(worker, fake_obs):
+    fake_obs.delays['SetCurrentProgramScene'] = 0.2
+    first = worker.enqueue('Slides')
+    assert wait_until(lambda: first.status == 'sending')
+    skipped = worker.enqueue('Câmera')
+    last = worker.enqueue('Final')
+    assert skipped.to_dict()['status'] == 'superseded'
+    assert skipped.superseded_by == last.id
+    assert worker.wait(first, 3)['status'] == 'confirmed'
+    assert worker.wait(last, 3)['status'] == 'confirmed'
+    assert fake_obs.requests.count('SetCurrentProgramScene') == 2
+    assert fake_obs.program == 'Final'
+
+def test_drop_during_a_switch_fails_the_command_and_keeps_the_worker(worker, obs_session, fake_obs):
+    fake_obs.delays['SetCurrentProgramScene'] = 5
+    command = worker.enqueue('Slides')
+    assert wait_until(lambda: 'SetCurrentProgramScene' in fake_obs.requests)
+    fake_obs.drop_connections()
+    result = worker.wait(command, 2)
+    assert result['status'] == 'failed'
+    assert 'Conexão com o OBS perdida' in result['message']
+    # Depois de reconectar, o próximo comando é enviado normalmente
+    del fake_obs.delays['SetCurrentProgramScene']
+    assert wait_until(lambda: obs_session.state == 'connected')
+    assert worker.wait(worker.enqueue('Final'), 3)['status'] == 'confirmed'
+
+def test_loop_shutdown_does_not_leave_the_command_sending(worker, obs_session, fake_obs):
+    fake_obs.delays['SetCurrentProgramScene'] = 5
+    command = worker.enqueue('Slides')
+    assert wait_until(lambda: command.status == 'sending')
+    # Cancela a tarefa do worker, como no encerramento do loop
+    async def cancel_worker():
+        for task in asyncio.all_tasks():
+            if task.get_coro().__qualname__ == 'SceneSwitchWorker._process':
+                task.cancel()
+    obs_session.run(cancel_worker())
+    result = worker.wait(command, 2)
+    assert result['status'] == 'failed'
+    assert result['message'] == 'Envio interrompido antes da confirmação do OBS'
@@ -0,0 +1,364 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+import app as automacao
+
+# --- Letras ---
+def test_parse_song_content_legacy_n_separator():
+    assert automacao.parse_song_content('PRIMEIRO VERSOnSEGUNDO VERSO') == [['PRIMEIRO VERSO', 'SEGUNDO VERSO']]
+
+def test_parse_song_content_keeps_n_in_normal_text():
+    assert automacao.parse_song_content('Nenhum nome\nCanção nova') == [['Nenhum nome', 'Canção nova']]
+
+def test_parse_song_content_semicolons_and_stanzas():
+    content = 'Verso um; Verso dois\r\n\nVerso três\n\n\n;Verso quatro'
+    assert automacao.parse_song_content(content) == [['Verso um', 'Verso dois'], ['Verso três'], ['Verso quatro']]
+
+def test_parse_song_content_empty():
+    assert automacao.parse_song_content('') == []
+    assert automacao.parse_song_content(None) == []
+    assert automacao.parse_song_content('\n;\n') == []
+
+# --- Consulta FTS5 ---
+def test_build_fts_query_prefixes_every_word():
+    assert automacao.build_fts_query('Jesus, meu rei') == '"Jesus"* "meu"* "rei"*'
+
+def test_build_fts_query_drops_fts_syntax():
+    assert automacao.build_fts_query('"rei" OR (cruz*) -x') == '"rei"* "OR"* "cruz"* "x"*'
+    assert automacao.build_fts_query('  ;  ') == ''
+
+# --- Migrações ---
+def schema_objects(conn):
+    return {row[0] for row in conn.execute('SELECT name FROM sqlite_master')}
+
+def test_migrations_upgrade_baseline_db(baseline_db):
+    automacao.init_songs_db()
+    with baseline_db.read() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == automacao.SCHEMA_MIGRATIONS[-1][0]
+        columns = {column['name']: column for column in conn.execute('PRAGMA table_info(songs)')}
+        assert columns['id']['pk'] == 1
+        # ID repetido e ID nulo recebem novos IDs, na ordem das linhas
+        songs = {row['title']: row['id'] for row in conn.execute('SELECT id, title FROM songs')}
+        assert songs == {'TUDO O QUE JESUS CONQUISTOU NA CRUZ': 1, 'O REI E O LADRÃO': 2, 'ID DUPLICADO': 3, 'SEM ID': 4}
+        assert {'categories', 'song_categories', 'song_revisions', 'song_lines', 'songs_fts'} <= schema_objects(conn)
+        categories = {row['name'] for row in conn.execute('SELECT name FROM categories')}
+        assert categories == {'SEXTA', 'DOMINGO', 'QUARTA'}
+        assert conn.execute('SELECT COUNT(*) FROM song_categories WHERE song_id = 2').fetchone()[0] == 1
+        assert conn.execute('SELECT COUNT(*) FROM song_revisions').fetchone()[0] == 4
+        assert automacao.read_song(conn, 4)[1] == [['Linha um', 'Linha dois'], ['Linha três']]
+        assert automacao.read_song(conn, 3)[1] == [['VERSO UM', 'VERSO DOIS']]
+        hits = automacao.search_songs_fulltext(conn, 'ladrao', 10)
+        assert [hit['id'] for hit in hits] == [2]
+
+def test_migrations_run_once(baseline_db, caplog):
+    automacao.init_songs_db()
+    caplog.clear()
+    automacao.init_songs_db()
+    assert 'Aplicando migração' not in caplog.text
+
+def test_triggers_follow_edits(baseline_db):
+    automacao.init_songs_db()
+    with baseline_db.write() as conn:
+        conn.execute("UPDATE songs SET categories = 'NATAL', content = 'NOVO VERSO' WHERE id = 1")
+        conn.execute('DELETE FROM songs WHERE id = 2')
+    with baseline_db.write() as conn:
+        automacao.sync_song_categories(conn)
+        automacao.sync_song_lines(conn)
+    with baseline_db.read() as conn:
+        categories = {row['name'] for row in conn.execute('SELECT name FROM categories')}
+        assert categories == {'NATAL', 'QUARTA'}
+        assert automacao.read_song(conn, 1)[1] == [['NOVO VERSO']]
+        assert conn.execute('SELECT COUNT(*) FROM song_lines WHERE song_id = 2').fetchone()[0] == 0
+    with baseline_db.write() as conn:
+        # Levanta sqlite3.DatabaseError se o índice FTS divergir da tabela songs
+        conn.execute("INSERT INTO songs_fts(songs_fts, rank) VALUES ('integrity-check', 1)")
+
+def test_migration_drops_redundant_id_index(tmp_path, monkeypatch):
+    # Banco que já tinha id como chave primária e o índice idx_songs_id da primeira versão do FTS
+    path = str(tmp_path / 'songs.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE songs (id INTEGER PRIMARY KEY, title TEXT NOT NULL, content TEXT NOT NULL, categories TEXT)')
+    conn.execute('CREATE INDEX idx_songs_id ON songs(id)')
+    conn.execute("INSERT INTO songs (title, content, categories) VALUES ('Título', 'Letra', 'DOMINGO')")
+    conn.commit()
+    conn.close()
+    db = automacao.SongsDatabase(path, automacao.SQLITE_PRAGMAS, 2)
+    monkeypatch.setattr(automacao, 'SONGS_DB_PATH', path)
+    monkeypatch.setattr(automacao, 'songs_db', db)
+    monkeypatch.setattr(automacao, 'songs_fts_available', False)
+    try:
+        automacao.init_songs_db()
+        with db.read() as conn:
+            assert 'idx_songs_id' not in schema_objects(conn)
+            assert conn.execute('SELECT COUNT(*) FROM songs').fetchone()[0] == 1
+    finally:
+        db.close_all()
+
+def test_new_database_starts_with_primary_key(tmp_path, monkeypatch):
+    path = str(tmp_path / 'novo.db')
+    db = automacao.SongsDatabase(path, automacao.SQLITE_PRAGMAS, 2)
+    monkeypatch.setattr(automacao, 'SONGS_DB_PATH', path)
+    monkeypatch.setattr(automacao, 'songs_db', db)
+    monkeypatch.setattr(automacao, 'songs_fts_available', False)
+    try:
+        automacao.init_songs_db()
+        with db.read() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM songs').fetchone()[0] == 2
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == automacao.SCHEMA_MIGRATIONS[-1][0]
+    finally:
+        db.close_all()
+
+# --- Importação ---
+def test_import_counts_non_object_json_items_as_invalid(baseline_db, tmp_path):
+    path = tmp_path / 'musicas.json'
+    path.write_text(json.dumps([
+        {'title': 'Nova canção', 'content': 'Verso novo', 'categories': 'DOMINGO'},
+        'texto solto', 42, None, ['Título', 'Letra'],
+        {'title': 7, 'content': 'Título numérico'},
+    ]), encoding='utf-8')
+    stats = automacao.import_songs(str(path))
+    assert (stats['read'], stats['imported'], stats['invalid']) == (6, 1, 5)
+
+def test_import_jsonl_skips_non_object_lines(baseline_db, tmp_path):
+    path = tmp_path / 'musicas.jsonl'
+    path.write_text('"só texto"\n{"title": "Outra", "content": "Letra"}\n[1, 2]\n', encoding='utf-8')
+    stats = automacao.import_songs(str(path))
+    assert (stats['read'], stats['imported'], stats['invalid']) == (3, 1, 2)
+
+def test_import_rejects_json_that_is_not_a_list(baseline_db, tmp_path):
+    path = tmp_path / 'musicas.json'
+    path.write_text('{"title": "Sozinha", "content": "Letra"}', encoding='utf-8')
+    with pytest.raises(ValueError):
+        automacao.import_songs(str(path))
+
+@pytest.mark.parametrize('read_size', [1, 7, 4096])
+def test_json_list_is_read_incrementally(read_size):
+    songs = [{'title': f'Música {n}', 'content': 'Verso; "aspas" [colchetes], vírgula', 'n': n * 1.5e3} for n in range(20)]
+    text = json.dumps(songs, ensure_ascii=False, indent=1)
+    assert list(automacao.iter_json_list(io.StringIO(text), read_size)) == songs
+    assert list(automacao.iter_json_list(io.StringIO(' [ ] '), read_size)) == []
+
+@pytest.mark.parametrize('text', ['[{"title": "A"} {"title": "B"}]', '[{"title": "A"},', '[1]{}', '[1,]'])
+def test_json_list_rejects_malformed_files(text):
+    with pytest.raises(ValueError):
+        list(automacao.iter_json_list(io.StringIO(text), 4))
+
+def test_import_of_truncated_json_changes_nothing(baseline_db, tmp_path):
+    path = tmp_path / 'musicas.json'
+    path.write_text(json.dumps([{'title': f'Nova {n}', 'content': 'Letra nova'} for n in range(5)])[:-20], encoding='utf-8')
+    with pytest.raises(ValueError):
+        automacao.import_songs(str(path), chunk_size=1)
+    with baseline_db.read() as conn:
+        assert conn.execute("SELECT count(*) FROM songs WHERE title LIKE 'Nova%'").fetchone()[0] == 0
+
+# --- Destaque dos resultados ---
+HTML_SONG = (9, 'Cruz <b>viva</b>', 'Olha a cruz <img src=x onerror=alert(1)> & vem', 'DOMINGO')
+
+def test_highlight_html_escapes_song_text():
+    marked = f'a {automacao.SEARCH_MARK_START}<cruz>{automacao.SEARCH_MARK_END} & b'
+    assert automacao.highlight_html(marked) == 'a <mark>&lt;cruz&gt;</mark> &amp; b'
+    assert automacao.highlight_html(None) is None
+
+def test_memory_snapshot_marks_terms_with_sentinels():
+    snapshot = automacao.CorpusSnapshot(1, [HTML_SONG])
+    snippet = snapshot.search('cruz', 'fulltext', 10)[0]['snippet']
+    assert '<mark>' not in snippet
+    assert automacao.highlight_html(snippet).startswith('Olha a <mark>cruz</mark> &lt;img')
+
+def test_search_route_returns_escaped_highlights(baseline_db, monkeypatch):
+    automacao.init_songs_db()
+    with baseline_db.write() as conn:
+        conn.execute('INSERT INTO songs (id, title, content, categories) VALUES (?, ?, ?, ?)', HTML_SONG)
+    monkeypatch.setattr(automacao, 'SONGS_IN_MEMORY', False)
+    monkeypatch.setattr(automacao, '_songs_db_ready', False)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    monkeypatch.setattr(automacao, 'search_cache', automacao.SearchCache(10, 60))
+    response = automacao.app.test_client().post('/api/search_songs', data={'search_term': 'viva'})
+    hit = response.get_json()['results'][0]
+    assert hit['title'] == 'Cruz <b>viva</b>' # Texto puro; a página usa textContent
+    assert hit['titleHighlight'] == 'Cruz &lt;b&gt;<mark>viva</mark>&lt;/b&gt;'
+    assert '<img' not in hit['snippet']
+
+# --- Hinário em memória x FTS5 ---
+PARITY_SONGS = [
+    (1, 'Cruz', 'Na cruz do calvário', 'DOMINGO'),
+    (2, 'Olhos no céu', 'Meus olhos na cruz, na cruz, na cruz de Jesus', 'SEXTA'),
+    (3, 'A Cruz Vitoriosa', 'Vitória pela cruz e pelo sangue', 'Cruz'),
+    (4, 'Graça', 'Maravilhosa graça que me alcançou na cruz', 'DOMINGO, Ceia'),
+    (5, 'Cruzeiro', 'Canto para a ceia do Senhor', 'CEIA'),
+]
+
+@pytest.mark.parametrize('search_term', ['cruz', 'na cruz', 'ceia', 'cruz vit', 'graca'])
+def test_memory_search_matches_fts_ranking_and_highlights(baseline_db, search_term):
+    automacao.init_songs_db()
+    with baseline_db.write() as conn:
+        conn.execute('DELETE FROM songs')
+        conn.executemany('INSERT INTO songs (id, title, content, categories) VALUES (?, ?, ?, ?)', PARITY_SONGS)
+    with baseline_db.read() as conn:
+        fts = [dict(row) for row in automacao.search_songs_fulltext(conn, search_term, 10)]
+    memory = automacao.CorpusSnapshot(1, PARITY_SONGS).search(search_term, 'fulltext', 10)
+    assert memory and [song['id'] for song in memory] == [song['id'] for song in fts]
+    assert [song['score'] for song in memory] == pytest.approx([song['score'] for song in fts])
+    assert [song['title_highlight'] for song in memory] == [song['title_highlight'] for song in fts]
+
+# --- Autocompletar ---
+def replace_songs(db, songs):
+    automacao.init_songs_db()
+    with db.write() as conn:
+        conn.execute('DELETE FROM songs')
+        conn.executemany('INSERT INTO songs (id, title, content, categories) VALUES (?, ?, ?, ?)', songs)
+
+def test_suggestions_prefer_title_starts(baseline_db):
+    replace_songs(baseline_db, PARITY_SONGS)
+    index = automacao.PrefixIndex(automacao.SongsChangeMonitor(automacao.SONGS_DB_PATH, 0))
+    suggestions = index.suggest('cruz', 10)
+    assert [(song['id'], song['match']) for song in suggestions[:2]] == [(1, 'title'), (5, 'title')]
+    assert suggestions[2] == {'id': 3, 'title': 'A Cruz Vitoriosa', 'match': 'title', 'text': 'A Cruz Vitoriosa'}
+    assert index.suggest('maravilhosa gr', 10) == [
+        {'id': 4, 'title': 'Graça', 'match': 'line', 'text': 'Maravilhosa graça que me alcançou na cruz'}]
+    assert index.suggest('  ', 10) == []
+
+def test_suggestions_follow_database_changes(baseline_db):
+    replace_songs(baseline_db, PARITY_SONGS)
+    index = automacao.PrefixIndex(automacao.SongsChangeMonitor(automacao.SONGS_DB_PATH, 0))
+    assert index.suggest('cruzeiro', 10)[0]['title'] == 'Cruzeiro'
+    with baseline_db.write() as conn:
+        conn.execute("UPDATE songs SET title = 'Cruzeiro do Sul' WHERE id = 5")
+    # Título e texto vêm da mesma versão do índice
+    assert index.suggest('cruzeiro', 10)[0] == {'id': 5, 'title': 'Cruzeiro do Sul', 'match': 'title', 'text': 'Cruzeiro do Sul'}
+
+# --- Facetas de categoria ---
+def test_category_facets_count_and_intersect(baseline_db, monkeypatch):
+    replace_songs(baseline_db, PARITY_SONGS)
+    facets = automacao.CategoryFacets(automacao.SongsChangeMonitor(automacao.SONGS_DB_PATH, 0))
+    counts = {category['name']: category['count'] for category in facets.categories()}
+    assert counts == {'CEIA': 2, 'CRUZ': 1, 'DOMINGO': 2, 'SEXTA': 1}
+    assert [song['title'] for song in facets.songs([])] == [song[1] for song in sorted(PARITY_SONGS, key=lambda s: s[1])]
+    assert facets.songs(['DOMINGO', 'CEIA']) == [{'id': 4, 'title': 'Graça', 'categories': 'CEIA, DOMINGO'}]
+    assert facets.songs(['INEXISTENTE']) == []
+    # Edição feita por fora: contagens e músicas recalculadas juntas
+    with baseline_db.write() as conn:
+        conn.execute("INSERT INTO songs (id, title, content, categories) VALUES (6, 'Aleluia', '', 'ceia')")
+    assert [song['id'] for song in facets.songs(['CEIA'])] == [6, 5, 4]
+    monkeypatch.setattr(automacao, 'category_facets', facets)
+    monkeypatch.setattr(automacao, 'SONGS_IN_MEMORY', False)
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    client = automacao.app.test_client()
+    categories = client.get('/api/categories').get_json()['categories']
+    assert {category['name']: category['count'] for category in categories}['CEIA'] == 3
+    assert client.get('/api/songs?category=sexta').get_json()['count'] == 1
+
+# --- Pesquisa aproximada ---
+def test_fuzzy_search_tolerates_typos(baseline_db):
+    replace_songs(baseline_db, PARITY_SONGS)
+    index = automacao.TrigramIndex(automacao.SongsChangeMonitor(automacao.SONGS_DB_PATH, 0))
+    assert index.search('cruzero', 5)[0][:1] == (5,)
+    song_id, similarity, text = index.search('vitoriza', 5)[0]
+    assert (song_id, text) == (3, 'A Cruz Vitoriosa') and 0 < similarity < 1
+    assert index.search('maravilosa graca', 5)[0][0] == 4 # Primeiros versos também são indexados
+    assert index.search('xyz', 5) == []
+
+def test_fuzzy_index_reindexes_only_changed_songs(baseline_db, caplog):
+    replace_songs(baseline_db, PARITY_SONGS)
+    index = automacao.TrigramIndex(automacao.SongsChangeMonitor(automacao.SONGS_DB_PATH, 0))
+    assert index.search('grasa', 5)[0][0] == 4
+    with baseline_db.write() as conn:
+        conn.execute("UPDATE songs SET title = 'Sublime Graça' WHERE id = 4")
+        conn.execute('DELETE FROM songs WHERE id = 5')
+    with caplog.at_level('INFO', logger='app'):
+        assert index.search('sublime', 5)[0][0] == 4
+    assert 'Índice de trigramas atualizado (2 música(s) alterada(s)).' in caplog.text
+    assert all(song_id != 5 for song_id, _, _ in index.search('cruzeiro', 5))
+
+# --- Cache de resultados ---
+def test_search_cache_lru_ttl_and_versions(monkeypatch):
+    cache = automacao.SearchCache(2, 60)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 1, 'C') # 'b' é o menos usado recentemente
+    assert cache.get('b', 1) is None and cache.get('c', 1) == 'C'
+    cache.put('velho', 0, 'X') # Resultado calculado sobre dados antigos
+    assert cache.get('velho', 1) is None
+    assert cache.get('a', 2) is None # Banco mudou: tudo descartado
+    cache.put('a', 2, 'A2')
+    clock = [automacao.time.monotonic()]
+    monkeypatch.setattr(automacao.time, 'monotonic', lambda: clock[0])
+    clock[0] += 61
+    assert cache.get('a', 2) is None
+    stats = cache.stats()
+    assert (stats['evictions'], stats['invalidations'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+def test_search_cache_key_normalizes_terms():
+    assert automacao.search_cache_key('  Graça  Maravilhosa', 'fulltext') == automacao.search_cache_key('graca maravilhosa', 'fulltext')
+    assert automacao.search_cache_key('Graça', 'exact') != automacao.search_cache_key('graca', 'exact')
+
+def test_search_route_caches_until_the_database_changes(baseline_db, monkeypatch):
+    replace_songs(baseline_db, PARITY_SONGS)
+    monkeypatch.setattr(automacao, 'SONGS_IN_MEMORY', False)
+    monkeypatch.setattr(automacao, '_songs_db_ready', True)
+    monkeypatch.setattr(automacao, 'songs_monitor', automacao.SongsChangeMonitor(automacao.SONGS_DB_PATH, 0))
+    monkeypatch.setattr(automacao, 'search_cache', automacao.SearchCache(10, 60))
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    client = automacao.app.test_client()
+
+    def search():
+        return [hit['id'] for hit in client.post('/api/search_songs', data={'search_term': 'ceia', 'mode': 'exact'}).get_json()['results']]
+
+    assert search() == [4, 5]
+    assert search() == [4, 5]
+    assert automacao.search_cache.stats()['hits'] == 1
+    with baseline_db.write() as conn:
+        conn.execute('DELETE FROM songs WHERE id = 4')
+    assert search() == [5]
+    assert client.get('/api/search_songs/cache').get_json()['cache']['invalidations'] == 1
+
+# --- Conexões do SQLite ---
+def test_read_connections_are_reused_and_read_only(baseline_db):
+    automacao.init_songs_db()
+    with baseline_db.read() as conn:
+        first = conn
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            conn.execute("UPDATE songs SET title = 'x'")
+    with baseline_db.read() as conn:
+        assert conn is first
+        with baseline_db.read() as other: # Leitura em paralelo: outra conexão
+            assert other is not first
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+def test_pool_keeps_at_most_pool_size_connections(baseline_db):
+    with baseline_db.read() as last, baseline_db.read(), baseline_db.read():
+        pass
+    assert baseline_db._readers.qsize() == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        last.execute('SELECT 1') # A última devolvida encontrou o pool cheio e foi fechada
+
+def test_write_rolls_back_on_error(baseline_db):
+    with pytest.raises(RuntimeError):
+        with baseline_db.write() as conn:
+            conn.execute("UPDATE songs SET title = 'APAGADO'")
+            raise RuntimeError('falha no meio da importação')
+    with baseline_db.read() as conn:
+        assert conn.execute("SELECT count(*) FROM songs WHERE title = 'APAGADO'").fetchone()[0] == 0
+
+# --- Paginação da pesquisa ---
+def test_search_pages_with_cursor_and_rejects_bad_parameters(baseline_db, monkeypatch):
+    replace_songs(baseline_db, PARITY_SONGS)
+    monkeypatch.setattr(automacao, 'SONGS_IN_MEMORY', False)
+    monkeypatch.setattr(automacao, '_songs_db_ready', True)
+    monkeypatch.setattr(automacao, 'search_cache', automacao.SearchCache(10, 60))
+    monkeypatch.setitem(automacao.app.config, 'LOGIN_DISABLED', True)
+    client = automacao.app.test_client()
+    first = client.post('/api/search_songs', data={'search_term': 'ceia', 'mode': 'exact', 'limit': 1}).get_json()
+    assert [hit['id'] for hit in first['results']] == [4]
+    second = client.post('/api/search_songs', data={'search_term': 'ceia', 'mode': 'exact', 'limit': 1,
+                                                    'cursor': first['nextCursor']}).get_json()
+    assert [hit['id'] for hit in second['results']] == [5] and second['nextCursor'] is None
+    for field, value, message in (('limit', 'dez', "Parâmetro 'limit' inválido"),
+                                  ('cursor', '<script>', "Parâmetro 'cursor' inválido")):
+        response = client.post('/api/search_songs', data={'search_term': 'ceia', field: value})
+        assert response.status_code == 400
+        assert response.get_json()['message'] == message